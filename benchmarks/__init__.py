@@ -0,0 +1,7 @@
+"""
+Performance benchmarks for the recipe API.
+
+Each module in this package is a benchmark suite that can be run with
+`python manage.py benchmark <suite>`. Suites run against a throwaway test
+database, so they never touch the data of the configured database.
+"""
@@ -0,0 +1,270 @@
+"""
+End-to-end HTTP load benchmark for the recipe API.
+
+Seeds a dataset in the benchmark database, starts the app in a subprocess
+against it, and drives a weighted mix of API calls at fixed concurrency
+levels. Reports throughput, latency percentiles and queries per request.
+"""
+
+import http.client
+import json
+import os
+import random
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authtoken.models import Token
+from core_app.models import Recipe
+from benchmarks.utils import create_benchmark_user, seed_recipes, percentile
+
+
+BENCHMARK_PASSWORD = "benchpass123"
+
+# scenario name -> relative weight in the request mix
+DEFAULT_MIX = {
+    "recipe-list": 30,
+    "recipe-detail": 25,
+    "recipe-create": 5,
+    "recipe-update": 5,
+    "tag-list": 15,
+    "ingredient-list": 15,
+    "token": 5,
+}
+
+
+def add_arguments(parser):
+
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--recipes-per-user", type=int, default=200)
+    parser.add_argument("--tags-per-recipe", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per concurrency level.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--server-command",
+        default=f"{shlex.quote(sys.executable)} manage.py runserver 127.0.0.1:{{port}} --noreload",
+        help="Command that serves the app, {port} is replaced (e.g. a gunicorn command line)."
+    )
+
+
+def build_request(scenario, context, rng):
+    """
+    Return (method, path, body) for one call of scenario, as the user in context.
+    """
+
+    if scenario == "recipe-list":
+        return "GET", "/api/recipe/recipes/", None
+    if scenario == "recipe-detail":
+        return "GET", f"/api/recipe/recipes/{rng.choice(context['recipe_ids'])}/", None
+    if scenario == "recipe-create":
+        return "POST", "/api/recipe/recipes/", {
+            "title": "Load test recipe",
+            "time_minutes": 20,
+            "price": "4.50",
+            "tags": [{"name": "Load"}, {"name": f"Tag {rng.randrange(4)}"}],
+            "ingredients": [{"name": "Salt"}],
+        }
+    if scenario == "recipe-update":
+        return "PATCH", f"/api/recipe/recipes/{rng.choice(context['recipe_ids'])}/", {
+            "title": f"Updated recipe {rng.randrange(1000)}",
+            "tags": [{"name": "Updated"}],
+        }
+    if scenario == "tag-list":
+        return "GET", "/api/recipe/tags/", None
+    if scenario == "ingredient-list":
+        return "GET", "/api/recipe/ingredients/", None
+    if scenario == "token":
+        return "POST", "/api/user/token/", {"email": context["email"], "password": BENCHMARK_PASSWORD}
+
+    raise ValueError(f"Unknown scenario {scenario}")
+
+
+def seed_dataset(options):
+    """
+    Create the benchmark users with their recipes, and return a context dict per user.
+    """
+
+    contexts = []
+    for i in range(options["users"]):
+        user = create_benchmark_user(email=f"bench{i}@example.com")
+        recipes = seed_recipes(user, options["recipes_per_user"], tags_per_recipe=options["tags_per_recipe"])
+        contexts.append({
+            "user": user,
+            "email": user.email,
+            "token": Token.objects.create(user=user).key,
+            "recipe_ids": [recipe.id for recipe in recipes],
+        })
+
+    return contexts
+
+
+@override_settings(ALLOWED_HOSTS=["testserver", ])
+def measure_queries(contexts, mix, rng):
+    """
+    Run each scenario once in-process and return the number of SQL queries it issued.
+    """
+
+    client = Client()
+    queries = {}
+
+    for scenario in mix:
+        context = contexts[0]
+        method, path, body = build_request(scenario, context, rng)
+        headers = {"HTTP_AUTHORIZATION": f"Token {context['token']}"}
+
+        with CaptureQueriesContext(connection) as captured:
+            getattr(client, method.lower())(
+                path, data=json.dumps(body) if body else None, content_type="application/json", **headers
+            )
+
+        queries[scenario] = len(captured)
+
+    return queries
+
+
+def start_server(command, port, database_name):
+    """
+    Start the app in a subprocess against the benchmark database and wait until it answers.
+    """
+
+    # settings read the database name from DB_NAME, the load comes from a single user so don't throttle or shed it,
+    # and measure without the overhead of DEBUG (e.g. the queries it records)
+    env = {
+        **os.environ, "DB_NAME": database_name, "THROTTLING": "0", "CONCURRENCY_LIMITING": "0",
+        "DEBUG": "0", "ALLOWED_HOSTS": "127.0.0.1,localhost",
+    }
+    process = subprocess.Popen(
+        shlex.split(command.format(port=port)), cwd=settings.BASE_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/api/recipe/")
+            conn.getresponse().read()
+            return process
+        except OSError:
+            time.sleep(0.2)
+
+    process.terminate()
+    raise RuntimeError(f"Server did not start on port {port}: {command}")
+
+
+def run_level(concurrency, duration, contexts, mix, port, seed):
+    """
+    Drive the server with concurrency threads for duration seconds and collect latencies.
+    """
+
+    samples = {scenario: [] for scenario in mix}
+    errors = {scenario: 0 for scenario in mix}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    scenarios, weights = list(mix), list(mix.values())
+
+    def worker(worker_id):
+
+        rng = random.Random(seed + worker_id)
+        context = contexts[worker_id % len(contexts)]
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        local_samples = {scenario: [] for scenario in mix}
+        local_errors = {scenario: 0 for scenario in mix}
+
+        while time.monotonic() < deadline:
+            scenario = rng.choices(scenarios, weights)[0]
+            method, path, body = build_request(scenario, context, rng)
+            headers = {"Content-Type": "application/json"}
+            if scenario != "token":
+                headers["Authorization"] = f"Token {context['token']}"
+
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=json.dumps(body) if body else None, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                failed = response.status >= 400
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                failed = True
+
+            local_samples[scenario].append((time.perf_counter() - start) * 1000)
+            local_errors[scenario] += failed
+
+        conn.close()
+        with lock:
+            for scenario in mix:
+                samples[scenario].extend(local_samples[scenario])
+                errors[scenario] += local_errors[scenario]
+
+    threads = [threading.Thread(target=worker, args=(i, )) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    def stats(latencies, error_count):
+        latencies = sorted(latencies)
+        return {
+            "requests": len(latencies),
+            "errors": error_count,
+            "throughput_rps": round(len(latencies) / elapsed, 1),
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+        }
+
+    all_latencies = [latency for scenario in mix for latency in samples[scenario]]
+
+    return {
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "overall": stats(all_latencies, sum(errors.values())),
+        "scenarios": {scenario: stats(samples[scenario], errors[scenario]) for scenario in mix},
+    }
+
+
+def run(options):
+    """
+    Seed the dataset, start the server and run every concurrency level.
+    """
+
+    if connection.vendor == "sqlite" and connection.is_in_memory_db():
+        raise RuntimeError("The HTTP load benchmark needs a database the server process can reach.")
+
+    rng = random.Random(options["seed"])
+    contexts = seed_dataset(options)
+    queries = measure_queries(contexts, DEFAULT_MIX, rng)
+
+    server = start_server(options["server_command"], options["port"], connection.settings_dict["NAME"])
+    try:
+        levels = [
+            run_level(concurrency, options["duration"], contexts, DEFAULT_MIX, options["port"], options["seed"])
+            for concurrency in options["concurrency"]
+        ]
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        "suite": "http_load",
+        "dataset": {
+            "users": options["users"],
+            "recipes_per_user": options["recipes_per_user"],
+            "tags_per_recipe": options["tags_per_recipe"],
+            "recipes": Recipe.objects.count(),
+        },
+        "mix": DEFAULT_MIX,
+        "queries_per_request": queries,
+        "levels": levels,
+    }
@@ -0,0 +1,194 @@
+"""
+Serializer and ORM microbenchmarks with regression gates.
+
+Each case is measured at several data sizes and compared against the
+baselines stored in benchmarks/baselines.json, one set per database backend
+(--update-baselines replaces the set of the current backend only). A case
+fails when it issues more SQL queries than its baseline, or, if the baseline
+was recorded on the same database backend, when its best time grows beyond
+the tolerance (the minimum of several runs is the least noisy estimate of a
+microbenchmark). A backend without baselines of its own is only checked for
+queries, against the set of another backend.
+"""
+
+import json
+from pathlib import Path
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from core_app.models import Recipe, Tag
+from recipe_app.serializers import RecipeSerializer, RecipeDetailSerializer, recipe_list_representation
+from recipe_app.views import RecipeViewSet, TagViewSet
+from benchmarks.utils import time_callable, create_benchmark_user, seed_recipes
+
+
+BASELINES_FILE = Path(__file__).resolve().parent / "baselines.json"
+
+
+def add_arguments(parser):
+
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 10000],
+                        help="Number of recipes in the dataset.")
+    parser.add_argument("--tags", type=int, nargs="+", default=[0, 50],
+                        help="Number of tags (and ingredients) per recipe.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="Allowed relative slowdown of the best time before a case fails.")
+    parser.add_argument("--min-slowdown-ms", type=float, default=2.0,
+                        help="Slowdowns smaller than this many milliseconds never fail a case.")
+    parser.add_argument("--update-baselines", action="store_true",
+                        help="Store the results as the new baselines instead of comparing.")
+
+
+class RolledBack(Exception):
+    """
+    Raised to roll back the writes of a benchmarked call.
+    """
+
+
+def rolled_back(func):
+    """
+    Wrap func so its writes are rolled back, leaving the dataset unchanged between repeats.
+    """
+
+    def wrapper():
+        try:
+            with transaction.atomic():
+                func()
+                raise RolledBack()
+        except RolledBack:
+            pass
+
+    return wrapper
+
+
+def make_viewset(viewset_class, user, action, params=None):
+    """
+    Return a viewset instance ready to call get_queryset() as user.
+    """
+
+    request = Request(APIRequestFactory().get("/", params or {}))
+    request.user = user
+
+    view = viewset_class()
+    view.request, view.action, view.format_kwarg, view.kwargs = request, action, None, {}
+
+    return view
+
+
+def build_cases(user, recipes, tags_per_recipe):
+    """
+    Return the benchmark cases for one dataset as a dict of name -> callable.
+    """
+
+    queryset = Recipe.objects.filter(user=user).order_by("-id")
+    detail = Recipe.objects.prefetch_related("tags", "ingredients").get(pk=recipes[0].pk)
+    request = Request(APIRequestFactory().post("/"))
+    request.user = user
+    context = {"request": request}
+
+    payload = {
+        "title": "Benchmark recipe",
+        "time_minutes": 10,
+        "price": "5.25",
+        "tags": [{"name": f"Tag {i}"} for i in range(tags_per_recipe)],
+        "ingredients": [{"name": f"Ingredient {i}"} for i in range(tags_per_recipe)],
+    }
+    # half of the names already exist, the other half have to be created
+    new_tags = [{"name": f"New tag {i}" if i % 2 else f"Tag {i}"} for i in range(tags_per_recipe)]
+    new_ingredients = [{"name": f"New ingredient {i}" if i % 2 else f"Ingredient {i}"} for i in range(tags_per_recipe)]
+
+    tag_ids = ",".join(str(pk) for pk in Tag.objects.filter(user=user).values_list("pk", flat=True)[:5])
+
+    return {
+        "RecipeSerializer.to_representation":
+            lambda: RecipeSerializer(queryset.prefetch_related("tags", "ingredients"), many=True).data,
+        "recipe_list_representation":
+            lambda: recipe_list_representation(queryset),
+        "RecipeDetailSerializer.to_representation":
+            lambda: RecipeDetailSerializer(detail).data,
+        "RecipeSerializer.is_valid":
+            lambda: RecipeSerializer(data=payload, context=context).is_valid(raise_exception=True),
+        "RecipeSerializer._get_or_create_tags":
+            rolled_back(lambda: RecipeSerializer(context=context)._get_or_create_tags(new_tags, recipes[0])),
+        "RecipeSerializer._get_or_create_ingredients":
+            rolled_back(lambda: RecipeSerializer(context=context)._get_or_create_ingredients(new_ingredients, recipes[0])),
+        "RecipeViewSet.get_queryset[tags]":
+            lambda: list(make_viewset(RecipeViewSet, user, "list", {"tags": tag_ids}).get_queryset().values("id")),
+        "TagViewSet.get_queryset[assigned_only]":
+            lambda: list(make_viewset(TagViewSet, user, "list", {"assigned_only": 1}).get_queryset()),
+        "TagViewSet.get_queryset[popularity]":
+            lambda: list(make_viewset(TagViewSet, user, "list", {"ordering": "popularity"}).get_queryset()),
+    }
+
+
+def measure(func, repeat):
+    """
+    Return the timing stats and query count of func.
+    """
+
+    with CaptureQueriesContext(connection) as captured:
+        func()
+
+    return {**time_callable(func, repeat), "queries": len(captured)}
+
+
+def compare(results, baselines, options):
+    """
+    Return a list of regressions of results against baselines.
+    """
+
+    same_backend = baselines.get("environment", {}).get("database") == connection.vendor
+    regressions = []
+
+    for name, result in results.items():
+        baseline = baselines.get("cases", {}).get(name)
+        if baseline is None:
+            continue
+
+        if result["queries"] > baseline["queries"]:
+            regressions.append(f"{name}: {result['queries']} queries (baseline {baseline['queries']})")
+
+        slowdown = result["min_ms"] - baseline["min_ms"]
+        if same_backend and slowdown > options["min_slowdown_ms"] \
+                and result["min_ms"] > baseline["min_ms"] * (1 + options["tolerance"]):
+            regressions.append(f"{name}: {result['min_ms']} ms (baseline {baseline['min_ms']} ms)")
+
+    return regressions
+
+
+def run(options):
+    """
+    Measure every case on every dataset, then compare with (or update) the baselines.
+    """
+
+    results = {}
+
+    for tags_per_recipe in options["tags"]:
+        for size in options["sizes"]:
+            user = create_benchmark_user(email=f"bench-{size}-{tags_per_recipe}@example.com")
+            recipes = seed_recipes(user, size, tags_per_recipe=tags_per_recipe,
+                                   ingredients_per_recipe=tags_per_recipe)
+
+            for name, func in build_cases(user, recipes, tags_per_recipe).items():
+                results[f"{name}[recipes={size},tags={tags_per_recipe}]"] = measure(func, options["repeat"])
+
+    # database backend -> baselines recorded on it
+    all_baselines = json.loads(BASELINES_FILE.read_text()) if BASELINES_FILE.exists() else {}
+
+    if options["update_baselines"]:
+        all_baselines[connection.vendor] = {"environment": {"database": connection.vendor}, "cases": results}
+        BASELINES_FILE.write_text(json.dumps(all_baselines, indent=2, sort_keys=True) + "\n")
+        regressions = []
+    else:
+        baselines = all_baselines.get(connection.vendor) or next(iter(all_baselines.values()), {})
+        regressions = compare(results, baselines, options)
+
+    return {
+        "suite": "micro",
+        "database": connection.vendor,
+        "cases": results,
+        "regressions": regressions,
+        "failed": bool(regressions),
+    }
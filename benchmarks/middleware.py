@@ -0,0 +1,70 @@
+"""
+Compare the per-request cost of the full middleware stack and the lean API stack.
+"""
+
+from django.conf import settings
+from django.test import Client, override_settings
+from rest_framework.authtoken.models import Token
+from benchmarks.utils import time_callable, create_benchmark_user, seed_recipes
+
+
+# token authenticated API endpoints, the 404 shows the cost of the middleware alone
+ENDPOINTS = {
+    "not-found": ("/api/not-found/", 404),
+    "me": ("/api/user/me/", 200),
+    "tag-list": ("/api/recipe/tags/", 200),
+    "recipe-list": ("/api/recipe/recipes/", 200),
+}
+
+
+def add_arguments(parser):
+
+    parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint, stack and repeat.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--recipes", type=int, default=10, help="Recipes owned by the benchmark user.")
+
+
+@override_settings(DEBUG=False, ALLOWED_HOSTS=["testserver"], THROTTLING=False)
+def run(options):
+    """
+    Request every endpoint through both stacks and report the time per request.
+    """
+
+    user = create_benchmark_user()
+    seed_recipes(user, options["recipes"])
+    token = Token.objects.create(user=user)
+    stacks = {"full": settings.FULL_MIDDLEWARE, "lean": settings.API_MIDDLEWARE}
+    requests = options["requests"]
+    results = []
+
+    clients = {}
+    for stack, middleware in stacks.items():
+        # every new client builds the middleware chain with the settings in effect
+        with override_settings(API_MIDDLEWARE=middleware):
+            clients[stack] = Client(HTTP_AUTHORIZATION=f"Token {token.key}")
+            clients[stack].get("/api/user/me/")
+
+    for endpoint, (url, expected_status) in ENDPOINTS.items():
+        timings = {stack: [] for stack in stacks}
+
+        def batch(client):
+            for _ in range(requests):
+                response = client.get(url)
+            if response.status_code != expected_status:
+                raise AssertionError(f"{url} returned {response.status_code}.")
+
+        for _ in range(options["repeat"]): # alternate the stacks so drift affects both alike
+            for stack, client in clients.items():
+                timings[stack].append(time_callable(lambda: batch(client), 1)["min_ms"])
+
+        per_request_us = {stack: round(min(values) / requests * 1000, 1) for stack, values in timings.items()}
+        saved = per_request_us["full"] - per_request_us["lean"]
+        results.append({
+            "endpoint": endpoint,
+            "full_us": per_request_us["full"],
+            "lean_us": per_request_us["lean"],
+            "saved_us": round(saved, 1),
+            "saved_percent": round(saved / per_request_us["full"] * 100, 1),
+        })
+
+    return {"suite": "middleware", "requests": requests, "results": results}
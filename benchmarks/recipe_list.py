@@ -0,0 +1,58 @@
+"""
+Compare RecipeSerializer against the lean recipe list representation.
+"""
+
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+from core_app.models import Recipe, Tag, Ingredient
+from recipe_app.serializers import RecipeSerializer, recipe_list_representation
+from benchmarks.utils import time_callable, create_benchmark_user, seed_recipes
+
+
+def add_arguments(parser):
+
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+
+
+def run(options):
+    """
+    Serialize the list of recipes at each size with both paths.
+    """
+
+    user = create_benchmark_user()
+    renderer = JSONRenderer()
+    results = []
+    seeded = 0
+
+    for size in sorted(options["sizes"]):
+        seed_recipes(user, size - seeded)
+        seeded = size
+
+        queryset = Recipe.objects.filter(user=user).order_by("-id").distinct()
+
+        def serializer_path():
+            # in id order like the lean path, postgres returns unordered prefetches in any order
+            recipes = queryset.prefetch_related(
+                Prefetch("tags", queryset=Tag.objects.order_by("id")),
+                Prefetch("ingredients", queryset=Ingredient.objects.order_by("id")),
+            )
+            return renderer.render(RecipeSerializer(recipes, many=True).data)
+
+        def lean_path():
+            return renderer.render(recipe_list_representation(queryset))
+
+        if serializer_path() != lean_path():
+            raise AssertionError(f"Lean representation differs from RecipeSerializer at {size} rows.")
+
+        serializer_timing = time_callable(serializer_path, options["repeat"])
+        lean_timing = time_callable(lean_path, options["repeat"])
+
+        results.append({
+            "rows": size,
+            "serializer": serializer_timing,
+            "lean": lean_timing,
+            "speedup": round(serializer_timing["median_ms"] / lean_timing["median_ms"], 2),
+        })
+
+    return {"suite": "recipe_list", "results": results}
@@ -0,0 +1,117 @@
+"""
+Helpers shared by the benchmark suites.
+"""
+
+from contextlib import contextmanager
+from decimal import Decimal
+import math
+import statistics
+import time
+from django.contrib.auth import get_user_model
+from django.db import connection
+from core_app.models import Recipe, Tag, Ingredient
+
+
+@contextmanager
+def benchmark_database(keepdb=False):
+    """
+    Create a test database for the duration of the block, and destroy it afterwards.
+    """
+
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+
+    try:
+        yield connection.settings_dict["NAME"]
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+
+
+def time_callable(func, repeat=5):
+    """
+    Call func repeat times and return timing stats in milliseconds.
+    """
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "max_ms": round(max(timings), 3),
+    }
+
+
+def percentile(sorted_values, percent):
+    """
+    Return the nearest-rank percentile of an already sorted list, rounded to microseconds.
+    """
+
+    if not sorted_values:
+        return None
+
+    rank = max(math.ceil(percent / 100 * len(sorted_values)) - 1, 0)
+
+    return round(sorted_values[rank], 3)
+
+
+def create_benchmark_user(email="bench@example.com"):
+    """
+    Create and return a user that owns the benchmark data.
+
+    The user (and its data) left by a previous run with --keepdb is deleted first,
+    so every run measures the same dataset.
+    """
+
+    get_user_model().objects.filter(email=email).delete()
+
+    return get_user_model().objects.create_user(email=email, password="benchpass123")
+
+
+def seed_recipes(user, count, tags_per_recipe=3, ingredients_per_recipe=3):
+    """
+    Bulk create count recipes for user, each linked to some of the user's tags and ingredients.
+    """
+
+    # reused when the user was seeded before, names are unique per user
+    tags = Tag.objects.get_or_create_many(
+        user, [f"Tag {i}" for i in range(max(tags_per_recipe, 1) * 2)]
+    )
+    ingredients = Ingredient.objects.get_or_create_many(
+        user, [f"Ingredient {i}" for i in range(max(ingredients_per_recipe, 1) * 2)]
+    )
+
+    recipes = Recipe.objects.bulk_create([
+        Recipe(
+            user=user,
+            title=f"Recipe {i}",
+            description="Benchmark recipe description. " * 20,
+            time_minutes=10 + i % 50,
+            price=Decimal("5.25") + i % 7,
+            link=f"http://example.com/recipe-{i}.pdf",
+        )
+        for i in range(count)
+    ], batch_size=1000)
+
+    RecipeTag = Recipe.tags.through
+    RecipeIngredient = Recipe.ingredients.through
+
+    RecipeTag.objects.bulk_create([
+        RecipeTag(recipe_id=recipe.id, tag_id=tags[(i + j) % len(tags)].id)
+        for i, recipe in enumerate(recipes)
+        for j in range(tags_per_recipe)
+    ], batch_size=5000)
+    RecipeIngredient.objects.bulk_create([
+        RecipeIngredient(recipe_id=recipe.id, ingredient_id=ingredients[(i + j) % len(ingredients)].id)
+        for i, recipe in enumerate(recipes)
+        for j in range(ingredients_per_recipe)
+    ], batch_size=5000)
+
+    # bulk inserts into the through tables don't send m2m_changed
+    Tag.objects.filter(user=user).recount()
+    Ingredient.objects.filter(user=user).recount()
+
+    return recipes
@@ -0,0 +1,129 @@
+"""
+Compare the commits and latency of recipe creation in autocommit mode (one
+get_or_create and one m2m add per tag and ingredient, the previous write path)
+and in one transaction with batched tags and ingredients (RecipeSerializer).
+"""
+
+from contextlib import contextmanager
+import statistics
+import time
+from unittest.mock import patch
+from django.db import connection
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from core_app.models import Recipe, Tag, Ingredient
+from recipe_app.serializers import RecipeSerializer
+from benchmarks.utils import create_benchmark_user
+
+
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE")
+
+
+def add_arguments(parser):
+
+    parser.add_argument("--tags", type=int, nargs="+", default=[2, 10, 50],
+                        help="Tags (and ingredients) per recipe, half of them new.")
+    parser.add_argument("--repeat", type=int, default=20, help="Recipes created per path and size.")
+
+
+@contextmanager
+def count_commits():
+    """
+    Count the commits of the block: write statements in autocommit mode and commits of transactions.
+    """
+
+    counts = {"commits": 0, "queries": 0}
+
+    def record(execute, sql, params, many, context):
+        counts["queries"] += 1
+        if not context["connection"].in_atomic_block and sql.lstrip()[:6].upper() in WRITE_STATEMENTS:
+            counts["commits"] += 1
+        return execute(sql, params, many, context)
+
+    commit = connection.commit
+
+    def counted_commit():
+        counts["commits"] += 1
+        return commit()
+
+    with connection.execute_wrapper(record), patch.object(connection, "commit", counted_commit):
+        yield counts
+
+
+def autocommit_create(serializer, user):
+    """
+    The previous write path, every statement commits on its own.
+    """
+
+    validated_data = dict(serializer.validated_data)
+    tags = validated_data.pop("tags", [])
+    ingredients = validated_data.pop("ingredients", [])
+
+    recipe = Recipe.objects.create(user=user, **validated_data)
+    for tag in tags:
+        tag_obj, created = Tag.objects.get_or_create(user=user, **tag)
+        recipe.tags.add(tag_obj)
+    for ingredient in ingredients:
+        ingredient_obj, created = Ingredient.objects.get_or_create(user=user, **ingredient)
+        recipe.ingredients.add(ingredient_obj)
+
+    return recipe
+
+
+def atomic_create(serializer, user):
+
+    return serializer.save(user=user)
+
+
+def run(options):
+    """
+    Create recipes through both paths, alternating them, and report commits, queries and latency.
+    """
+
+    user = create_benchmark_user()
+    request = Request(APIRequestFactory().post("/"))
+    request.user = user
+    paths = {"autocommit": autocommit_create, "atomic": atomic_create}
+    results = []
+
+    for size in options["tags"]:
+        existing = size // 2
+        Tag.objects.get_or_create_many(user, [f"Tag {i}" for i in range(existing)])
+        Ingredient.objects.get_or_create_many(user, [f"Ingredient {i}" for i in range(existing)])
+        stats = {path: {"ms": [], "commits": 0, "queries": 0} for path in paths}
+
+        for iteration in range(options["repeat"]):
+            for path, create in paths.items():
+                names = [f"Tag {i}" for i in range(existing)] + [f"{path} {size}-{iteration}-{i}" for i in range(size - existing)]
+                payload = {
+                    "title": "Benchmark recipe",
+                    "time_minutes": 10,
+                    "price": "5.25",
+                    "tags": [{"name": name} for name in names],
+                    "ingredients": [{"name": name.replace("Tag", "Ingredient")} for name in names],
+                }
+                serializer = RecipeSerializer(data=payload, context={"request": request})
+                serializer.is_valid(raise_exception=True)
+
+                with count_commits() as counts:
+                    start = time.perf_counter()
+                    create(serializer, user)
+                    stats[path]["ms"].append((time.perf_counter() - start) * 1000)
+
+                stats[path]["commits"] = counts["commits"]
+                stats[path]["queries"] = counts["queries"]
+
+        results.append({
+            "tags": size,
+            **{
+                path: {
+                    "commits": values["commits"],
+                    "queries": values["queries"],
+                    "min_ms": round(min(values["ms"]), 3),
+                    "median_ms": round(statistics.median(values["ms"]), 3),
+                }
+                for path, values in stats.items()
+            },
+        })
+
+    return {"suite": "write_path", "database": connection.vendor, "results": results}
@@ -5,7 +5,7 @@ Django admin customization.
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.translation import gettext_lazy as gt_l
-from .models import User, Recipe, Tag, Ingredient
+from .models import User, Recipe, Tag, Ingredient, SlowQuery
 
 
 class CustomUserAdmin(UserAdmin):
@@ -56,9 +56,57 @@ class CustomUserAdmin(UserAdmin):
     )
     
 
+class SlowQueryAdmin(admin.ModelAdmin):
+    """
+    Define the admin pages for the slow query log (read only).
+    """
+
+    ordering = ["-total_duration_ms", ]
+    list_display = ["view", "sql", "calls", "total_duration_ms", "max_duration_ms", "last_seen"]
+    list_filter = ["view", ]
+    search_fields = ["sql", ]
+    readonly_fields = [
+        "fingerprint", "view", "sql", "plan", "calls", "total_duration_ms", "max_duration_ms",
+        "first_seen", "last_seen",
+    ]
+
+    def has_add_permission(self, request):
+
+        return False
+
+    def has_change_permission(self, request, obj=None):
+
+        return False
+
+
+class RecipeAttributeAdmin(admin.ModelAdmin):
+    """
+    Define the admin pages for tags and ingredients.
+    """
+
+    ordering = ["user", "name"]
+    list_display = ["name", "user", "recipe_count"]
+    search_fields = ["name", "user__email"]
+    actions = ["merge_selected"]
+
+    @admin.action(description=gt_l("Merge selected items into the most used one of each user"))
+    def merge_selected(self, request, queryset):
+        """
+        Merge the selected items of each user into the one with the most recipes.
+        """
+
+        merged = 0
+        for user_id in queryset.values_list("user_id", flat=True).distinct().order_by():
+            items = queryset.filter(user_id=user_id)
+            target = items.order_by("-recipe_count", "pk").first()
+            merged += items.merge_into(target)
+
+        self.message_user(request, gt_l("Merged %(count)d items.") % {"count": merged})
+
 
 # register models in admin site
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(Recipe)
-admin.site.register(Tag) 
-admin.site.register(Ingredient) 
+admin.site.register(Tag, RecipeAttributeAdmin)
+admin.site.register(Ingredient, RecipeAttributeAdmin)
+admin.site.register(SlowQuery, SlowQueryAdmin)
@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class CoreAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core_app'
+
+    def ready(self):
+
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+        from core_app import signals # noqa: F401 (connect signal handlers)
+        from core_app.metrics import track_connection
+
+        connection_created.connect(track_connection)
+
+        if settings.PROFILER_SIGNAL:
+            from core_app.profiling import install_signal_handler
+            install_signal_handler()
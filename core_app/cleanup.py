@@ -0,0 +1,162 @@
+"""
+Cleanup of orphaned tags, ingredients and recipe image files.
+
+Tags and ingredients stay behind when no recipe uses them anymore, and image
+files when upload_image replaces Recipe.image or a recipe is deleted. The
+cleanup deletes them in bounded batches with a pause between batches, so it
+can run on a live system without long locks or I/O spikes:
+
+- items: unused tags and ingredients (recipe_count 0, double checked against
+  the through table because the counter may have drifted). Each batch locks
+  its candidates and checks them again before deleting, so that links added
+  in the meantime are neither deleted with the item nor make the run fail
+- files: files under uploads/recipe that no recipe references, older than a
+  grace age (an upload writes the file before its recipe row is committed)
+
+run_cleanup() is the periodic task hook, run it from cron or a task queue
+(`manage.py cleanup_orphans`), or keep the command running with --every.
+"""
+
+from datetime import timedelta
+from itertools import islice
+import logging
+import posixpath
+import time
+from django.db import models, transaction
+from django.utils import timezone
+from core_app.models import RECIPE_IMAGE_DIRECTORY, Recipe, Tag, Ingredient
+
+
+logger = logging.getLogger("core_app.cleanup")
+
+BATCH_SIZE = 500
+PAUSE = 0.1 # seconds between batches
+MIN_FILE_AGE = 3600 # seconds
+
+
+def batched(iterable, size):
+
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def unused_items(model):
+    """
+    Return the tags or ingredients that no recipe uses.
+    """
+
+    through = model._meta.get_field("recipe").through
+    item_field = f"{model._meta.model_name}_id"
+
+    return model.objects.filter(recipe_count=0).filter(
+        ~models.Exists(through.objects.filter(**{item_field: models.OuterRef("pk")}))
+    )
+
+
+def delete_orphans(model, ids):
+    """
+    Delete the items among ids that are still unused once locked. Returns how many.
+    """
+
+    with transaction.atomic():
+        # skips the items that requests are linking or recounting (they lock them first, the foreign keys
+        # are only checked at commit), and makes new links wait until the items are gone. The check after
+        # it sees the links committed meanwhile
+        locked = list(
+            model.objects.filter(pk__in=ids).order_by("pk")
+            .select_for_update(skip_locked=True).values_list("pk", flat=True)
+        )
+        orphans = list(unused_items(model).filter(pk__in=locked).values_list("pk", flat=True))
+
+        return model.objects.filter(pk__in=orphans).delete()[1].get(model._meta.label, 0)
+
+
+def delete_orphan_items(model, batch_size=BATCH_SIZE, pause=PAUSE, dry_run=False):
+    """
+    Delete the tags or ingredients that no recipe uses, batch_size at a time. Returns how many.
+    """
+
+    deleted = 0
+    last_id = 0
+
+    while True: # walk the table in primary key batches to keep transactions short
+        batch = list(
+            model.objects.filter(pk__gt=last_id, recipe_count=0).order_by("pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not batch:
+            break
+        last_id = batch[-1]
+
+        candidates = list(unused_items(model).filter(pk__in=batch).values_list("pk", flat=True))
+        if dry_run:
+            deleted += len(candidates)
+        elif candidates:
+            deleted += delete_orphans(model, candidates)
+
+        time.sleep(pause)
+
+    return deleted
+
+
+def stored_files(storage, directory):
+    """
+    Yield the names of the files under directory in storage, recursively.
+    """
+
+    directories, files = storage.listdir(directory)
+
+    for name in files:
+        yield posixpath.join(directory, name)
+    for name in directories:
+        yield from stored_files(storage, posixpath.join(directory, name))
+
+
+def delete_orphan_files(batch_size=BATCH_SIZE, pause=PAUSE, min_age=MIN_FILE_AGE, dry_run=False):
+    """
+    Delete the files under RECIPE_IMAGE_DIRECTORY that no recipe references. Returns how many.
+    """
+
+    storage = Recipe._meta.get_field("image").storage
+    if not storage.exists(RECIPE_IMAGE_DIRECTORY):
+        return 0
+
+    cutoff = timezone.now() - timedelta(seconds=min_age)
+    deleted = 0
+
+    for batch in batched(stored_files(storage, RECIPE_IMAGE_DIRECTORY), batch_size):
+        referenced = set(Recipe.objects.filter(image__in=batch).values_list("image", flat=True))
+
+        for name in batch:
+            if name in referenced or storage.get_modified_time(name) > cutoff:
+                continue
+            if not dry_run:
+                storage.delete(name)
+            deleted += 1
+
+        time.sleep(pause)
+
+    return deleted
+
+
+def run_cleanup(items=True, files=True, **options):
+    """
+    Delete orphaned tags, ingredients and image files, returns the number deleted of each.
+    """
+
+    item_options = {name: value for name, value in options.items() if name != "min_age"}
+    results = {}
+
+    if items:
+        for model in [Tag, Ingredient]:
+            results[model._meta.verbose_name_plural] = delete_orphan_items(model, **item_options)
+    if files:
+        results["files"] = delete_orphan_files(**options)
+
+    logger.info(
+        "%s orphans: %s", "Found" if options.get("dry_run") else "Deleted",
+        ", ".join(f"{count} {name}" for name, count in results.items())
+    )
+
+    return results
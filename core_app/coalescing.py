@@ -0,0 +1,192 @@
+"""
+Coalescing of identical concurrent reads and stampede protected caching.
+
+Identical concurrent reads (same view, user, query params and data version)
+share one database evaluation and one serialization: the first request runs
+it, the others wait for its result (READ_COALESCING). This protects Postgres
+from clients that retry aggressively.
+
+Optionally (READ_CACHE_TIMEOUT > 0) the results are also cached in the Django
+cache for READ_CACHE_TIMEOUT seconds, then served stale for up to
+READ_CACHE_STALE_TIMEOUT more seconds while a single request refreshes them
+(stale-while-revalidate). A missing entry is computed by one request at a time
+across workers (a cache.add lock), the others wait for it instead of all
+hitting the database when it expires under load.
+
+Keys include a per-user data version that is bumped when a recipe, tag or
+ingredient of the user changes (see core_app.signals), so writes are visible
+to the next read right away instead of when entries expire.
+"""
+
+import hashlib
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from core_app.metrics import CACHE_REQUESTS
+
+
+class SingleFlight:
+    """
+    Run a function once per key at a time, concurrent callers with the same key share its result.
+    """
+
+    class Call:
+
+        def __init__(self):
+
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function):
+        """
+        Return (result of function, whether it was shared with a call already in flight).
+        """
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self.Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = function()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result, False
+
+
+_flights = SingleFlight()
+
+
+def get_cache():
+
+    return caches[settings.READ_CACHE_ALIAS]
+
+
+def _version_key(user_id):
+
+    return f"reads:version:{user_id}"
+
+
+def user_version(user_id):
+    """
+    Return the current data version of a user.
+    """
+
+    cache = get_cache()
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        # starting from the clock, a version that was evicted never comes back with an older value
+        cache.add(_version_key(user_id), time.time_ns(), timeout=None)
+        version = cache.get(_version_key(user_id), 0)
+
+    return version
+
+
+def bump_user_version(user_id):
+    """
+    Invalidate the cached reads of a user.
+    """
+
+    cache = get_cache()
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError: # no version yet (or evicted)
+        cache.set(_version_key(user_id), time.time_ns(), timeout=None)
+
+
+def read_key(request, user_id):
+    """
+    Return the key of a read: view, user, data version and query params.
+    """
+
+    params = hashlib.sha1(repr(sorted(request.GET.lists())).encode()).hexdigest()
+
+    return f"reads:{request.resolver_match.view_name}:{user_id}:{user_version(user_id)}:{params}"
+
+
+def _cached(key, function, label):
+    """
+    Return function() through the cache, with stampede protection and stale-while-revalidate.
+    """
+
+    cache = get_cache()
+    now = time.time()
+    entry = cache.get(key) # (value, fresh until)
+
+    if entry is not None and entry[1] > now:
+        CACHE_REQUESTS.labels(cache=label, result="hit").inc()
+        return entry[0]
+
+    lock_key = f"{key}:lock"
+    lock_timeout = settings.READ_CACHE_LOCK_TIMEOUT
+
+    if not cache.add(lock_key, 1, lock_timeout):
+        if entry is not None: # somebody else is refreshing it
+            CACHE_REQUESTS.labels(cache=label, result="stale").inc()
+            return entry[0]
+
+        deadline = time.monotonic() + lock_timeout # wait for the request that computes it
+        while time.monotonic() < deadline:
+            time.sleep(0.01)
+            entry = cache.get(key)
+            if entry is not None:
+                CACHE_REQUESTS.labels(cache=label, result="hit").inc()
+                return entry[0]
+        # the other request is too slow (or died), compute it here as well
+
+    CACHE_REQUESTS.labels(cache=label, result="miss").inc()
+    try:
+        value = function()
+        cache.set(
+            key, (value, time.time() + settings.READ_CACHE_TIMEOUT),
+            timeout=settings.READ_CACHE_TIMEOUT + settings.READ_CACHE_STALE_TIMEOUT,
+        )
+    finally:
+        cache.delete(lock_key)
+
+    return value
+
+
+def coalesced_read(request, user_id, function, label="reads"):
+    """
+    Return function() (the data of a read), shared with identical concurrent reads and cached when enabled.
+    """
+
+    if not settings.READ_COALESCING and not settings.READ_CACHE_TIMEOUT:
+        return function()
+
+    key = read_key(request, user_id)
+
+    if settings.READ_CACHE_TIMEOUT:
+        compute = lambda: _cached(key, function, label) # noqa: E731
+    else:
+        compute = function
+
+    if not settings.READ_COALESCING:
+        return compute()
+
+    value, shared = _flights.do(key, compute)
+    if shared:
+        CACHE_REQUESTS.labels(cache=label, result="coalesced").inc()
+
+    return value
@@ -0,0 +1,99 @@
+"""
+Negotiated gzip/brotli compression, shared by CompressionMiddleware, the
+static files storage and the static files view.
+
+Brotli is optional: it's used when the brotli package is installed and the
+client accepts it, otherwise gzip.
+"""
+
+import gzip
+import re
+import zlib
+from django.conf import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = re.compile(
+    r"^(text/|application/(json|javascript|xml|vnd\.oai\.openapi)|image/svg\+xml|[^;]*\+(json|xml))"
+)
+
+
+def available_encodings():
+    """
+    Return the encodings this server can produce, preferred first.
+    """
+
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def accepted_encodings(accept_encoding):
+    """
+    Return the encodings accepted by an Accept-Encoding header value (q=0 means not accepted).
+    """
+
+    accepted = set()
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        match = re.search(r"q=([0-9.]+)", params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.strip().lower())
+
+    return accepted
+
+
+def choose_encoding(accept_encoding, encodings=None):
+    """
+    Return the preferred encoding of encodings that the client accepts, or None.
+    """
+
+    accepted = accepted_encodings(accept_encoding)
+
+    for encoding in encodings or available_encodings():
+        if encoding in accepted or "*" in accepted:
+            return encoding
+
+    return None
+
+
+def is_compressible(content_type):
+
+    return bool(COMPRESSIBLE_TYPES.match(content_type or ""))
+
+
+def compress(data, encoding, level=None):
+    """
+    Compress bytes with encoding ("br" or "gzip"), at the dynamic responses level by default.
+    """
+
+    if encoding == "br":
+        return brotli.compress(data, quality=settings.COMPRESSION_BROTLI_QUALITY if level is None else level)
+
+    return gzip.compress(data, compresslevel=settings.COMPRESSION_GZIP_LEVEL if level is None else level, mtime=0)
+
+
+def compress_stream(chunks, encoding):
+    """
+    Compress an iterable of byte chunks, flushing after every chunk so that clients receive them as they come.
+    """
+
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+        return
+
+    compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS) # gzip container
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
@@ -0,0 +1,153 @@
+"""
+Concurrency limits and load shedding of API requests.
+
+Every worker lets at most N requests of a route run at once. Each route (view
+name, e.g. "recipe_app:recipe-upload-image") has its own limiter, with the limit
+listed for it in CONCURRENCY_LIMITS or else the "default" one, so a slow route
+doesn't shed the requests of fast ones. A request over
+the limit waits in a bounded queue (CONCURRENCY_QUEUE_SIZE) for up to
+CONCURRENCY_QUEUE_TIMEOUT_MS, and is rejected right away with a 503 when the
+queue is full or the deadline passes, instead of piling up in the worker until
+everything times out.
+
+The limits are adaptive: each limiter keeps a baseline (a slow moving average
+of the latency of its route, following it up and down over a few hundred
+requests) and a smoothed latency (a fast one). When the smoothed latency goes
+over CONCURRENCY_LATENCY_TOLERANCE times the baseline (e.g. Postgres slows
+down) the limit shrinks multiplicatively, down to CONCURRENCY_MIN_LIMIT, and
+while latency is normal and the limit is in use it grows back by about one
+request per round trip, up to the configured limit.
+"""
+
+import threading
+import time
+from django.conf import settings
+from core_app import metrics
+
+
+class ConcurrencyLimiter:
+    """
+    An adaptive concurrency limit with a bounded, deadline-limited wait queue.
+    """
+
+    backoff = 0.9 # limit multiplier when latency is too high
+    smoothing = 0.2 # weight of a new latency in the smoothed latency
+    baseline_smoothing = 0.01 # weight of a new latency in the baseline
+
+    def __init__(self, name, max_limit, min_limit=1, queue_size=0, queue_timeout=0.0, tolerance=2.0, adaptive=True):
+
+        self.name = name
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.tolerance = tolerance
+        self.adaptive = adaptive
+
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self.baseline = None # seconds
+        self.smoothed = None # seconds
+        self._condition = threading.Condition()
+
+        metrics.CONCURRENCY_LIMIT.labels(route=self.name).set(self.max_limit)
+
+    @property
+    def current_limit(self):
+
+        return max(self.min_limit, int(self.limit))
+
+    def acquire(self):
+        """
+        Take a slot, waiting in the queue if needed. Returns None or the reason of the rejection.
+        """
+
+        with self._condition:
+            if self.in_flight < self.current_limit and not self.waiting:
+                self.in_flight += 1
+                return None
+
+            if self.waiting >= self.queue_size:
+                return "queue_full"
+
+            self.waiting += 1
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while self.in_flight >= self.current_limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._condition.wait(remaining):
+                        if self.in_flight < self.current_limit: # freed right at the deadline
+                            break
+                        return "timeout"
+            finally:
+                self.waiting -= 1
+
+            self.in_flight += 1
+            return None
+
+    def release(self, duration=None):
+        """
+        Free a slot, adapting the limit to the latency (seconds) of the request when given.
+        """
+
+        with self._condition:
+            self.in_flight -= 1
+            if duration is not None and self.adaptive:
+                self._adapt(duration)
+            self._condition.notify()
+
+    def _adapt(self, duration):
+
+        if self.baseline is None:
+            self.baseline = self.smoothed = duration
+        else:
+            self.baseline += (duration - self.baseline) * self.baseline_smoothing
+            self.smoothed += (duration - self.smoothed) * self.smoothing
+
+        previous = self.current_limit
+        if self.smoothed > self.baseline * self.tolerance:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+        elif self.in_flight + 1 >= previous: # the limit was in use, probe for more
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+        if self.current_limit != previous:
+            metrics.CONCURRENCY_LIMIT.labels(route=self.name).set(self.current_limit)
+            if self.current_limit > previous:
+                self._condition.notify(self.current_limit - previous)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(route):
+    """
+    Return the limiter of a route (a view name), with the "default" limit if the route has no limit of its own.
+    """
+
+    limiter = _limiters.get(route)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(route)
+            if limiter is None:
+                limiter = _limiters[route] = ConcurrencyLimiter(
+                    route,
+                    settings.CONCURRENCY_LIMITS.get(route, settings.CONCURRENCY_LIMITS["default"]),
+                    min_limit=settings.CONCURRENCY_MIN_LIMIT,
+                    queue_size=settings.CONCURRENCY_QUEUE_SIZE,
+                    queue_timeout=settings.CONCURRENCY_QUEUE_TIMEOUT_MS / 1000,
+                    tolerance=settings.CONCURRENCY_LATENCY_TOLERANCE,
+                    adaptive=settings.CONCURRENCY_ADAPTIVE,
+                )
+
+    return limiter
+
+
+def reset_limiters():
+    """
+    Forget the limiters, they are built again from the settings on the next request.
+    """
+
+    with _limiters_lock:
+        _limiters.clear()
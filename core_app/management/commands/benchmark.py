@@ -0,0 +1,49 @@
+"""
+Django command to run a benchmark suite.
+"""
+
+from importlib import import_module
+import json
+from django.core.management.base import BaseCommand, CommandError
+from benchmarks.utils import benchmark_database
+
+
+SUITES = ["recipe_list", "http_load", "micro", "middleware", "write_path", ]
+
+
+class Command(BaseCommand):
+    """
+    Django command to run a benchmark suite against a throwaway database.
+    """
+
+    help = "Run a benchmark suite and print the results as JSON."
+
+    def add_arguments(self, parser):
+
+        subparsers = parser.add_subparsers(dest="suite", required=True)
+
+        for suite in SUITES:
+            suite_parser = subparsers.add_parser(suite)
+            suite_parser.add_argument("--output", help="Also write the JSON results to this file.")
+            suite_parser.add_argument("--keepdb", action="store_true", help="Keep the benchmark database.")
+            import_module(f"benchmarks.{suite}").add_arguments(suite_parser)
+
+    def handle(self, *args, **options):
+        """
+        Entry point for command.
+        """
+
+        suite = import_module(f"benchmarks.{options['suite']}")
+
+        with benchmark_database(keepdb=options["keepdb"]):
+            results = suite.run(options)
+
+        report = json.dumps(results, indent=2)
+        self.stdout.write(report)
+
+        if options["output"]:
+            with open(options["output"], "w") as output_file:
+                output_file.write(report)
+
+        if results.get("failed"): # suites with regression gates set this
+            raise CommandError(f"Benchmark suite {options['suite']} found performance regressions.")
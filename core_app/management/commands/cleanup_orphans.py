@@ -0,0 +1,59 @@
+"""
+Django command to delete orphaned tags, ingredients and recipe image files.
+"""
+
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from core_app import cleanup
+
+
+class Command(BaseCommand):
+    """
+    Django command to run core_app.cleanup once, or periodically with --every.
+    """
+
+    help = "Delete unused tags and ingredients and unreferenced recipe images, in throttled batches."
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("--batch-size", type=int, default=cleanup.BATCH_SIZE, help="Rows or files per batch.")
+        parser.add_argument(
+            "--sleep", type=float, default=cleanup.PAUSE,
+            help="Seconds to pause between batches, to spread the load."
+        )
+        parser.add_argument(
+            "--min-age", type=int, default=cleanup.MIN_FILE_AGE,
+            help="Only delete files older than this many seconds."
+        )
+        parser.add_argument("--skip-items", action="store_true", help="Don't delete tags and ingredients.")
+        parser.add_argument("--skip-files", action="store_true", help="Don't delete image files.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the orphans.")
+        parser.add_argument("--every", type=int, help="Keep running, cleaning up every this many seconds.")
+
+    def handle(self, *args, **options):
+        """
+        Entry point for command.
+        """
+
+        while True:
+            results = cleanup.run_cleanup(
+                items=not options["skip_items"],
+                files=not options["skip_files"],
+                batch_size=options["batch_size"],
+                pause=options["sleep"],
+                min_age=options["min_age"],
+                dry_run=options["dry_run"],
+            )
+
+            verb = "found" if options["dry_run"] else "deleted"
+            for name, count in results.items():
+                self.stdout.write(f"{name}: {count} orphans {verb}.")
+
+            if not options["every"]:
+                break
+
+            close_old_connections() # don't hold a connection between runs
+            time.sleep(options["every"])
+
+        self.stdout.write(self.style.SUCCESS("Cleanup done!"))
@@ -0,0 +1,117 @@
+"""
+Django command to report where process startup time goes, module by module.
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+from django.core.management.base import BaseCommand, CommandError
+
+
+# code run in a fresh interpreter for each startup target
+TARGETS = {
+    "setup": "import django; django.setup()",
+    "urls": "import django; django.setup(); from django.urls import get_resolver; get_resolver().url_patterns",
+    "wsgi": "import project_config.wsgi; from django.urls import get_resolver; get_resolver().url_patterns",
+}
+
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def parse_import_times(output):
+    """
+    Parse `python -X importtime` output into a list of (module, self_us, cumulative_us).
+    """
+
+    modules = []
+    for line in output.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, _, module = match.groups()
+            modules.append((module, int(self_us), int(cumulative_us)))
+
+    return modules
+
+
+def summarize_import_times(modules, top=15):
+    """
+    Summarize import times by top-level package and by slowest modules, in milliseconds.
+    """
+
+    packages = {}
+    for module, self_us, _ in modules:
+        package = module.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+
+    slowest = sorted(modules, key=lambda item: item[1], reverse=True)[:top]
+
+    return {
+        "total_ms": round(sum(self_us for _, self_us, _ in modules) / 1000, 1),
+        "modules": len(modules),
+        "packages": [
+            {"package": package, "self_ms": round(self_us / 1000, 1)}
+            for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+        ],
+        "slowest_modules": [
+            {"module": module, "self_ms": round(self_us / 1000, 1), "cumulative_ms": round(cumulative_us / 1000, 1)}
+            for module, self_us, cumulative_us in slowest
+        ],
+    }
+
+
+class Command(BaseCommand):
+    """
+    Django command to profile import time of a fresh process.
+    """
+
+    help = "Report import time by package and module for a fresh process, and fail above a threshold."
+    requires_system_checks = [] # the command profiles a separate interpreter
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("--target", choices=TARGETS.keys(), default="wsgi",
+                            help="Startup path to profile (default: wsgi, i.e. what a worker loads).")
+        parser.add_argument("--repeat", type=int, default=3,
+                            help="Profile this many fresh processes and report the median one.")
+        parser.add_argument("--top", type=int, default=15, help="Number of packages/modules to show.")
+        parser.add_argument("--threshold-ms", type=float,
+                            help="Fail if the total import time is above this many milliseconds.")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        """
+        Entry point for command.
+        """
+
+        reports = []
+        for _ in range(max(options["repeat"], 1)):
+            result = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", TARGETS[options["target"]]],
+                capture_output=True, text=True, env=os.environ.copy()
+            )
+            if result.returncode != 0:
+                raise CommandError(f"Profiled process failed:\n{result.stderr[-2000:]}")
+
+            reports.append(summarize_import_times(parse_import_times(result.stderr), top=options["top"]))
+
+        # the median run is less sensitive to a cold disk cache or a noisy neighbour
+        report = sorted(reports, key=lambda item: item["total_ms"])[len(reports) // 2]
+        report["target"] = options["target"]
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.stdout.write(f"Total import time ({options['target']}): {report['total_ms']} ms "
+                              f"in {report['modules']} modules\n")
+            self.stdout.write("By package (self time):")
+            for item in report["packages"]:
+                self.stdout.write(f"  {item['self_ms']:>8} ms  {item['package']}")
+            self.stdout.write("Slowest modules (self / cumulative):")
+            for item in report["slowest_modules"]:
+                self.stdout.write(f"  {item['self_ms']:>8} / {item['cumulative_ms']:>8} ms  {item['module']}")
+
+        threshold = options["threshold_ms"]
+        if threshold is not None and report["total_ms"] > threshold:
+            raise CommandError(f"Import time {report['total_ms']} ms is above the {threshold} ms threshold.")
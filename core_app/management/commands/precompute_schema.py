@@ -0,0 +1,29 @@
+"""
+Django command to generate the OpenAPI schema into SCHEMA_CACHE_FILE.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from core_app.schema import generate_schema, write_schema_file
+
+
+class Command(BaseCommand):
+    """
+    Django command to precompute the OpenAPI schema served at /api/schema/.
+    """
+
+    help = "Generate the OpenAPI schema once and store it for the schema view."
+
+    def handle(self, *args, **options):
+        """
+        Entry point for command.
+        """
+
+        if settings.SCHEMA_CODE_VERSION is None:
+            raise CommandError("Set APP_VERSION so the stored schema can be matched to the code version.")
+
+        write_schema_file(generate_schema())
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Schema for version {settings.SCHEMA_CODE_VERSION} written to {settings.SCHEMA_CACHE_FILE}"
+        ))
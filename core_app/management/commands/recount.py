@@ -0,0 +1,48 @@
+"""
+Django command to repair the recipe counters of tags and ingredients.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core_app.models import Tag, Ingredient
+
+
+class Command(BaseCommand):
+    """
+    Django command to recompute Tag.recipe_count and Ingredient.recipe_count.
+    """
+
+    help = "Recompute recipe_count of tags and ingredients from the recipe through tables."
+
+    def add_arguments(self, parser):
+
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Number of items checked per transaction."
+        )
+
+    def handle(self, *args, **options):
+        """
+        Entry point for command.
+        """
+
+        for model in [Tag, Ingredient]:
+            repaired = 0
+            last_id = 0
+
+            while True: # walk the table in primary key batches to keep transactions short
+                batch = list(
+                    model.objects.filter(pk__gt=last_id).order_by("pk")
+                    .values_list("pk", flat=True)[:options["batch_size"]]
+                )
+                if not batch:
+                    break
+
+                with transaction.atomic():
+                    repaired += model.objects.filter(pk__in=batch).recount()
+
+                last_id = batch[-1]
+
+            self.stdout.write(f"{model._meta.verbose_name_plural}: {repaired} counters repaired.")
+
+        self.stdout.write(self.style.SUCCESS("Recipe counters are up to date!"))
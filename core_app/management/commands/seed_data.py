@@ -0,0 +1,65 @@
+"""
+Django command to fill the database with a synthetic dataset.
+"""
+
+import time
+from django.core.management.base import BaseCommand
+from core_app.seeding import DatasetGenerator
+
+
+class Command(BaseCommand):
+    """
+    Django command to generate users with recipes, tags and ingredients.
+    """
+
+    help = "Generate a deterministic, skewed synthetic dataset with bulk inserts."
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("--users", type=int, default=100, help="Number of users to create.")
+        parser.add_argument("--first-user", type=int, default=0,
+                            help="Index of the first user, to add more users to an existing dataset.")
+        parser.add_argument("--recipes-per-user", type=int, default=50, help="Mean number of recipes per user.")
+        parser.add_argument("--tags-per-user", type=int, default=30, help="Mean number of tags per user.")
+        parser.add_argument("--ingredients-per-user", type=int, default=60,
+                            help="Mean number of ingredients per user.")
+        parser.add_argument("--max-tags-per-recipe", type=int, default=8)
+        parser.add_argument("--max-ingredients-per-recipe", type=int, default=15)
+        parser.add_argument("--images", action="store_true", help="Store a placeholder image for every recipe.")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed, the same seed gives the same data.")
+        parser.add_argument("--password", default="seedpass123", help="Password of every generated user.")
+        parser.add_argument("--chunk-size", type=int, default=100, help="Users created per transaction.")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per INSERT statement.")
+
+    def handle(self, *args, **options):
+        """
+        Entry point for command.
+        """
+
+        generator = DatasetGenerator(
+            seed=options["seed"],
+            recipes_per_user=options["recipes_per_user"],
+            tags_per_user=options["tags_per_user"],
+            ingredients_per_user=options["ingredients_per_user"],
+            max_tags_per_recipe=options["max_tags_per_recipe"],
+            max_ingredients_per_recipe=options["max_ingredients_per_recipe"],
+            images=options["images"],
+            password=options["password"],
+            batch_size=options["batch_size"],
+        )
+
+        totals = {}
+        start = time.perf_counter()
+        last_user = options["first_user"] + options["users"]
+
+        for first in range(options["first_user"], last_user, options["chunk_size"]):
+            counts = generator.generate_users(first, min(options["chunk_size"], last_user - first))
+
+            for name, count in counts.items():
+                totals[name] = totals.get(name, 0) + count
+
+            rows = sum(totals.values())
+            self.stdout.write(f"{totals['users']} users, {rows} rows ({rows / (time.perf_counter() - start):.0f} rows/s)")
+
+        summary = ", ".join(f"{count} {name}" for name, count in totals.items())
+        self.stdout.write(self.style.SUCCESS(f"Created {summary} in {time.perf_counter() - start:.1f}s"))
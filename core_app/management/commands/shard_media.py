@@ -0,0 +1,107 @@
+"""
+Django command to move recipe images to the sharded directory layout.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+import posixpath
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core_app.models import RECIPE_IMAGE_DIRECTORY, Recipe, sharded_image_path
+
+
+# images stored directly in uploads/recipe/, the layout before sharding
+FLAT_IMAGE_REGEX = rf"^{RECIPE_IMAGE_DIRECTORY}/[^/]+$"
+
+
+def link_file(storage, old_name, new_name):
+    """
+    Make the file available under new_name too. Returns whether the image is available there.
+
+    On the filesystem that's a hard link (no data is copied), other storages get a copy.
+    """
+
+    if storage.exists(new_name): # done by an interrupted run
+        return True
+    if not storage.exists(old_name):
+        return False
+
+    try:
+        old_path, new_path = storage.path(old_name), storage.path(new_name)
+    except NotImplementedError: # not a local filesystem
+        with storage.open(old_name) as old_file:
+            storage.save(new_name, old_file)
+        return True
+
+    os.makedirs(os.path.dirname(new_path), exist_ok=True)
+    try:
+        os.link(old_path, new_path)
+    except FileExistsError: # linked by another worker
+        pass
+
+    return True
+
+
+class Command(BaseCommand):
+    """
+    Django command to move existing recipe images from uploads/recipe/ to uploads/recipe/ab/cd/.
+    """
+
+    help = "Move recipe images to the sharded layout and update Recipe.image, in resumable batches."
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("--batch-size", type=int, default=500, help="Recipes updated per transaction.")
+        parser.add_argument("--workers", type=int, default=8, help="Files linked in parallel.")
+        parser.add_argument("--sleep", type=float, default=0.1, help="Seconds to pause between batches.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the images to move.")
+
+    def handle(self, *args, **options):
+        """
+        Entry point for command.
+        """
+
+        storage = Recipe._meta.get_field("image").storage
+        pending = Recipe.objects.filter(image__regex=FLAT_IMAGE_REGEX)
+
+        if options["dry_run"]:
+            self.stdout.write(f"{pending.count()} images to move.")
+            return
+
+        moved = missing = 0
+        last_id = 0
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            while True: # rows that were moved no longer match, so an interrupted run resumes where it stopped
+                batch = list(
+                    pending.filter(pk__gt=last_id).order_by("pk").values_list("pk", "image")[:options["batch_size"]]
+                )
+                if not batch:
+                    break
+                last_id = batch[-1][0]
+
+                new_names = [sharded_image_path(posixpath.basename(image)) for pk, image in batch]
+                available = executor.map(lambda names: link_file(storage, *names), zip([image for pk, image in batch], new_names))
+
+                updated = []
+                with transaction.atomic():
+                    for (pk, image), new_name, is_available in zip(batch, new_names, available):
+                        if not is_available:
+                            missing += 1
+                            continue
+                        # unless the recipe got a new image in the meantime (cleanup_orphans takes the link then)
+                        if Recipe.objects.filter(pk=pk, image=image).update(image=new_name):
+                            updated.append(image)
+
+                # the old names are only removed once no row points to them
+                list(executor.map(storage.delete, updated))
+                moved += len(updated)
+
+                self.stdout.write(f"{moved} images moved...")
+                time.sleep(options["sleep"])
+
+        if missing:
+            self.stdout.write(self.style.WARNING(f"{missing} images referenced by recipes don't exist, left as they are."))
+
+        self.stdout.write(self.style.SUCCESS(f"{moved} images moved to the sharded layout!"))
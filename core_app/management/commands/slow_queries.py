@@ -0,0 +1,63 @@
+"""
+Django command to show the slow query log.
+"""
+
+from django.core.management.base import BaseCommand
+from core_app.models import SlowQuery
+
+
+ORDERINGS = {
+    "total": "-total_duration_ms",
+    "max": "-max_duration_ms",
+    "calls": "-calls",
+    "recent": "-last_seen",
+}
+
+
+class Command(BaseCommand):
+    """
+    Django command to list the queries recorded by core_app.slow_queries.
+    """
+
+    help = "List the slowest queries recorded by the slow query log, with their plans."
+
+    def add_arguments(self, parser):
+
+        parser.add_argument(
+            "--order", choices=ORDERINGS, default="total",
+            help="Sort by total time (default), max time, number of calls or last seen."
+        )
+        parser.add_argument("--limit", type=int, default=20, help="Number of queries shown.")
+        parser.add_argument("--view", help="Only show queries issued by this view (e.g. recipe_app:recipe-list).")
+        parser.add_argument("--plans", action="store_true", help="Also print the query plans.")
+        parser.add_argument("--clear", action="store_true", help="Delete the recorded queries.")
+
+    def handle(self, *args, **options):
+        """
+        Entry point for command.
+        """
+
+        queries = SlowQuery.objects.all()
+        if options["view"]:
+            queries = queries.filter(view=options["view"])
+
+        if options["clear"]:
+            deleted, _ = queries.delete()
+            self.stdout.write(self.style.SUCCESS(f"{deleted} slow queries deleted."))
+            return
+
+        queries = queries.order_by(ORDERINGS[options["order"]])[:options["limit"]]
+
+        for query in queries:
+            average = query.total_duration_ms / query.calls
+            self.stdout.write(self.style.WARNING(
+                f"{query.view}: {query.calls} calls, {query.total_duration_ms:.1f} ms total, "
+                f"{average:.1f} ms avg, {query.max_duration_ms:.1f} ms max (last {query.last_seen:%Y-%m-%d %H:%M})"
+            ))
+            self.stdout.write(f"  {query.sql}")
+            if options["plans"] and query.plan:
+                for line in query.plan.splitlines():
+                    self.stdout.write(f"    {line}")
+
+        if not queries:
+            self.stdout.write("No slow queries recorded.")
@@ -13,6 +13,8 @@ class Command(BaseCommand):
     Django command to wait for the database.
     """
 
+    requires_system_checks = [] # handle() runs the checks itself once the database is up
+
     def handle(self, *args, **options):
         """
         Entry point for command.
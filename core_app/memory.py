@@ -0,0 +1,182 @@
+"""
+Memory profiling and recycling of workers.
+
+With MEMORY_PROFILING=1 (or through the staff-only /api/profile/memory/
+endpoint, for a single worker) a worker traces its allocations with
+tracemalloc: a background thread takes a snapshot every
+MEMORY_SNAPSHOT_INTERVAL seconds and logs the allocation sites that grew the
+most since the previous one, and MemoryMiddleware records the peak memory
+allocated by every request in the request_peak_memory_bytes metric.
+Tracing slows the worker down, so it's meant to be turned on while
+investigating.
+
+Independently of tracing, when MEMORY_CEILING_MB is set a worker whose
+resident memory goes over it sends itself SIGTERM, which process managers
+like gunicorn handle by finishing the current requests and starting a fresh
+worker.
+"""
+
+import logging
+import os
+import signal
+import threading
+import tracemalloc
+from django.conf import settings
+
+
+logger = logging.getLogger("core_app.memory")
+
+_profiler = None # the MemoryProfiler of the process
+_profiler_lock = threading.Lock()
+_recycling = False
+
+
+def current_rss():
+    """
+    Return the resident memory of the process in bytes, or None if unknown.
+    """
+
+    try:
+        with open("/proc/self/statm") as statm: # linux only
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+class MemoryProfiler:
+    """
+    Trace allocations and periodically report the allocation sites that grew the most.
+    """
+
+    def __init__(self, interval=None, top=None, frames=None):
+
+        self.interval = interval or settings.MEMORY_SNAPSHOT_INTERVAL
+        self.top = top or settings.MEMORY_TOP_N
+        self.frames = frames or settings.MEMORY_TRACEBACK_FRAMES
+        self.pid = os.getpid()
+        self._previous = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock() # reports come from the thread and the endpoint
+        self._thread = None
+
+    def take_snapshot(self):
+
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ])
+
+    def start(self):
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self._previous = self.take_snapshot()
+
+        self._thread = threading.Thread(target=self._run, name="memory-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+
+        self._stopped.set()
+        with self._lock:
+            self._previous = None
+            tracemalloc.stop()
+
+    def _run(self):
+
+        while not self._stopped.wait(self.interval):
+            self.report()
+
+    def report(self):
+        """
+        Diff a new snapshot with the previous one, log and return the top allocation sites.
+        """
+
+        with self._lock:
+            if self._previous is None: # stopped
+                return None
+            current = self.take_snapshot()
+            stats = current.compare_to(self._previous, "lineno")[:self.top]
+            self._previous = current
+            traced, peak = tracemalloc.get_traced_memory()
+
+        report = {
+            "pid": self.pid,
+            "rss_bytes": current_rss(),
+            "traced_bytes": traced,
+            "traced_peak_bytes": peak,
+            "top": [
+                {
+                    "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    "size_bytes": stat.size,
+                    "size_diff_bytes": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                }
+                for stat in stats
+            ],
+        }
+
+        logger.info(
+            "Memory of process %s: %s bytes traced, top growth: %s",
+            self.pid, traced, "; ".join(f"{site['site']} {site['size_diff_bytes']:+d} B" for site in report["top"])
+        )
+
+        return report
+
+
+def start_profiling(**options):
+    """
+    Start tracing the allocations of this process, returns the profiler (the running one if any).
+    """
+
+    global _profiler
+
+    with _profiler_lock:
+        if _profiler is None or _profiler.pid != os.getpid(): # a forked worker starts its own thread
+            _profiler = MemoryProfiler(**options)
+            _profiler.start()
+
+        return _profiler
+
+
+def stop_profiling():
+
+    global _profiler
+
+    with _profiler_lock:
+        if _profiler is not None:
+            _profiler.stop()
+            _profiler = None
+
+
+def get_profiler():
+    """
+    Return the running profiler of this process, or None.
+    """
+
+    profiler = _profiler
+
+    return profiler if profiler is not None and profiler.pid == os.getpid() else None
+
+
+def check_memory_ceiling():
+    """
+    Ask the process to exit gracefully if its resident memory is over MEMORY_CEILING_MB.
+    """
+
+    global _recycling
+
+    if _recycling or not settings.MEMORY_CEILING_MB:
+        return
+
+    rss = current_rss()
+    if rss is not None and rss > settings.MEMORY_CEILING_MB * 1024 * 1024:
+        _recycling = True
+        logger.warning(
+            "Process %s uses %.0f MB (ceiling %s MB), recycling it",
+            os.getpid(), rss / 1024 / 1024, settings.MEMORY_CEILING_MB
+        )
+        os.kill(os.getpid(), signal.SIGTERM)
+
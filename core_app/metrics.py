@@ -0,0 +1,144 @@
+"""
+Prometheus metrics exposed on /metrics, with prometheus_client.
+
+With a single process /metrics exposes the metrics of the process. When the
+app runs in several worker processes, set PROMETHEUS_MULTIPROC_DIR to a
+directory shared by the workers (and empty it on every deploy) before they
+start: prometheus_client then keeps the values of every worker in files there
+and /metrics merges them, so scraping any worker shows the whole instance.
+The process manager calls mark_process_dead when a worker exits (gunicorn's
+child_exit hook in gunicorn.conf.py) to drop the gauges of the worker, its
+counters are kept so that the totals don't go backwards.
+
+Outside DEBUG only the addresses in METRICS_ALLOWED_IPS can read /metrics
+(REMOTE_ADDR, scrape the workers directly rather than through a proxy).
+"""
+
+import ipaddress
+import threading
+import time
+import weakref
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, \
+     generate_latest
+from prometheus_client.multiprocess import MultiProcessCollector
+from core_app.memory import current_rss
+
+
+PROCESS_GAUGES_INTERVAL = 5 # seconds between updates of the gauges of the process
+
+REQUESTS = Counter(
+    "http_requests_total", "HTTP requests handled, by view, method and status code.",
+    ["view", "method", "status"],
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time spent handling HTTP requests, by view and method.",
+    ["view", "method"],
+)
+REQUEST_PEAK_MEMORY = Histogram(
+    "http_request_peak_memory_bytes",
+    "Peak memory allocated while handling requests, by view (only while tracemalloc traces the worker).",
+    ["view"], buckets=[2 ** power * 1024 * 1024 for power in range(10)], # 1 MB to 512 MB
+)
+DB_QUERIES = Counter("db_queries_total", "SQL queries executed by API requests, by view.", ["view"])
+DB_QUERY_TIME = Counter("db_query_duration_seconds_total", "Time spent in SQL queries by API requests, by view.", ["view"])
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups, by cache and result (hit or miss).", ["cache", "result"])
+DB_CONNECTIONS_CREATED = Counter("db_connections_created_total", "Database connections opened, by alias.", ["alias"])
+# in multiprocess mode the gauges of the live workers are summed
+DB_CONNECTIONS_OPEN = Gauge(
+    "db_connections_open", "Database connections currently open, by alias.", ["alias"], multiprocess_mode="livesum",
+)
+# a single process reports it through the process collector of prometheus_client, so not registered
+RESIDENT_MEMORY = Gauge(
+    "process_resident_memory_bytes", "Resident memory of the worker processes.", multiprocess_mode="livesum",
+    registry=None,
+)
+CONCURRENCY_LIMIT = Gauge(
+    "concurrency_limit", "Current adaptive concurrency limit of API requests, by route.", ["route"],
+    multiprocess_mode="livesum",
+)
+CONCURRENCY_REJECTED = Counter(
+    "concurrency_rejected_total", "API requests shed by the concurrency limits, by route and reason.",
+    ["route", "reason"],
+)
+
+
+# database wrappers (one per thread and alias) that opened a connection
+_connections = weakref.WeakSet()
+_connections_lock = threading.Lock()
+_gauges_updated = 0.0
+
+
+def track_connection(sender, connection, **kwargs):
+    """
+    connection_created signal handler.
+    """
+
+    with _connections_lock:
+        _connections.add(connection)
+    DB_CONNECTIONS_CREATED.labels(alias=connection.alias).inc()
+
+
+def update_process_gauges(force=False):
+    """
+    Update the open connections and resident memory gauges, every PROCESS_GAUGES_INTERVAL seconds.
+    """
+
+    global _gauges_updated
+
+    now = time.monotonic()
+    if not force and now - _gauges_updated < PROCESS_GAUGES_INTERVAL:
+        return
+    _gauges_updated = now
+
+    open_connections = dict.fromkeys(settings.DATABASES, 0)
+
+    with _connections_lock:
+        wrappers = list(_connections)
+
+    for wrapper in wrappers:
+        if wrapper.connection is not None:
+            open_connections[wrapper.alias] = open_connections.get(wrapper.alias, 0) + 1
+
+    for alias, count in open_connections.items():
+        DB_CONNECTIONS_OPEN.labels(alias=alias).set(count)
+
+    rss = current_rss()
+    if rss is not None:
+        RESIDENT_MEMORY.set(rss)
+
+
+def metrics_allowed(request):
+    """
+    Whether the client may read the metrics.
+    """
+
+    if settings.DEBUG:
+        return True
+
+    try:
+        address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+
+    return any(address in ipaddress.ip_network(network, strict=False) for network in settings.METRICS_ALLOWED_IPS)
+
+
+def metrics_view(request):
+    """
+    Expose the metrics of the instance to Prometheus.
+    """
+
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+
+    update_process_gauges(force=True)
+
+    if settings.METRICS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry, path=settings.METRICS_MULTIPROC_DIR)
+    else:
+        registry = REGISTRY
+
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,397 @@
+"""
+Project middleware.
+"""
+
+import json
+import logging
+import math
+import time
+import tracemalloc
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.db import connection
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.module_loading import import_string
+from core_app import compression, concurrency, memory, metrics, profiling, timing
+from core_app.slow_queries import SlowQueryRecorder
+
+
+timing_logger = logging.getLogger("core_app.timing")
+
+
+def view_label(request):
+    """
+    Return the url name of the view that served the request, used to label metrics.
+    """
+
+    match = request.resolver_match
+    if match is None:
+        return "<unresolved>"
+
+    return match.url_name or "<unnamed>"
+
+
+class ProfilingMiddleware:
+    """
+    Keep track of the path served by every thread, for the sampling profiler (see core_app.profiling).
+    """
+
+    def __init__(self, get_response):
+
+        self.get_response = get_response
+
+    def __call__(self, request):
+
+        profiling.request_started(request.path_info)
+        try:
+            return self.get_response(request)
+        finally:
+            profiling.request_finished()
+
+
+class MemoryMiddleware:
+    """
+    Record the peak memory of requests while allocations are traced, and recycle the
+    worker when it goes over MEMORY_CEILING_MB (see core_app.memory).
+    """
+
+    def __init__(self, get_response):
+
+        self.get_response = get_response
+        self._last_check = 0.0
+
+    def __call__(self, request):
+
+        if settings.MEMORY_PROFILING and memory.get_profiler() is None:
+            memory.start_profiling() # started by every worker on its first request
+
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            # the peak is process wide, with threaded workers it includes concurrent requests
+            tracemalloc.reset_peak()
+            start = tracemalloc.get_traced_memory()[0]
+
+        response = self.get_response(request)
+
+        if tracing and tracemalloc.is_tracing():
+            peak = tracemalloc.get_traced_memory()[1] - start
+            metrics.REQUEST_PEAK_MEMORY.labels(view=view_label(request)).observe(max(peak, 0))
+
+        now = time.monotonic()
+        if now - self._last_check >= 1.0: # reading the resident memory once a second is enough
+            self._last_check = now
+            memory.check_memory_ceiling()
+
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Record request counts and latencies, and the database usage of API requests, in core_app.metrics.
+
+    Goes before RequestTimingMiddleware, whose request.timings it reads.
+    """
+
+    def __init__(self, get_response):
+
+        self.get_response = get_response
+
+    def __call__(self, request):
+
+        start = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        view = view_label(request)
+        metrics.REQUESTS.labels(view=view, method=request.method, status=response.status_code).inc()
+        metrics.REQUEST_LATENCY.labels(view=view, method=request.method).observe(duration)
+
+        timings = getattr(request, "timings", None)
+        if timings is not None:
+            metrics.DB_QUERIES.labels(view=view).inc(timings.db_queries)
+            metrics.DB_QUERY_TIME.labels(view=view).inc(timings.db_time)
+
+        metrics.update_process_gauges()
+
+        return response
+
+
+class RequestTimingMiddleware:
+    """
+    Measure total, database, serialization and render time of API requests.
+
+    The timings are available as request.timings, and optionally sent in a
+    Server-Timing header (SERVER_TIMING_HEADER) and logged as one JSON line
+    per request (REQUEST_TIMING_LOG).
+    """
+
+    def __init__(self, get_response):
+
+        self.get_response = get_response
+
+    def __call__(self, request):
+
+        if not request.path_info.startswith(settings.API_PATH_PREFIX):
+            return self.get_response(request)
+
+        request.timings = timing.RequestTimings()
+        token = timing.activate(request.timings)
+
+        try:
+            with connection.execute_wrapper(request.timings.record_query):
+                response = self.get_response(request)
+        finally:
+            timing.deactivate(token)
+
+        request.timings.finish()
+
+        if settings.SERVER_TIMING_HEADER:
+            response["Server-Timing"] = request.timings.server_timing_header()
+
+        if settings.REQUEST_TIMING_LOG:
+            match = request.resolver_match
+            timing_logger.info(json.dumps({
+                "method": request.method,
+                "path": request.path_info,
+                "view": match.view_name if match else None,
+                "status": response.status_code,
+                **request.timings.as_dict(),
+            }))
+
+        return response
+
+    def process_template_response(self, request, response):
+        """
+        Time rendering of DRF responses, which happens right after this hook.
+        """
+
+        timings = getattr(request, "timings", None)
+
+        if timings is not None:
+            start = time.perf_counter()
+            response.add_post_render_callback(lambda rendered: timings.add("render", time.perf_counter() - start))
+
+        return response
+
+
+class SlowQueryLogMiddleware:
+    """
+    Record the queries slower than SLOW_QUERY_THRESHOLD_MS in the slow query log (see core_app.slow_queries).
+    """
+
+    def __init__(self, get_response):
+
+        self.get_response = get_response
+
+    def __call__(self, request):
+
+        if not settings.SLOW_QUERY_LOG:
+            return self.get_response(request)
+
+        with connection.execute_wrapper(SlowQueryRecorder(request)):
+            return self.get_response(request)
+
+
+class ConcurrencyLimitMiddleware:
+    """
+    Limit the API requests that run at once per route, shedding the excess with a
+    503 (see core_app.concurrency).
+
+    The slot is taken in process_view, once the route is known, and freed when the
+    response leaves the middleware.
+    """
+
+    def __init__(self, get_response):
+
+        self.get_response = get_response
+
+    def __call__(self, request):
+
+        try:
+            return self.get_response(request)
+        finally:
+            limiter = getattr(request, "concurrency_limiter", None)
+            if limiter is not None:
+                limiter.release(time.perf_counter() - request.concurrency_start)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+
+        if not settings.CONCURRENCY_LIMITING or not request.path_info.startswith(settings.API_PATH_PREFIX):
+            return None
+
+        limiter = concurrency.get_limiter(request.resolver_match.view_name)
+        reason = limiter.acquire()
+        if reason is not None:
+            metrics.CONCURRENCY_REJECTED.labels(route=limiter.name, reason=reason).inc()
+            response = JsonResponse({"detail": "The server is overloaded, try again later."}, status=503)
+            response["Retry-After"] = "1"
+            return response
+
+        request.concurrency_limiter = limiter
+        request.concurrency_start = time.perf_counter() # excludes the time spent queued
+
+        return None
+
+
+class CompressionMiddleware:
+    """
+    Compress responses with gzip or brotli (negotiated with Accept-Encoding) when
+    they are larger than COMPRESSION_MIN_SIZE, and streaming responses as they stream.
+
+    Part of API_MIDDLEWARE: pages with CSRF tokens (admin) aren't compressed to
+    stay clear of BREACH.
+    """
+
+    def __init__(self, get_response):
+
+        self.get_response = get_response
+
+    def __call__(self, request):
+
+        response = self.get_response(request)
+
+        if (
+            response.has_header("Content-Encoding")
+            or response.status_code in (204, 206, 304)
+            or not compression.is_compressible(response.get("Content-Type"))
+        ):
+            return response
+
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ["Accept-Encoding", ])
+        encoding = compression.choose_encoding(request.headers.get("Accept-Encoding", ""))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compression.compress_stream(response.streaming_content, encoding)
+            del response["Content-Length"]
+        else:
+            compressed = compression.compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response["Content-Length"] = str(len(compressed))
+
+        # the compressed body isn't byte for byte the same anymore
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = f"W/{etag}"
+
+        response["Content-Encoding"] = encoding
+
+        return response
+
+
+class RateLimitHeadersMiddleware:
+    """
+    Add RateLimit-* headers describing the throttle bucket used by the request (see core_app.throttling).
+    """
+
+    def __init__(self, get_response):
+
+        self.get_response = get_response
+
+    def __call__(self, request):
+
+        response = self.get_response(request)
+
+        state = getattr(request, "ratelimit", None)
+        if state is not None:
+            response["RateLimit-Limit"] = str(state.limit)
+            response["RateLimit-Remaining"] = str(state.remaining)
+            response["RateLimit-Reset"] = str(math.ceil(state.reset_after))
+
+        return response
+
+
+class MiddlewareStack:
+    """
+    A chain of middleware built like Django builds MIDDLEWARE, with their view, template
+    response and exception hooks (Django only calls the hooks of the middleware in MIDDLEWARE).
+    """
+
+    def __init__(self, middleware_paths, get_response):
+
+        self.view_hooks = []
+        self.template_response_hooks = []
+        self.exception_hooks = []
+
+        handler = get_response
+        for middleware_path in reversed(middleware_paths):
+            try:
+                middleware = import_string(middleware_path)(handler)
+            except MiddlewareNotUsed:
+                continue
+
+            # same order as django.core.handlers.base.BaseHandler.load_middleware
+            if hasattr(middleware, "process_view"):
+                self.view_hooks.insert(0, middleware.process_view)
+            if hasattr(middleware, "process_template_response"):
+                self.template_response_hooks.append(middleware.process_template_response)
+            if hasattr(middleware, "process_exception"):
+                self.exception_hooks.append(middleware.process_exception)
+
+            handler = convert_exception_to_response(middleware)
+
+        self.handler = handler
+
+
+class RoutedMiddleware:
+    """
+    Run token authenticated API requests through the lean API_MIDDLEWARE and every
+    other request (admin, docs) through FULL_MIDDLEWARE.
+
+    The API doesn't use sessions, so it skips the session, CSRF, authentication and
+    messages middleware. Paths in FULL_MIDDLEWARE_API_PATHS (e.g. the docs) keep the
+    full stack.
+    """
+
+    sync_capable = True
+    async_capable = False
+
+    def __init__(self, get_response):
+
+        self.full_stack = MiddlewareStack(settings.FULL_MIDDLEWARE, get_response)
+        self.api_stack = MiddlewareStack(settings.API_MIDDLEWARE, get_response)
+
+    def _stack(self, request):
+
+        path = request.path_info
+        if path.startswith(settings.API_PATH_PREFIX) and not path.startswith(tuple(settings.FULL_MIDDLEWARE_API_PATHS)):
+            return self.api_stack
+
+        return self.full_stack
+
+    def __call__(self, request):
+
+        return self._stack(request).handler(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+
+        for hook in self._stack(request).view_hooks:
+            response = hook(request, view_func, view_args, view_kwargs)
+            if response is not None:
+                return response
+
+        return None
+
+    def process_template_response(self, request, response):
+
+        for hook in self._stack(request).template_response_hooks:
+            response = hook(request, response)
+
+        return response
+
+    def process_exception(self, request, exception):
+
+        for hook in self._stack(request).exception_hooks:
+            response = hook(request, exception)
+            if response is not None:
+                return response
+
+        return None
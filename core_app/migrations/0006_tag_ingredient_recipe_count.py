@@ -0,0 +1,48 @@
+# Generated by Django 4.2 on 2026-10-19 07:53
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def populate_recipe_counts(apps, schema_editor):
+    """
+    Fill recipe_count of existing tags and ingredients from the through tables.
+    """
+
+    Recipe = apps.get_model("core_app", "Recipe")
+
+    for field_name, item_field in [("tags", "tag_id"), ("ingredients", "ingredient_id")]:
+        field = Recipe._meta.get_field(field_name)
+        through = field.remote_field.through
+        links = through.objects.filter(**{item_field: models.OuterRef("pk")}).order_by()
+        count = links.values(item_field).annotate(count=models.Count("pk")).values("count")
+        field.related_model.objects.update(recipe_count=Coalesce(models.Subquery(count), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_app', '0005_recipe_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'recipe_count'], name='ingredient_user_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'recipe_count'], name='tag_user_count_idx'),
+        ),
+        migrations.RunPython(populate_recipe_counts, migrations.RunPython.noop),
+    ]
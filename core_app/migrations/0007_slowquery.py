@@ -0,0 +1,35 @@
+# Generated by Django 4.2 on 2026-10-19 08:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_app', '0006_tag_ingredient_recipe_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=40)),
+                ('view', models.CharField(max_length=255)),
+                ('sql', models.TextField()),
+                ('plan', models.TextField(blank=True)),
+                ('calls', models.PositiveIntegerField(default=1)),
+                ('total_duration_ms', models.FloatField()),
+                ('max_duration_ms', models.FloatField()),
+                ('first_seen', models.DateTimeField(auto_now_add=True)),
+                ('last_seen', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'slow queries',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='slowquery',
+            constraint=models.UniqueConstraint(fields=('fingerprint', 'view'), name='slowquery_fingerprint_view_uniq'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2 on 2026-10-19 08:40
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Merge the tags and ingredients of a user that share a name into the oldest one.
+    """
+
+    Recipe = apps.get_model("core_app", "Recipe")
+
+    for field_name, item_field in [("tags", "tag_id"), ("ingredients", "ingredient_id")]:
+        field = Recipe._meta.get_field(field_name)
+        through = field.remote_field.through
+        model = field.related_model
+
+        groups = model.objects.values("user_id", "name").annotate(keep=models.Min("pk"), items=models.Count("pk")) \
+            .filter(items__gt=1).order_by()
+        if not groups:
+            continue
+
+        for group in groups:
+            duplicate_ids = list(
+                model.objects.filter(user_id=group["user_id"], name=group["name"]).exclude(pk=group["keep"])
+                .values_list("pk", flat=True)
+            )
+            duplicate_links = through.objects.filter(**{f"{item_field}__in": duplicate_ids})
+            recipe_ids = set(duplicate_links.values_list("recipe_id", flat=True))
+            recipe_ids -= set(through.objects.filter(**{item_field: group["keep"]}).values_list("recipe_id", flat=True))
+
+            duplicate_links.delete()
+            through.objects.bulk_create([through(recipe_id=recipe_id, **{item_field: group["keep"]}) for recipe_id in recipe_ids])
+            model.objects.filter(pk__in=duplicate_ids).delete()
+
+        links = through.objects.filter(**{item_field: models.OuterRef("pk")}).order_by()
+        count = links.values(item_field).annotate(count=models.Count("pk")).values("count")
+        model.objects.update(recipe_count=Coalesce(models.Subquery(count), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_app', '0007_slowquery'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
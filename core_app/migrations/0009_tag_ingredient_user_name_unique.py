@@ -0,0 +1,22 @@
+# Generated by Django 4.2 on 2026-10-19 08:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_app', '0008_merge_duplicate_tags_ingredients'),
+    ]
+
+    operations = [
+        # separate from the data migration, postgres can't alter tables with pending trigger events
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='ingredient_user_name_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='tag_user_name_unique'),
+        ),
+    ]
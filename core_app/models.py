@@ -2,7 +2,8 @@
 Database models.
 """
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.conf import settings
 import uuid
@@ -12,6 +13,19 @@ import os
 USER_MODEL = settings.AUTH_USER_MODEL
 
 
+RECIPE_IMAGE_DIRECTORY = "uploads/recipe"
+
+
+def sharded_image_path(filename):
+    """
+    Return the path of a recipe image in the fan-out layout, e.g., uploads/recipe/ab/cd/abcd1234.jpg.
+
+    Two levels of 256 directories (uuid names are random) keep every directory small.
+    """
+
+    return "/".join([RECIPE_IMAGE_DIRECTORY, filename[:2], filename[2:4], filename])
+
+
 def recipe_image_file_path(instance, filename):
     """
     Generate file path for new recipe image.
@@ -20,7 +34,7 @@ def recipe_image_file_path(instance, filename):
     ext = os.path.splitext(filename)[1] # get file extension
     new_filename = f"{uuid.uuid4()}{ext}" # create new filename
 
-    return os.path.join("uploads", "recipe", new_filename) # return path to image
+    return sharded_image_path(new_filename) # return path to image
 
 
 class UserManager(BaseUserManager):
@@ -71,6 +85,163 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = "email" # use email field for authentication
 
 
+class RecipeAttributeQuerySet(models.QuerySet):
+    """
+    QuerySet for Recipe attributes (i.e., tags, ingredients).
+    """
+
+    def recipe_count_subquery(self):
+        """
+        Return a subquery that counts the recipes linked to the item in the outer query.
+        """
+
+        through = self.model._meta.get_field("recipe").through
+        item_field = f"{self.model._meta.model_name}_id" # e.g., tag_id
+
+        links = through.objects.filter(**{item_field: models.OuterRef("pk")}).order_by()
+
+        return Coalesce(
+            models.Subquery(links.values(item_field).annotate(count=models.Count("pk")).values("count")),
+            0
+        )
+
+    def get_or_create_many(self, user, names):
+        """
+        Return the items of user with the given names (in that order), creating the missing ones.
+
+        Takes one query, three when some are missing. Items created concurrently
+        by another request are skipped by the insert (the user/name unique
+        constraint, ON CONFLICT DO NOTHING) and read back, so neither request fails.
+        The items are locked until the end of the transaction so that the cleanup
+        of unused items (core_app.cleanup) doesn't delete them before they're linked,
+        an item it deleted meanwhile is created again.
+        """
+
+        names = list(dict.fromkeys(names)) # unique, in order
+        if not names:
+            return []
+
+        with transaction.atomic(savepoint=False):
+            # in pk order, no deadlocks
+            locked = self.order_by("pk").select_for_update(no_key=True)
+            items = {item.name: item for item in locked.filter(user=user, name__in=names)}
+            missing = [name for name in names if name not in items]
+
+            if missing:
+                self.bulk_create([self.model(user=user, name=name) for name in missing], ignore_conflicts=True)
+                items.update({item.name: item for item in locked.filter(user=user, name__in=missing)})
+
+        return [items[name] for name in names]
+
+    def _invalidate_reads(self, user_ids):
+        """
+        Bulk changes of the through table don't send m2m_changed, invalidate the owners' cached reads here.
+        """
+
+        from core_app.coalescing import bump_user_version
+
+        for user_id in set(user_ids):
+            transaction.on_commit(lambda user_id=user_id: bump_user_version(user_id))
+
+    def attach(self, recipes):
+        """
+        Link the items to recipes (a Recipe queryset) with a single insert into the through table.
+
+        Returns the number of links added.
+        """
+
+        through = self.model._meta.get_field("recipe").through
+        item_field = f"{self.model._meta.model_name}_id" # e.g., tag_id
+
+        with transaction.atomic():
+            # locked so that the cleanup of unused items doesn't delete them meanwhile
+            items = list(self.order_by("pk").select_for_update(no_key=True).values_list("pk", "user_id"))
+            item_ids = [item_id for item_id, user_id in items]
+            recipe_ids = set(recipes.values_list("pk", flat=True))
+            linked = set(
+                through.objects.filter(**{f"{item_field}__in": item_ids}, recipe_id__in=recipe_ids)
+                .values_list(item_field, "recipe_id")
+            )
+
+            links = [
+                through(recipe_id=recipe_id, **{item_field: item_id})
+                for item_id in item_ids for recipe_id in recipe_ids if (item_id, recipe_id) not in linked
+            ]
+            through.objects.bulk_create(links, ignore_conflicts=True, batch_size=1000)
+
+            self.filter(pk__in=item_ids).recount()
+            self._invalidate_reads(user_id for item_id, user_id in items)
+
+        return len(links)
+
+    def detach(self, recipes):
+        """
+        Unlink the items from recipes (a Recipe queryset) with a single delete from the through table.
+
+        Returns the number of links removed.
+        """
+
+        through = self.model._meta.get_field("recipe").through
+        item_field = f"{self.model._meta.model_name}_id"
+
+        with transaction.atomic():
+            items = list(self.values_list("pk", "user_id"))
+            item_ids = [item_id for item_id, user_id in items]
+
+            removed, _ = through.objects.filter(
+                **{f"{item_field}__in": item_ids}, recipe_id__in=recipes.values("pk")
+            ).delete()
+
+            self.filter(pk__in=item_ids).recount()
+            self._invalidate_reads(user_id for item_id, user_id in items)
+
+        return removed
+
+    def merge_into(self, target):
+        """
+        Merge the items (the ones owned by the owner of target) into target, with a few set-based statements.
+
+        Every recipe linked to a merged item is linked to target instead, once,
+        and the merged items are deleted. Returns the number of merged items.
+        """
+
+        through = self.model._meta.get_field("recipe").through
+        item_field = f"{self.model._meta.model_name}_id"
+
+        with transaction.atomic():
+            source_ids = list(self.filter(user_id=target.user_id).exclude(pk=target.pk).values_list("pk", flat=True))
+            if not source_ids:
+                return 0
+
+            links = through.objects.filter(**{f"{item_field}__in": source_ids})
+
+            # drop the links that would collide: recipes that already have target, or several merged items
+            links.filter(recipe_id__in=through.objects.filter(**{item_field: target.pk}).values("recipe_id")).delete()
+            links.filter(models.Exists(
+                through.objects.filter(
+                    recipe_id=models.OuterRef("recipe_id"), pk__lt=models.OuterRef("pk"), **{f"{item_field}__in": source_ids}
+                )
+            )).delete()
+
+            links.update(**{item_field: target.pk})
+            self.model.objects.filter(pk__in=source_ids).delete() # no links left to cascade
+            self.model.objects.filter(pk=target.pk).recount()
+            self._invalidate_reads([target.user_id])
+
+        return len(source_ids)
+
+    def recount(self):
+        """
+        Recompute recipe_count from the through table for the items whose counter drifted.
+
+        Returns the number of repaired items.
+        """
+
+        return self.alias(actual_count=self.recipe_count_subquery()) \
+            .exclude(recipe_count=models.F("actual_count")) \
+            .update(recipe_count=self.recipe_count_subquery())
+
+
 class Recipe(models.Model):
     """
     Recipe model.
@@ -101,6 +272,18 @@ class Tag(models.Model):
 
     name = models.CharField(max_length=255)
     user = models.ForeignKey(USER_MODEL, on_delete=models.CASCADE)
+    recipe_count = models.IntegerField(default=0, editable=False) # maintained by core_app.signals
+
+    objects = RecipeAttributeQuerySet.as_manager()
+
+    class Meta:
+
+        indexes = [ # serves assigned_only filtering and popularity ordering
+            models.Index(fields=["user", "recipe_count"], name="tag_user_count_idx"),
+        ]
+        constraints = [ # also serves the lookups by name of get_or_create_many
+            models.UniqueConstraint(fields=["user", "name"], name="tag_user_name_unique"),
+        ]
 
     def __str__(self):
 
@@ -114,8 +297,48 @@ class Ingredient(models.Model):
 
     name = models.CharField(max_length=255)
     user = models.ForeignKey(USER_MODEL, on_delete=models.CASCADE)
+    recipe_count = models.IntegerField(default=0, editable=False) # maintained by core_app.signals
+
+    objects = RecipeAttributeQuerySet.as_manager()
+
+    class Meta:
+
+        indexes = [ # serves assigned_only filtering and popularity ordering
+            models.Index(fields=["user", "recipe_count"], name="ingredient_user_count_idx"),
+        ]
+        constraints = [ # also serves the lookups by name of get_or_create_many
+            models.UniqueConstraint(fields=["user", "name"], name="ingredient_user_name_unique"),
+        ]
 
     def __str__(self):
 
         return self.name
-    
\ No newline at end of file
+    
+
+class SlowQuery(models.Model):
+    """
+    A SQL query that took longer than SLOW_QUERY_THRESHOLD_MS, aggregated by view and normalized SQL.
+
+    Recorded by core_app.slow_queries.
+    """
+
+    fingerprint = models.CharField(max_length=40) # hash of the normalized SQL
+    view = models.CharField(max_length=255) # view that issued the query
+    sql = models.TextField() # normalized SQL, parameters replaced by ?
+    plan = models.TextField(blank=True) # EXPLAIN output captured the first time the query was slow
+    calls = models.PositiveIntegerField(default=1)
+    total_duration_ms = models.FloatField()
+    max_duration_ms = models.FloatField()
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(auto_now=True)
+
+    class Meta:
+
+        verbose_name_plural = "slow queries"
+        constraints = [
+            models.UniqueConstraint(fields=["fingerprint", "view"], name="slowquery_fingerprint_view_uniq"),
+        ]
+
+    def __str__(self):
+
+        return f"{self.view}: {self.sql[:80]}"
@@ -0,0 +1,172 @@
+"""
+On-demand sampling profiler for live workers.
+
+A SamplingProfiler runs in a background thread for a few seconds: at every
+interval it looks at the current stack of the threads that are serving a
+request (ProfilingMiddleware keeps track of which path every thread serves),
+optionally only those whose path matches a pattern, and counts the stacks.
+The result is written in the folded stacks format ("frame;frame;frame count"
+per line) that flamegraph.pl and speedscope turn into flame graphs.
+
+It is started for the worker that handles the request with the staff-only
+/api/profile/ endpoint, or by sending SIGUSR2 to a worker (PROFILER_SIGNAL).
+"""
+
+from collections import Counter
+import logging
+import os
+import re
+import signal
+import sys
+import threading
+import time
+from django.conf import settings
+
+
+logger = logging.getLogger("core_app.profiling")
+
+_request_paths = {} # thread id -> path of the request being served
+_profiler = None # the running profiler of the process
+_profiler_lock = threading.Lock()
+
+
+def request_started(path):
+
+    _request_paths[threading.get_ident()] = path
+
+
+def request_finished():
+
+    _request_paths.pop(threading.get_ident(), None)
+
+
+class SamplingProfiler:
+    """
+    Sample the stacks of the threads serving requests for some seconds and write them as folded stacks.
+    """
+
+    def __init__(self, seconds, interval_ms=10, path_pattern=None, output_dir=None):
+
+        self.seconds = seconds
+        self.interval = interval_ms / 1000
+        self.path_pattern = path_pattern
+        self.path_re = re.compile(path_pattern) if path_pattern else None
+        self.output_path = os.path.join(
+            output_dir or settings.PROFILER_OUTPUT_DIR,
+            f"profile-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}.folded"
+        )
+        self.stacks = Counter()
+        self.samples = 0
+        self._labels = {} # code object -> frame label
+        self._thread = None
+
+    def _label(self, code, module):
+
+        label = self._labels.get(code)
+        if label is None:
+            name = getattr(code, "co_qualname", code.co_name) # co_qualname is new in python 3.11
+            label = self._labels[code] = f"{module}:{name}".replace(";", ":").replace(" ", "_")
+
+        return label
+
+    def _fold(self, frame):
+        """
+        Return the stack of frame, outermost call first.
+        """
+
+        labels = []
+        while frame is not None:
+            labels.append(self._label(frame.f_code, frame.f_globals.get("__name__", "?")))
+            frame = frame.f_back
+
+        return ";".join(reversed(labels))
+
+    def sample(self):
+        """
+        Record the current stack of every profiled thread.
+        """
+
+        for thread_id, frame in sys._current_frames().items():
+            path = _request_paths.get(thread_id)
+            if path is None or (self.path_re is not None and not self.path_re.search(path)):
+                continue
+            self.stacks[self._fold(frame)] += 1
+            self.samples += 1
+
+    def run(self):
+        """
+        Sample until the time is up, then write the output file.
+        """
+
+        deadline = time.monotonic() + self.seconds
+        while time.monotonic() < deadline:
+            self.sample()
+            time.sleep(self.interval)
+
+        os.makedirs(os.path.dirname(self.output_path), exist_ok=True)
+        with open(self.output_path, "w") as output:
+            for stack, count in self.stacks.most_common():
+                output.write(f"{stack} {count}\n")
+
+        logger.info("Profile with %s samples written to %s", self.samples, self.output_path)
+
+    def start(self):
+
+        self._thread = threading.Thread(target=self._run_and_release, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def join(self, timeout=None):
+
+        self._thread.join(timeout)
+
+    def _run_and_release(self):
+
+        global _profiler
+
+        try:
+            self.run()
+        finally:
+            with _profiler_lock:
+                _profiler = None
+
+
+def start_profiler(seconds, interval_ms=10, path_pattern=None):
+    """
+    Start profiling this process, returns the profiler or None if one is already running.
+    """
+
+    global _profiler
+
+    with _profiler_lock:
+        if _profiler is not None:
+            return None
+        profiler = _profiler = SamplingProfiler(seconds, interval_ms, path_pattern)
+
+    profiler.start()
+
+    return profiler
+
+
+def _start_from_signal():
+
+    profiler = start_profiler(settings.PROFILER_SIGNAL_SECONDS, path_pattern=settings.PROFILER_SIGNAL_PATH)
+    if profiler is None:
+        logger.warning("A profiler is already running in process %s", os.getpid())
+    else:
+        logger.info("Profiling process %s for %s seconds", os.getpid(), profiler.seconds)
+
+
+def _handle_signal(signum, frame):
+
+    # the handler interrupts the main thread, which could be holding _profiler_lock
+    threading.Thread(target=_start_from_signal, daemon=True).start()
+
+
+def install_signal_handler():
+    """
+    Start a profiler when the process receives SIGUSR2.
+    """
+
+    # signal handlers can only be set from the main thread, and SIGUSR2 doesn't exist on windows
+    if hasattr(signal, "SIGUSR2") and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR2, _handle_signal)
@@ -0,0 +1,146 @@
+"""
+Statement timeouts and query budgets of API views.
+
+Views with QueryLimitsMixin run with a Postgres statement_timeout: the
+statement_timeouts of the view for its action, else its statement_timeout,
+else STATEMENT_TIMEOUT_MS. It's set on the connection before the first query
+of the request and reset after it, through the driver cursor, so views keep
+their transactions (no extra atomic per request) and their query counts. A
+query cancelled by the timeout becomes a 503 instead of a worker busy for
+seconds.
+
+They can also declare query_budgets, the most queries each action should
+issue; going over is logged (QUERY_BUDGET_MODE = "log") or raises
+QueryBudgetExceeded ("raise", for development and tests).
+"""
+
+import logging
+from django.conf import settings
+from django.db import OperationalError, connection
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+logger = logging.getLogger("core_app.query_limits")
+
+QUERY_CANCELED = "57014" # postgres error code of statements cancelled by statement_timeout
+
+
+class StatementTimeout(APIException):
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "The request took too long, try narrowing it down."
+    default_code = "statement_timeout"
+
+
+class QueryBudgetExceeded(Exception):
+    """
+    An action issued more queries than its budget (QUERY_BUDGET_MODE = "raise").
+    """
+
+
+class QueryCounter:
+    """
+    Database execute wrapper counting the queries of a request.
+    """
+
+    def __init__(self):
+
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+
+        self.count += 1
+
+        return execute(sql, params, many, context)
+
+
+class SessionTimeout:
+    """
+    Database execute wrapper setting the statement_timeout of a view before its first query.
+    """
+
+    def __init__(self, view):
+
+        self.view = view
+        self.applied = False
+
+    def __call__(self, execute, sql, params, many, context):
+
+        if not self.applied: # the action, so the timeout, is known once queries run
+            context["cursor"].cursor.execute(
+                "SELECT set_config('statement_timeout', %s, false)", [str(int(self.view.get_statement_timeout()))]
+            )
+            self.applied = True
+
+        return execute(sql, params, many, context)
+
+    def reset(self):
+
+        if not self.applied or connection.connection is None:
+            return
+
+        try:
+            with connection.connection.cursor() as cursor:
+                cursor.execute("RESET statement_timeout")
+        except connection.Database.Error: # in a failed transaction, rolling it back undoes the SET
+            pass
+
+
+class QueryLimitsMixin:
+    """
+    Apply a statement timeout and a query budget to the actions of a view.
+    """
+
+    statement_timeout = None # ms, STATEMENT_TIMEOUT_MS when None
+    statement_timeouts = {} # action -> ms
+    query_budgets = {} # action -> most queries allowed
+
+    def get_statement_timeout(self):
+
+        action = getattr(self, "action", None)
+
+        return self.statement_timeouts.get(action, self.statement_timeout or settings.STATEMENT_TIMEOUT_MS)
+
+    def dispatch(self, request, *args, **kwargs):
+
+        self.query_counter = counter = QueryCounter()
+
+        if connection.vendor != "postgresql" or not settings.STATEMENT_TIMEOUT_MS:
+            with connection.execute_wrapper(counter):
+                response = super().dispatch(request, *args, **kwargs)
+        else:
+            timeout = SessionTimeout(self)
+            try:
+                with connection.execute_wrapper(timeout), connection.execute_wrapper(counter):
+                    response = super().dispatch(request, *args, **kwargs)
+            finally:
+                timeout.reset()
+
+        self.check_query_budget(counter.count)
+
+        return response
+
+    def handle_exception(self, exc):
+
+        if isinstance(exc, OperationalError) and getattr(exc.__cause__, "pgcode", None) == QUERY_CANCELED:
+            logger.warning(
+                "Statement timeout (%s ms) of %s.%s", self.get_statement_timeout(),
+                type(self).__name__, getattr(self, "action", None)
+            )
+            exc = StatementTimeout()
+
+        return super().handle_exception(exc)
+
+    def check_query_budget(self, count):
+
+        action = getattr(self, "action", None)
+        budget = self.query_budgets.get(action)
+        if budget is None or count <= budget or settings.QUERY_BUDGET_MODE == "off":
+            return
+
+        message = f"{type(self).__name__}.{action} issued {count} queries, its budget is {budget}"
+        if settings.QUERY_BUDGET_MODE == "raise":
+            raise QueryBudgetExceeded(message)
+
+        logger.warning(message)
@@ -0,0 +1,165 @@
+"""
+OpenAPI schema generated once and served from memory.
+
+drf-spectacular introspects every view and serializer to build the schema, so
+the rendered schema is cached per process (and optionally loaded from a file
+written by the `precompute_schema` command). The cache is keyed by the code
+version, so a new release always serves a freshly generated schema.
+"""
+
+from dataclasses import dataclass
+import gzip
+import hashlib
+import json
+import threading
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import translation
+from django.utils.cache import patch_vary_headers
+from rest_framework.utils.encoders import JSONEncoder
+from drf_spectacular.generators import SchemaGenerator
+from drf_spectacular.views import SpectacularAPIView
+from core_app.metrics import CACHE_REQUESTS
+
+
+@dataclass
+class RenderedSchema:
+    """
+    A rendered schema ready to be sent to clients.
+    """
+
+    body: bytes
+    gzipped_body: bytes
+    etag: str
+
+
+_schemas = {} # (api version, language) -> schema dict
+_rendered = {} # (api version, language, media type) -> RenderedSchema
+_cache_version = None
+_lock = threading.Lock()
+
+
+def clear_schema_cache():
+    """
+    Forget every cached schema.
+    """
+
+    global _cache_version
+
+    with _lock:
+        _schemas.clear()
+        _rendered.clear()
+        _cache_version = None
+
+
+def _check_code_version():
+    """
+    Drop the cache if the code version changed since it was filled.
+    """
+
+    global _cache_version
+
+    if _cache_version != settings.SCHEMA_CODE_VERSION:
+        _schemas.clear()
+        _rendered.clear()
+        _cache_version = settings.SCHEMA_CODE_VERSION
+
+
+def generate_schema(request=None, api_version=None):
+    """
+    Generate the OpenAPI schema of the project.
+    """
+
+    generator = SchemaGenerator(api_version=api_version)
+
+    return generator.get_schema(request=request, public=True)
+
+
+def read_schema_file():
+    """
+    Return the schema stored in SCHEMA_CACHE_FILE if it matches the code version, else None.
+    """
+
+    if settings.SCHEMA_CODE_VERSION is None: # without a version the file can't be trusted
+        return None
+
+    try:
+        with open(settings.SCHEMA_CACHE_FILE) as schema_file:
+            content = json.load(schema_file)
+    except (OSError, ValueError):
+        return None
+
+    if content.get("version") != settings.SCHEMA_CODE_VERSION:
+        return None
+
+    return content["schema"]
+
+
+def write_schema_file(schema):
+    """
+    Store the schema in SCHEMA_CACHE_FILE tagged with the current code version.
+    """
+
+    with open(settings.SCHEMA_CACHE_FILE, "w") as schema_file:
+        json.dump({"version": settings.SCHEMA_CODE_VERSION, "schema": schema}, schema_file, cls=JSONEncoder)
+
+
+def get_rendered_schema(renderer, request, api_version):
+    """
+    Return the schema rendered with renderer, generating and rendering it only once.
+    """
+
+    language = translation.get_language()
+    key = (api_version, language, renderer.media_type)
+
+    with _lock:
+        _check_code_version()
+
+        CACHE_REQUESTS.labels(cache="schema", result="hit" if key in _rendered else "miss").inc()
+
+        if key not in _rendered:
+            schema_key = (api_version, language)
+
+            if schema_key not in _schemas:
+                schema = None
+                if api_version is None and language == settings.LANGUAGE_CODE:
+                    schema = read_schema_file()
+                _schemas[schema_key] = schema or generate_schema(request=request, api_version=api_version)
+
+            body = renderer.render(_schemas[schema_key], renderer.media_type, {})
+            _rendered[key] = RenderedSchema(
+                body=body,
+                gzipped_body=gzip.compress(body),
+                etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+            )
+
+        return _rendered[key]
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    """
+    Serve the OpenAPI schema from memory, with an ETag and gzip.
+    """
+
+    def _get_schema_response(self, request):
+
+        version = self.api_version or request.version or self._get_version_parameter(request)
+        renderer = request.accepted_renderer
+        schema = get_rendered_schema(renderer, request, version)
+
+        if schema.etag in request.headers.get("If-None-Match", ""):
+            response = HttpResponseNotModified()
+            response["ETag"] = schema.etag
+            return response
+
+        if "gzip" in request.headers.get("Accept-Encoding", ""):
+            response = HttpResponse(schema.gzipped_body, content_type=renderer.media_type)
+            response["Content-Encoding"] = "gzip"
+        else:
+            response = HttpResponse(schema.body, content_type=renderer.media_type)
+
+        response["ETag"] = schema.etag
+        response["Content-Disposition"] = f'inline; filename="{self._get_filename(request, version)}"'
+        patch_vary_headers(response, ["Accept-Encoding", ])
+
+        return response
@@ -0,0 +1,192 @@
+"""
+Fast generation of synthetic users, recipes, tags and ingredients.
+
+Rows are written with bulk inserts (and PostgreSQL COPY for the recipe
+through tables, which hold most of the rows). Sizes follow skewed
+distributions so the dataset looks like production: a few users own most
+recipes, and a few tags/ingredients are used by most recipes of a user.
+"""
+
+from decimal import Decimal
+from io import BytesIO, StringIO
+import random
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image
+from core_app.models import Recipe, Tag, Ingredient, recipe_image_file_path
+
+
+TITLE_WORDS = ["Spicy", "Creamy", "Roasted", "Grilled", "Vegan", "Classic", "Quick", "Smoky",
+               "Lemon", "Garlic", "Chicken", "Tofu", "Pasta", "Curry", "Salad", "Soup", "Stew", "Tacos"]
+TAG_NAMES = ["Dinner", "Lunch", "Breakfast", "Vegan", "Vegetarian", "Quick", "Dessert", "Spicy",
+             "Healthy", "Comfort food", "Thai", "Indian", "Italian", "Mexican", "Snack", "Party"]
+INGREDIENT_NAMES = ["Salt", "Pepper", "Garlic", "Onion", "Olive oil", "Butter", "Rice", "Tomato",
+                    "Chicken", "Tofu", "Lemon", "Ginger", "Chili", "Flour", "Eggs", "Milk", "Cheese"]
+
+
+def skewed_count(rng, mean, alpha=1.2):
+    """
+    Return a Pareto distributed count with roughly the given mean (alpha 1.2 ~ 80/20 rule).
+    """
+
+    scale = mean * (alpha - 1) / alpha
+
+    return int(scale * rng.paretovariate(alpha))
+
+
+def zipf_weights(count, exponent=1.1):
+    """
+    Return Zipf weights for count items, the first item being the most popular.
+    """
+
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+def placeholder_image():
+    """
+    Return the bytes of a small JPEG used as placeholder recipe image.
+    """
+
+    buffer = BytesIO()
+    Image.new("RGB", (32, 32), color=(200, 120, 40)).save(buffer, format="JPEG")
+
+    return buffer.getvalue()
+
+
+def insert_links(through, item_field, rows, batch_size):
+    """
+    Insert (recipe_id, item_id) rows into an m2m through table, with COPY on PostgreSQL.
+    """
+
+    if connection.vendor == "postgresql":
+        quote = connection.ops.quote_name
+        data = StringIO("".join(f"{recipe_id}\t{item_id}\n" for recipe_id, item_id in rows))
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {quote(through._meta.db_table)} ({quote('recipe_id')}, {quote(item_field)}) FROM STDIN",
+                data
+            )
+    else:
+        through.objects.bulk_create(
+            [through(**{"recipe_id": recipe_id, item_field: item_id}) for recipe_id, item_id in rows],
+            batch_size=batch_size
+        )
+
+
+class DatasetGenerator:
+    """
+    Generate a deterministic synthetic dataset.
+    """
+
+    def __init__(self, seed=0, recipes_per_user=50, tags_per_user=30, ingredients_per_user=60,
+                 max_tags_per_recipe=8, max_ingredients_per_recipe=15, images=False,
+                 password="seedpass123", email_prefix="seed-user", batch_size=5000):
+
+        self.rng = random.Random(seed)
+        self.recipes_per_user = recipes_per_user
+        self.tags_per_user = tags_per_user
+        self.ingredients_per_user = ingredients_per_user
+        self.max_tags_per_recipe = max_tags_per_recipe
+        self.max_ingredients_per_recipe = max_ingredients_per_recipe
+        self.images = images
+        self.password_hash = make_password(password) # hashing once is most of the time saved
+        self.email_prefix = email_prefix
+        self.batch_size = batch_size
+        self._image_bytes = placeholder_image() if images else None
+
+    def _names(self, pool, count):
+        """
+        Return count distinct names built from pool.
+        """
+
+        return [pool[i % len(pool)] + (f" {i // len(pool)}" if i >= len(pool) else "") for i in range(count)]
+
+    def _pick(self, items, weights, maximum):
+        """
+        Pick a skewed number of distinct items, favouring the popular ones.
+        """
+
+        count = min(1 + skewed_count(self.rng, maximum / 3), maximum, len(items))
+        picked = set()
+        while len(picked) < count:
+            picked.update(self.rng.choices(items, weights, k=count - len(picked)))
+
+        return picked
+
+    def _recipe(self, user_id):
+        """
+        Return an unsaved random recipe for user_id.
+        """
+
+        recipe = Recipe(
+            user_id=user_id,
+            title=" ".join(self.rng.sample(TITLE_WORDS, 3)),
+            description="Synthetic recipe. " * self.rng.randint(0, 30),
+            time_minutes=self.rng.randint(5, 180),
+            price=Decimal(self.rng.randint(100, 9999)) / 100,
+            link=f"http://example.com/{self.rng.getrandbits(32):x}.pdf" if self.rng.random() < 0.5 else "",
+        )
+
+        if self.images:
+            recipe.image = default_storage.save(recipe_image_file_path(recipe, "placeholder.jpg"),
+                                                 ContentFile(self._image_bytes))
+
+        return recipe
+
+    def generate_users(self, first, count):
+        """
+        Create users first..first+count-1 with all their data, and return the row counts.
+        """
+
+        User = get_user_model()
+        counts = {"users": 0, "recipes": 0, "tags": 0, "ingredients": 0, "recipe_tags": 0, "recipe_ingredients": 0}
+
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(email=f"{self.email_prefix}-{i}@example.com", name=f"Seed user {i}", password=self.password_hash)
+                for i in range(first, first + count)
+            ], batch_size=self.batch_size)
+            counts["users"] = len(users)
+
+            for user in users:
+                tags = Tag.objects.bulk_create([
+                    Tag(user=user, name=name)
+                    for name in self._names(TAG_NAMES, max(skewed_count(self.rng, self.tags_per_user), 1))
+                ], batch_size=self.batch_size)
+                ingredients = Ingredient.objects.bulk_create([
+                    Ingredient(user=user, name=name)
+                    for name in self._names(INGREDIENT_NAMES, max(skewed_count(self.rng, self.ingredients_per_user), 1))
+                ], batch_size=self.batch_size)
+                recipes = Recipe.objects.bulk_create(
+                    [self._recipe(user.id) for _ in range(skewed_count(self.rng, self.recipes_per_user))],
+                    batch_size=self.batch_size
+                )
+
+                tag_ids, tag_weights = [tag.id for tag in tags], zipf_weights(len(tags))
+                ingredient_ids, ingredient_weights = [item.id for item in ingredients], zipf_weights(len(ingredients))
+
+                recipe_tags = [
+                    (recipe.id, tag_id) for recipe in recipes
+                    for tag_id in self._pick(tag_ids, tag_weights, self.max_tags_per_recipe)
+                ]
+                recipe_ingredients = [
+                    (recipe.id, ingredient_id) for recipe in recipes
+                    for ingredient_id in self._pick(ingredient_ids, ingredient_weights, self.max_ingredients_per_recipe)
+                ]
+                insert_links(Recipe.tags.through, "tag_id", recipe_tags, self.batch_size)
+                insert_links(Recipe.ingredients.through, "ingredient_id", recipe_ingredients, self.batch_size)
+
+                counts["tags"] += len(tags)
+                counts["ingredients"] += len(ingredients)
+                counts["recipes"] += len(recipes)
+                counts["recipe_tags"] += len(recipe_tags)
+                counts["recipe_ingredients"] += len(recipe_ingredients)
+
+            # direct inserts into the through tables don't send m2m_changed
+            Tag.objects.filter(user__in=users).recount()
+            Ingredient.objects.filter(user__in=users).recount()
+
+        return counts
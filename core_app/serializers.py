@@ -0,0 +1,40 @@
+"""
+Serializers for the core APIs.
+"""
+
+import re
+from rest_framework import serializers
+
+
+class ProfileRequestSerializer(serializers.Serializer):
+    """
+    Serializer for starting the sampling profiler.
+    """
+
+    seconds = serializers.IntegerField(min_value=1, max_value=300, default=10)
+    interval_ms = serializers.IntegerField(min_value=1, max_value=1000, default=10)
+    path = serializers.CharField(
+        required=False, allow_blank=True, max_length=255,
+        help_text="Regular expression, only requests whose path matches are profiled (e.g. ^/api/recipe/recipes/)"
+    )
+
+    def validate_path(self, value):
+
+        try:
+            re.compile(value)
+        except re.error as error:
+            raise serializers.ValidationError(f"Invalid regular expression: {error}")
+
+        return value
+
+
+class MemoryProfileRequestSerializer(serializers.Serializer):
+    """
+    Serializer for controlling the memory profiler.
+    """
+
+    action = serializers.ChoiceField(choices=["start", "report", "stop"])
+    interval = serializers.IntegerField(
+        min_value=1, required=False,
+        help_text="Seconds between the periodic snapshots (default MEMORY_SNAPSHOT_INTERVAL)"
+    )
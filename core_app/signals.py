@@ -0,0 +1,113 @@
+"""
+Signal handlers that keep Tag.recipe_count and Ingredient.recipe_count exact,
+and invalidate the cached reads of users whose data changes.
+
+The counter handlers run inside the transaction of the change that triggers
+them, so the counters are committed or rolled back together with the through
+table rows. They recount the affected items from the through table instead of
+adding or subtracting one: concurrent changes of the same links (two requests
+adding the same tag to a recipe) would otherwise count a link twice.
+"""
+
+import threading
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from core_app.coalescing import bump_user_version
+from core_app.models import Recipe, Tag, Ingredient
+
+
+# owners of the recipes being deleted by each thread (see schedule_recipe_counts)
+_pending_recounts = threading.local()
+
+# through model -> (counted model, its column in the through table)
+COUNTED_RELATIONS = {
+    Recipe.tags.through: (Tag, "tag_id"),
+    Recipe.ingredients.through: (Ingredient, "ingredient_id"),
+}
+
+
+def recount_items(model, pks):
+    """
+    Recount the recipes of the given items.
+    """
+
+    items = model.objects.filter(pk__in=pks)
+    # lock the items first (in pk order, no deadlocks), so that the recount, a new statement,
+    # sees the links committed by concurrent changes that held them
+    list(items.order_by("pk").select_for_update(no_key=True).values_list("pk", flat=True))
+    items.recount()
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_recipe_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Update the counters of the tags or ingredients affected by an m2m change.
+    """
+
+    model, item_field = COUNTED_RELATIONS[sender]
+
+    if reverse: # e.g., tag.recipe_set.add(recipe), only the instance counter changes
+        if action in ("post_add", "post_remove", "post_clear"):
+            recount_items(model, [instance.pk])
+        return
+
+    if action in ("post_add", "post_remove"): # pk_set may contain ids linked or unlinked concurrently
+        recount_items(model, pk_set)
+
+    elif action == "pre_clear": # remember which items are about to be unlinked
+        cleared = sender.objects.filter(recipe_id=instance.pk).values_list(item_field, flat=True)
+        instance._cleared_item_ids = {**getattr(instance, "_cleared_item_ids", {}), sender: list(cleared)}
+
+    elif action == "post_clear":
+        recount_items(model, instance._cleared_item_ids.pop(sender, []))
+
+
+@receiver(pre_delete, sender=Recipe)
+def schedule_recipe_counts(sender, instance, **kwargs):
+    """
+    Remember the owner of a recipe that is being deleted, its counters are recounted once the recipes are gone.
+    """
+
+    # a delete sends the pre_delete signals of all its recipes before deleting any row
+    if not hasattr(_pending_recounts, "user_ids"):
+        _pending_recounts.user_ids = set()
+    _pending_recounts.user_ids.add(instance.user_id)
+
+
+@receiver(post_delete, sender=Recipe)
+def recount_deleted_recipe_counts(sender, instance, **kwargs):
+    """
+    Recount the tags and ingredients of the owners of the deleted recipes, once per delete.
+    """
+
+    user_ids = getattr(_pending_recounts, "user_ids", None)
+    if not user_ids:
+        return # recounted by the post_delete of another recipe of the same delete
+    _pending_recounts.user_ids = set()
+
+    # the through table rows were removed by the cascade without sending m2m_changed
+    for model in (Tag, Ingredient):
+        recount_items(model, model.objects.filter(user_id__in=user_ids, recipe_count__gt=0).values("pk"))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_user_reads(sender, instance, action=None, **kwargs):
+    """
+    Bump the data version of the owner once the change is committed (see core_app.coalescing).
+    """
+
+    if action is not None and not action.startswith("post_"):
+        return
+
+    user_id = instance.user_id
+    # bumped after the commit, so that no read caches the old data under the new version
+    transaction.on_commit(lambda: bump_user_version(user_id))
@@ -0,0 +1,189 @@
+"""
+Slow query log.
+
+SlowQueryRecorder is a database execute wrapper (installed for every request
+by SlowQueryLogMiddleware) that picks the queries slower than
+SLOW_QUERY_THRESHOLD_MS. They are handed to a background thread which
+normalizes the SQL, captures the query plan with EXPLAIN the first time a
+query shows up, and aggregates them in the SlowQuery model, so requests don't
+pay for any of it. See the admin page or the `slow_queries` command.
+"""
+
+from dataclasses import dataclass
+import hashlib
+import logging
+import queue
+import re
+import threading
+import time
+from django.conf import settings
+from django.db import connections, IntegrityError, models, transaction
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+
+logger = logging.getLogger("core_app.slow_queries")
+
+_queue = queue.Queue(maxsize=1000) # slow queries waiting to be saved
+_worker = None
+_worker_lock = threading.Lock()
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%s")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+
+@dataclass
+class SlowQueryEvent:
+    """
+    A slow query waiting to be saved.
+    """
+
+    alias: str
+    sql: str
+    params: object
+    many: bool
+    duration_ms: float
+    view: str
+
+
+def normalize_sql(sql):
+    """
+    Return (fingerprint, normalized sql), literals and placeholders replaced by ?.
+
+    IN lists collapse to (...) so that they match whatever their length.
+    """
+
+    normalized = _STRING_RE.sub("?", sql)
+    normalized = _PLACEHOLDER_RE.sub("?", normalized)
+    normalized = _NUMBER_RE.sub("?", normalized)
+    normalized = _LIST_RE.sub("(...)", normalized)
+    normalized = _SPACE_RE.sub(" ", normalized).strip()
+
+    return hashlib.sha1(normalized.encode()).hexdigest(), normalized
+
+
+def explain(alias, sql, params):
+    """
+    Return the plan of a query without running it.
+    """
+
+    connection = connections[alias]
+
+    if connection.vendor == "postgresql":
+        prefix = "EXPLAIN (ANALYZE off) "
+    elif connection.vendor == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    else:
+        prefix = "EXPLAIN "
+
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        return "\n".join(str(row[-1]) for row in cursor.fetchall()) # the plan line is the last column
+
+
+def save_slow_query(event):
+    """
+    Add a slow query to the SlowQuery aggregates.
+    """
+
+    from core_app.models import SlowQuery
+
+    fingerprint, normalized = normalize_sql(event.sql)
+    view_queries = SlowQuery.objects.filter(fingerprint=fingerprint, view=event.view)
+
+    stats = {
+        "calls": models.F("calls") + 1,
+        "total_duration_ms": models.F("total_duration_ms") + event.duration_ms,
+        "max_duration_ms": Greatest("max_duration_ms", models.Value(event.duration_ms)),
+        "last_seen": timezone.now(), # update() skips auto_now
+    }
+
+    if view_queries.update(**stats):
+        return
+
+    plan = ""
+    if normalized.upper().startswith("SELECT") and not event.many: # only reads can be safely explained
+        try:
+            plan = explain(event.alias, event.sql, event.params)
+        except Exception as error:
+            plan = f"EXPLAIN failed: {error}"
+
+    try:
+        with transaction.atomic():
+            SlowQuery.objects.create(
+                fingerprint=fingerprint,
+                view=event.view,
+                sql=normalized,
+                plan=plan,
+                total_duration_ms=event.duration_ms,
+                max_duration_ms=event.duration_ms,
+            )
+    except IntegrityError: # another process saved it first
+        view_queries.update(**stats)
+
+
+def _work():
+
+    while True:
+        event = _queue.get()
+        try:
+            save_slow_query(event)
+        except Exception:
+            logger.exception("Could not save slow query")
+        finally:
+            _queue.task_done()
+
+        if _queue.empty(): # don't hold database connections while idle
+            connections.close_all()
+
+
+def submit(event):
+    """
+    Queue a slow query to be saved by the background thread.
+    """
+
+    global _worker
+
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive(): # threads don't survive a fork
+            _worker = threading.Thread(target=_work, name="slow-query-log", daemon=True)
+            _worker.start()
+
+    try:
+        _queue.put_nowait(event)
+    except queue.Full:
+        logger.warning("Slow query log queue is full, dropping query from %s", event.view)
+
+
+class SlowQueryRecorder:
+    """
+    Database execute wrapper that submits the queries of a request slower than SLOW_QUERY_THRESHOLD_MS.
+    """
+
+    def __init__(self, request):
+
+        self.request = request
+        self.threshold_ms = settings.SLOW_QUERY_THRESHOLD_MS
+
+    def __call__(self, execute, sql, params, many, context):
+
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            if duration_ms >= self.threshold_ms:
+                match = self.request.resolver_match # resolved after the middleware started
+                view = match.view_name if match else self.request.path_info
+                logger.warning("Slow query (%.1f ms) in %s: %s", duration_ms, view, sql[:200])
+                submit(SlowQueryEvent(
+                    alias=context["connection"].alias,
+                    sql=sql,
+                    params=params,
+                    many=many,
+                    duration_ms=duration_ms,
+                    view=view,
+                ))
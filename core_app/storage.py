@@ -0,0 +1,56 @@
+"""
+Static files storage.
+"""
+
+import os
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from core_app import compression
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Hash-named static files (see ManifestStaticFilesStorage) with precompressed
+    .gz and .br versions next to them, served by core_app.views.serve_static.
+    """
+
+    compressible_extensions = (".css", ".js", ".map", ".svg", ".html", ".json", ".txt", ".xml", ".ttf", ".eot", ".otf")
+
+    def stored_name(self, name):
+
+        if not self.hashed_files: # collectstatic hasn't run (development, tests), use the original files
+            return name
+
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+
+        yield from super().post_process(paths, dry_run, **options)
+
+        if dry_run:
+            return
+
+        for name in set(paths) | set(self.hashed_files.values()):
+            if os.path.splitext(name)[1].lower() in self.compressible_extensions:
+                self._write_compressed_versions(name)
+
+    def _write_compressed_versions(self, name):
+
+        with self.open(name) as original:
+            content = original.read()
+
+        if len(content) < settings.COMPRESSION_MIN_SIZE:
+            return
+
+        for encoding, extension, level in [("gzip", ".gz", 9), ("br", ".br", 11)]: # slow but done once
+            if encoding not in compression.available_encodings():
+                continue
+
+            compressed = compression.compress(content, encoding, level)
+            if len(compressed) >= len(content):
+                continue
+
+            if self.exists(name + extension):
+                self.delete(name + extension)
+            self._save(name + extension, ContentFile(compressed))
@@ -2,10 +2,12 @@
 Tests for the Django admin modifications.
 """
 
+from decimal import Decimal
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import Client
+from core_app.models import Recipe, Tag
 
 
 class AdminSiteTests(TestCase):
@@ -57,3 +59,18 @@ class AdminSiteTests(TestCase):
 
         self.assertEqual(response.status_code, 200) # check the page works
 
+    def test_merge_tags_admin_action(self):
+
+        tag1 = Tag.objects.create(user=self.user, name="Vegan")
+        tag2 = Tag.objects.create(user=self.user, name="vegan")
+        recipe = Recipe.objects.create(user=self.user, title="Salad", time_minutes=5, price=Decimal("2.00"))
+        recipe.tags.add(tag2)
+
+        url = reverse("admin:core_app_tag_changelist")
+        data = {"action": "merge_selected", "_selected_action": [tag1.id, tag2.id]}
+        response = self.client.post(url, data, follow=True)
+
+        # merged into the most used tag
+        self.assertContains(response, "Merged 1 items.")
+        self.assertEqual(list(Tag.objects.all()), [tag2])
+        self.assertEqual(list(recipe.tags.all()), [tag2])
@@ -0,0 +1,136 @@
+"""
+Tests for the coalescing of concurrent reads and the read cache.
+"""
+
+import threading
+import time
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from core_app import coalescing, metrics
+from core_app.models import Recipe, Tag
+
+
+RECIPES_URL = reverse("recipe_app:recipe-list")
+TAGS_URL = reverse("recipe_app:tag-list")
+
+
+class SingleFlightTests(SimpleTestCase):
+    """
+    Tests for the sharing of concurrent calls.
+    """
+
+    def test_concurrent_calls_with_the_same_key_share_one_evaluation(self):
+
+        flights = coalescing.SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return "result"
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flights.do("key", slow)))
+        leader.start()
+        started.wait()
+        follower = threading.Thread(target=lambda: results.append(flights.do("key", slow)))
+        follower.start()
+        time.sleep(0.05) # the follower is waiting
+        release.set()
+        leader.join()
+        follower.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertCountEqual(results, [("result", False), ("result", True)])
+
+    def test_errors_are_raised_and_the_key_is_released(self):
+
+        flights = coalescing.SingleFlight()
+
+        with self.assertRaises(ZeroDivisionError):
+            flights.do("key", lambda: 1 / 0)
+
+        self.assertEqual(flights.do("key", lambda: 1), (1, False))
+
+
+@override_settings(READ_CACHE_TIMEOUT=60, READ_CACHE_STALE_TIMEOUT=60)
+class ReadCacheTests(TestCase):
+    """
+    Tests for the cached recipe and tag lists.
+    """
+
+    def setUp(self):
+
+        cache.clear()
+        self.user = get_user_model().objects.create_user(email="test@example.com", password="testpass123")
+        Recipe.objects.create(user=self.user, title="Curry", time_minutes=30, price=Decimal("5.00"))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+
+        cache.clear()
+
+    def test_repeated_reads_are_served_from_the_cache(self):
+
+        self.client.get(RECIPES_URL)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(RECIPES_URL)
+
+        self.assertEqual(response.data[0]["title"], "Curry")
+        hits = metrics.REGISTRY.get_sample_value("cache_requests_total", {"cache": "recipe_list", "result": "hit"})
+        self.assertGreaterEqual(hits, 1)
+
+    def test_query_params_and_users_have_their_own_entries(self):
+
+        self.client.get(TAGS_URL)
+        other = get_user_model().objects.create_user(email="other@example.com", password="testpass123")
+        Tag.objects.create(user=other, name="Vegan")
+        self.client.force_authenticate(other)
+
+        self.assertEqual(len(self.client.get(TAGS_URL).data), 1)
+        self.assertEqual(len(self.client.get(TAGS_URL, {"assigned_only": 1}).data), 0)
+
+    def test_writes_invalidate_the_reads_of_the_user(self):
+
+        self.client.get(RECIPES_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(RECIPES_URL, {"title": "Soup", "time_minutes": 10, "price": "2.00"})
+
+        response = self.client.get(RECIPES_URL)
+
+        self.assertEqual([recipe["title"] for recipe in response.data], ["Soup", "Curry"])
+
+    def test_stale_entry_is_served_while_another_request_refreshes_it(self):
+
+        request = self.client.get(RECIPES_URL).wsgi_request
+        key = coalescing.read_key(request, self.user.pk)
+        value, _ = cache.get(key)
+        cache.set(key, (value, time.time() - 1)) # expired
+        cache.add(f"{key}:lock", 1) # being refreshed
+
+        with self.assertNumQueries(0):
+            response = self.client.get(RECIPES_URL)
+
+        self.assertEqual(response.data[0]["title"], "Curry")
+
+    def test_bulk_tagging_invalidates_the_reads_of_the_user(self):
+
+        tag = Tag.objects.create(user=self.user, name="Quick")
+        self.client.get(RECIPES_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.filter(pk=tag.pk).attach(Recipe.objects.filter(user=self.user))
+
+        response = self.client.get(RECIPES_URL)
+
+        self.assertEqual(response.data[0]["tags"], [{"id": tag.id, "name": "Quick"}])
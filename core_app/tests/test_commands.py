@@ -1,8 +1,23 @@
+import os
+import tempfile
+import threading
+import time
+from unittest import skipUnless
 from unittest.mock import patch
 from psycopg2 import OperationalError as Pyscopg2Error
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.contrib.auth import get_user_model
+from decimal import Decimal
+from io import StringIO
+from core_app import cleanup
+from core_app.models import Recipe, Tag
+from core_app.management.commands.importtime import parse_import_times, summarize_import_times
+from benchmarks.micro import compare
+from benchmarks.utils import create_benchmark_user, seed_recipes
 
 
 @patch("core_app.management.commands.wait_for_db.Command.check")
@@ -37,3 +52,274 @@ class CommandTests(SimpleTestCase):
 
         # check the function is called with the default database
         patched_check.assert_called_with(databases=["default", ])
+
+
+class RecountCommandTests(TestCase):
+
+    def test_recount_repairs_drifted_counters(self):
+        """
+        Test the recount command fixes counters that drifted from the through table.
+        """
+
+        user = get_user_model().objects.create_user(email="test@example.com", password="testpass123")
+        recipe = Recipe.objects.create(user=user, title="Curry", time_minutes=30, price=Decimal("5.00"))
+        tag = Tag.objects.create(user=user, name="Dinner")
+        recipe.tags.add(tag)
+        Tag.objects.update(recipe_count=0) # simulate drift
+
+        call_command("recount", stdout=StringIO())
+
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 1)
+
+
+class ImportTimeCommandTests(SimpleTestCase):
+
+    def test_import_times_are_summarized_by_package(self):
+        """
+        Test -X importtime output is aggregated by top-level package.
+        """
+
+        output = "\n".join([
+            "import time: self [us] | cumulative | imported package",
+            "import time:      1000 |       1000 |     django.utils",
+            "import time:      3000 |       4000 |   django",
+            "import time:       500 |        500 | yaml",
+        ])
+
+        report = summarize_import_times(parse_import_times(output))
+
+        self.assertEqual(report["total_ms"], 4.5)
+        self.assertEqual(report["packages"][0], {"package": "django", "self_ms": 4.0})
+        self.assertEqual(report["slowest_modules"][0]["module"], "django")
+
+    @patch("core_app.management.commands.importtime.subprocess.run")
+    def test_importtime_fails_above_threshold(self, patched_run):
+        """
+        Test the command fails when startup is slower than the threshold.
+        """
+
+        patched_run.return_value.returncode = 0
+        patched_run.return_value.stderr = "import time:      5000 |       5000 | django"
+
+        with self.assertRaises(CommandError):
+            call_command("importtime", "--threshold-ms", "1", "--repeat", "1", stdout=StringIO())
+
+
+class BenchmarkGateTests(SimpleTestCase):
+
+    options = {"tolerance": 0.5, "min_slowdown_ms": 2.0}
+
+    def test_extra_queries_are_a_regression(self):
+        """
+        Test a case that issues more queries than its baseline fails on any backend.
+        """
+
+        baselines = {"environment": {"database": "other"}, "cases": {"case": {"min_ms": 10, "queries": 3}}}
+
+        regressions = compare({"case": {"min_ms": 10, "queries": 4}}, baselines, self.options)
+
+        self.assertEqual(len(regressions), 1)
+
+    def test_slowdown_is_only_checked_on_the_same_backend(self):
+        """
+        Test timings are compared only with baselines recorded on the same database backend.
+        """
+
+        result = {"case": {"min_ms": 30, "queries": 3}}
+        case = {"case": {"min_ms": 10, "queries": 3}}
+
+        same = compare(result, {"environment": {"database": connection.vendor}, "cases": case}, self.options)
+        other = compare(result, {"environment": {"database": "other"}, "cases": case}, self.options)
+
+        self.assertEqual(len(same), 1)
+        self.assertEqual(other, [])
+
+
+class BenchmarkDataTests(TestCase):
+
+    def test_benchmark_user_of_a_kept_database_is_replaced(self):
+        """
+        Test creating the benchmark user again (benchmark --keepdb) starts from an empty dataset.
+        """
+
+        seed_recipes(create_benchmark_user(), 3)
+
+        user = create_benchmark_user()
+
+        self.assertFalse(Recipe.objects.filter(user=user).exists())
+        self.assertEqual(get_user_model().objects.count(), 1)
+
+
+class SeedDataCommandTests(TestCase):
+
+    def test_seed_data_creates_consistent_dataset(self):
+        """
+        Test seed_data creates users with recipes, and keeps recipe counters exact.
+        """
+
+        call_command("seed_data", "--users", "3", "--recipes-per-user", "5", "--seed", "7", stdout=StringIO())
+
+        self.assertEqual(get_user_model().objects.count(), 3)
+        self.assertTrue(Recipe.objects.exists())
+        self.assertEqual(Tag.objects.recount(), 0) # no counter needed a repair
+
+    def test_seed_data_is_deterministic(self):
+        """
+        Test the same seed generates the same recipes.
+        """
+
+        def generate(first_user):
+            call_command("seed_data", "--users", "2", "--first-user", str(first_user), "--seed", "3",
+                         stdout=StringIO())
+            recipes = Recipe.objects.filter(user__email__startswith=f"seed-user-{first_user}")
+            return list(recipes.order_by("id").values_list("title", "time_minutes", "price"))
+
+        self.assertEqual(generate(first_user=0), generate(first_user=100))
+
+
+class CleanupOrphansCommandTests(TestCase):
+
+    def setUp(self):
+
+        self.user = get_user_model().objects.create_user(email="test@example.com", password="testpass123")
+        self.recipe = Recipe.objects.create(user=self.user, title="Curry", time_minutes=30, price=Decimal("5.00"))
+
+    def test_unused_tags_are_deleted(self):
+
+        used = Tag.objects.create(user=self.user, name="Dinner")
+        drifted = Tag.objects.create(user=self.user, name="Spicy")
+        Tag.objects.create(user=self.user, name="Unused")
+        self.recipe.tags.add(used, drifted)
+        Tag.objects.filter(pk=drifted.pk).update(recipe_count=0) # simulate drift
+
+        with self.assertLogs("core_app.cleanup", level="INFO") as logs:
+            call_command("cleanup_orphans", "--sleep", "0", "--batch-size", "1", "--skip-files", stdout=StringIO())
+
+        self.assertCountEqual(Tag.objects.values_list("name", flat=True), ["Dinner", "Spicy"])
+        self.assertEqual(logs.records[0].getMessage(), "Deleted orphans: 1 tags, 0 ingredients")
+
+    def test_item_linked_after_it_was_listed_is_kept(self):
+
+        tag = Tag.objects.create(user=self.user, name="Dinner")
+        delete_orphans = cleanup.delete_orphans
+
+        def link_then_delete(model, ids):
+            # a request links the tag between the listing and the delete
+            Recipe.tags.through.objects.create(recipe=self.recipe, tag=tag)
+            return delete_orphans(model, ids)
+
+        with patch("core_app.cleanup.delete_orphans", side_effect=link_then_delete):
+            deleted = cleanup.delete_orphan_items(Tag, pause=0)
+
+        self.assertEqual(deleted, 0)
+        self.assertTrue(self.recipe.tags.filter(pk=tag.pk).exists())
+
+    def test_unreferenced_old_files_are_deleted(self):
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            directory = os.path.join(media_root, "uploads", "recipe", "ab")
+            os.makedirs(directory)
+            for name in ["referenced.jpg", "orphan.jpg", "recent.jpg"]:
+                with open(os.path.join(directory, name), "wb") as image_file:
+                    image_file.write(b"image")
+            old = time.time() - 2 * 3600
+            for name in ["referenced.jpg", "orphan.jpg"]:
+                os.utime(os.path.join(directory, name), (old, old))
+            Recipe.objects.filter(pk=self.recipe.pk).update(image="uploads/recipe/ab/referenced.jpg")
+
+            output = StringIO()
+            with self.assertLogs("core_app.cleanup", level="INFO") as logs:
+                call_command("cleanup_orphans", "--sleep", "0", "--skip-items", stdout=output)
+
+            # the recent file may belong to an upload in progress
+            self.assertCountEqual(os.listdir(directory), ["referenced.jpg", "recent.jpg"])
+            self.assertIn("files: 1 orphans deleted.", output.getvalue())
+            self.assertEqual(logs.records[0].getMessage(), "Deleted orphans: 1 files")
+
+
+@skipUnless(connection.vendor == "postgresql", "needs row locks")
+class CleanupConcurrencyTests(TransactionTestCase):
+
+    def test_item_being_linked_by_another_transaction_is_skipped(self):
+
+        user = get_user_model().objects.create_user(email="test@example.com", password="testpass123")
+        recipe = Recipe.objects.create(user=user, title="Curry", time_minutes=30, price=Decimal("5.00"))
+        tag = Tag.objects.create(user=user, name="Dinner")
+        linked, finish = threading.Event(), threading.Event()
+
+        def link():
+            try:
+                with transaction.atomic(): # the link isn't committed while the cleanup runs
+                    recipe.tags.add(*Tag.objects.get_or_create_many(user, ["Dinner"])) # as the recipe API does
+                    linked.set()
+                    finish.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=link)
+        thread.start()
+        linked.wait(5)
+        try:
+            deleted = cleanup.delete_orphan_items(Tag, pause=0)
+        finally:
+            finish.set()
+            thread.join()
+
+        self.assertEqual(deleted, 0)
+        self.assertTrue(recipe.tags.filter(pk=tag.pk).exists())
+
+
+class ShardMediaCommandTests(TestCase):
+
+    def setUp(self):
+
+        self.user = get_user_model().objects.create_user(email="test@example.com", password="testpass123")
+
+    def test_images_are_moved_to_the_sharded_layout(self):
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            os.makedirs(os.path.join(media_root, "uploads", "recipe"))
+            with open(os.path.join(media_root, "uploads", "recipe", "abcdef.jpg"), "wb") as image_file:
+                image_file.write(b"image")
+            recipe = Recipe.objects.create(
+                user=self.user, title="Curry", time_minutes=30, price=Decimal("5.00"), image="uploads/recipe/abcdef.jpg"
+            )
+            missing = Recipe.objects.create(
+                user=self.user, title="Soup", time_minutes=30, price=Decimal("5.00"), image="uploads/recipe/gone.jpg"
+            )
+
+            output = StringIO()
+            call_command("shard_media", "--sleep", "0", "--workers", "2", stdout=output)
+
+            recipe.refresh_from_db()
+            self.assertEqual(recipe.image.name, "uploads/recipe/ab/cd/abcdef.jpg")
+            with recipe.image.open() as image_file:
+                self.assertEqual(image_file.read(), b"image")
+            self.assertFalse(os.path.exists(os.path.join(media_root, "uploads", "recipe", "abcdef.jpg")))
+            missing.refresh_from_db()
+            self.assertEqual(missing.image.name, "uploads/recipe/gone.jpg")
+            self.assertIn("1 images referenced by recipes don't exist", output.getvalue())
+
+            # running it again has nothing left to move
+            output = StringIO()
+            call_command("shard_media", "--sleep", "0", stdout=output)
+            self.assertIn("0 images moved to the sharded layout", output.getvalue())
+
+    def test_interrupted_move_is_resumed(self):
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            # the previous run linked the file but stopped before updating the recipe
+            for directory in [("uploads", "recipe"), ("uploads", "recipe", "ab", "cd")]:
+                os.makedirs(os.path.join(media_root, *directory), exist_ok=True)
+                with open(os.path.join(media_root, *directory, "abcdef.jpg"), "wb") as image_file:
+                    image_file.write(b"image")
+            recipe = Recipe.objects.create(
+                user=self.user, title="Curry", time_minutes=30, price=Decimal("5.00"), image="uploads/recipe/abcdef.jpg"
+            )
+
+            call_command("shard_media", "--sleep", "0", stdout=StringIO())
+
+            recipe.refresh_from_db()
+            self.assertEqual(recipe.image.name, "uploads/recipe/ab/cd/abcdef.jpg")
+            self.assertFalse(os.path.exists(os.path.join(media_root, "uploads", "recipe", "abcdef.jpg")))
@@ -0,0 +1,135 @@
+"""
+Tests for response compression and precompressed static files.
+"""
+
+import gzip
+import shutil
+import tempfile
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from core_app.compression import accepted_encodings, choose_encoding
+from core_app.middleware import CompressionMiddleware
+from core_app.models import Recipe
+from core_app.views import serve_static
+
+
+RECIPES_URL = reverse("recipe_app:recipe-list")
+
+
+class NegotiationTests(SimpleTestCase):
+    """
+    Tests for the Accept-Encoding negotiation.
+    """
+
+    def test_accepted_encodings(self):
+
+        self.assertEqual(accepted_encodings("gzip, deflate;q=0.5, br;q=0"), {"gzip", "deflate"})
+
+    def test_choose_encoding_follows_server_preference(self):
+
+        self.assertEqual(choose_encoding("gzip, br", ["br", "gzip"]), "br")
+        self.assertEqual(choose_encoding("gzip", ["br", "gzip"]), "gzip")
+        self.assertEqual(choose_encoding("*", ["gzip"]), "gzip")
+        self.assertIsNone(choose_encoding("identity", ["br", "gzip"]))
+
+
+class CompressionMiddlewareTests(TestCase):
+    """
+    Tests for the compression of API responses.
+    """
+
+    def setUp(self):
+
+        self.user = get_user_model().objects.create_user(email="test@example.com", password="testpass123")
+        for i in range(30):
+            Recipe.objects.create(user=self.user, title=f"Recipe {i}", time_minutes=10, price=Decimal("5.00"))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_large_api_responses_are_compressed(self):
+
+        plain = self.client.get(RECIPES_URL)
+        response = self.client.get(RECIPES_URL, HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertLess(len(response.content), len(plain.content))
+
+    @override_settings(COMPRESSION_MIN_SIZE=1024 * 1024)
+    def test_responses_below_threshold_are_not_compressed(self):
+
+        response = self.client.get(RECIPES_URL, HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertNotIn("Content-Encoding", response)
+
+    def test_streaming_responses_are_compressed_as_they_stream(self):
+
+        chunks = [b'{"chunk": %d}\n' % i * 50 for i in range(20)]
+        middleware = CompressionMiddleware(lambda request: StreamingHttpResponse(iter(chunks), content_type="application/json"))
+        request = RequestFactory().get("/api/recipe/recipes/", HTTP_ACCEPT_ENCODING="gzip")
+
+        response = middleware(request)
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), b"".join(chunks))
+
+    def test_already_encoded_responses_are_left_alone(self):
+
+        encoded = HttpResponse(gzip.compress(b"x" * 5000), content_type="application/json")
+        encoded["Content-Encoding"] = "gzip"
+        middleware = CompressionMiddleware(lambda request: encoded)
+        request = RequestFactory().get("/api/schema/", HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(middleware(request).content, encoded.content)
+
+
+class PrecompressedStaticFilesTests(SimpleTestCase):
+    """
+    Tests for collectstatic output and the static files view.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+
+        super().setUpClass()
+        cls.static_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(STATIC_ROOT=cls.static_root)
+        cls.settings_override.enable()
+        call_command("collectstatic", "--noinput", verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+
+        cls.settings_override.disable()
+        shutil.rmtree(cls.static_root)
+        super().tearDownClass()
+
+    def test_hashed_file_is_served_precompressed_with_long_cache(self):
+
+        url = staticfiles_storage.url("admin/css/base.css")
+        path = url[len("/static/static/"):]
+        self.assertRegex(path, r"base\.[0-9a-f]{12}\.css$")
+
+        response = serve_static(RequestFactory().get(url, HTTP_ACCEPT_ENCODING="gzip"), path)
+        content = gzip.decompress(b"".join(response.streaming_content))
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Type"], "text/css")
+        self.assertIn("immutable", response["Cache-Control"])
+        with staticfiles_storage.open(path) as original:
+            self.assertEqual(content, original.read())
+
+    def test_unhashed_file_gets_short_cache(self):
+
+        response = serve_static(RequestFactory().get("/"), "admin/css/base.css")
+        response.close()
+
+        self.assertNotIn("Content-Encoding", response)
+        self.assertNotIn("immutable", response["Cache-Control"])
@@ -0,0 +1,168 @@
+"""
+Tests for the concurrency limits and load shedding.
+"""
+
+import random
+import threading
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core_app import concurrency, metrics
+from core_app.concurrency import ConcurrencyLimiter
+
+
+RECIPES_URL = reverse("recipe_app:recipe-list")
+ME_URL = reverse("user_app:me")
+
+
+class ConcurrencyLimiterTests(SimpleTestCase):
+    """
+    Tests for the limiter.
+    """
+
+    def test_requests_over_the_limit_are_rejected_when_the_queue_is_full(self):
+
+        limiter = ConcurrencyLimiter("test", 2, queue_size=0)
+
+        self.assertIsNone(limiter.acquire())
+        self.assertIsNone(limiter.acquire())
+        self.assertEqual(limiter.acquire(), "queue_full")
+
+        limiter.release()
+        self.assertIsNone(limiter.acquire())
+
+    def test_queued_request_is_rejected_at_the_deadline(self):
+
+        limiter = ConcurrencyLimiter("test", 1, queue_size=1, queue_timeout=0.01)
+        limiter.acquire()
+
+        self.assertEqual(limiter.acquire(), "timeout")
+        self.assertEqual(limiter.waiting, 0)
+
+    def test_queued_request_gets_the_slot_freed_before_the_deadline(self):
+
+        limiter = ConcurrencyLimiter("test", 1, queue_size=1, queue_timeout=5)
+        limiter.acquire()
+
+        timer = threading.Timer(0.01, limiter.release)
+        timer.start()
+        self.assertIsNone(limiter.acquire())
+        timer.join()
+
+        self.assertEqual(limiter.in_flight, 1)
+
+    def test_limit_shrinks_when_latency_goes_up_and_grows_back(self):
+
+        limiter = ConcurrencyLimiter("test", 10, min_limit=2, tolerance=2.0)
+
+        for _ in range(10):
+            limiter.acquire()
+            limiter.release(0.01)
+        self.assertEqual(limiter.current_limit, 10)
+
+        for _ in range(50): # the database slows down
+            limiter.acquire()
+            limiter.release(0.5)
+        self.assertEqual(limiter.current_limit, 2)
+
+        for _ in range(200): # back to normal, with the limit in use
+            for _ in range(limiter.current_limit):
+                limiter.acquire()
+            for _ in range(limiter.current_limit):
+                limiter.release(0.01)
+        self.assertEqual(limiter.current_limit, 10)
+
+    def test_baseline_follows_a_new_normal_latency(self):
+
+        limiter = ConcurrencyLimiter("test", 10, min_limit=2, tolerance=2.0)
+
+        for _ in range(100):
+            limiter.acquire()
+            limiter.release(0.01)
+
+        for _ in range(500): # slower for good (e.g. bigger pages), with the limit in use
+            for _ in range(limiter.current_limit):
+                limiter.acquire()
+            for _ in range(limiter.current_limit):
+                limiter.release(0.05)
+        self.assertEqual(limiter.current_limit, 10)
+
+        for _ in range(500): # and fast again
+            limiter.acquire()
+            limiter.release(0.01)
+        self.assertAlmostEqual(limiter.baseline, 0.01, places=3)
+
+    def test_limit_is_fixed_when_not_adaptive(self):
+
+        limiter = ConcurrencyLimiter("test", 10, adaptive=False)
+
+        for _ in range(50):
+            limiter.acquire()
+            limiter.release(0.01 if _ == 0 else 0.5)
+
+        self.assertEqual(limiter.current_limit, 10)
+
+
+@override_settings(CONCURRENCY_LIMITS={"default": 8, "user_app:me": 1}, CONCURRENCY_QUEUE_SIZE=0)
+class ConcurrencyLimitMiddlewareTests(TestCase):
+    """
+    Tests for the shedding of API requests.
+    """
+
+    def setUp(self):
+
+        concurrency.reset_limiters()
+        self.user = get_user_model().objects.create_user(email="test@example.com", password="testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+
+        concurrency.reset_limiters()
+
+    def test_request_over_the_route_limit_gets_a_503(self):
+
+        concurrency.get_limiter("user_app:me").acquire() # a request in progress
+
+        response = self.client.get(ME_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response["Retry-After"], "1")
+        rejected = metrics.REGISTRY.get_sample_value(
+            "concurrency_rejected_total", {"route": "user_app:me", "reason": "queue_full"}
+        )
+        self.assertGreaterEqual(rejected, 1)
+
+        # other routes have their own limit
+        self.assertEqual(self.client.get(RECIPES_URL).status_code, status.HTTP_200_OK)
+
+    def test_slot_is_freed_after_the_response(self):
+
+        for _ in range(3):
+            self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_200_OK)
+
+        self.assertEqual(concurrency.get_limiter("user_app:me").in_flight, 0)
+
+    def test_limits_stay_put_under_healthy_mixed_latency_traffic(self):
+
+        latencies = {"recipe_app:tag-list": 0.002, "recipe_app:ingredient-list": 0.005, "recipe_app:recipe-list": 0.04}
+        randomness = random.Random(42)
+
+        for _ in range(2000):
+            route = randomness.choice(list(latencies))
+            limiter = concurrency.get_limiter(route)
+            limiter.acquire()
+            limiter.release(latencies[route] * randomness.uniform(0.5, 1.5))
+
+        # every route has its own limiter and baseline, with the default limit
+        for route in latencies:
+            self.assertEqual(concurrency.get_limiter(route).current_limit, 8)
+
+    @override_settings(CONCURRENCY_LIMITING=False)
+    def test_no_limits_when_disabled(self):
+
+        concurrency.get_limiter("user_app:me").acquire()
+
+        self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_200_OK)
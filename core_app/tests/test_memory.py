@@ -0,0 +1,115 @@
+"""
+Tests for the memory profiling and recycling of workers.
+"""
+
+import os
+import signal
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core_app import memory, metrics
+
+
+MEMORY_PROFILE_URL = reverse("profile-memory")
+RECIPES_URL = reverse("recipe_app:recipe-list")
+
+
+def allocate():
+    """
+    Allocate and return about 1 MB.
+    """
+
+    return [bytes(1024) for _ in range(1024)]
+
+
+class MemoryProfilerTests(SimpleTestCase):
+    """
+    Tests for the allocation reports.
+    """
+
+    def tearDown(self):
+
+        memory.stop_profiling()
+
+    def test_report_shows_top_growing_allocation_sites(self):
+
+        profiler = memory.start_profiling(interval=3600)
+        leak = allocate()
+
+        with self.assertLogs("core_app.memory", level="INFO"):
+            report = profiler.report()
+
+        top = report["top"][0]
+        self.assertIn("test_memory.py", top["site"])
+        self.assertGreater(top["size_diff_bytes"], 1024 * 1024)
+        self.assertGreaterEqual(report["traced_bytes"], 1024 * 1024)
+        del leak
+
+    @override_settings(MEMORY_CEILING_MB=1)
+    @patch("core_app.memory.os.kill")
+    def test_worker_over_the_ceiling_is_recycled_once(self, mock_kill):
+
+        with self.assertLogs("core_app.memory", level="WARNING"):
+            memory.check_memory_ceiling()
+        memory.check_memory_ceiling()
+
+        mock_kill.assert_called_once_with(os.getpid(), signal.SIGTERM)
+        memory._recycling = False
+
+
+class MemoryMiddlewareTests(TestCase):
+    """
+    Tests for the peak memory of requests.
+    """
+
+    def setUp(self):
+
+        self.user = get_user_model().objects.create_user(email="test@example.com", password="testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+
+        memory.stop_profiling()
+
+    def test_peak_memory_of_requests_is_recorded_while_tracing(self):
+
+        memory.start_profiling(interval=3600)
+
+        self.client.get(RECIPES_URL)
+
+        peaks = metrics.REGISTRY.get_sample_value("http_request_peak_memory_bytes_sum", {"view": "recipe-list"})
+        self.assertGreater(peaks, 0)
+
+
+class MemoryProfilerAPITests(TestCase):
+    """
+    Tests for the memory profiler endpoint.
+    """
+
+    def setUp(self):
+
+        self.client = APIClient()
+        admin = get_user_model().objects.create_superuser(email="admin@example.com", password="testpass123")
+        self.client.force_authenticate(admin)
+
+    def tearDown(self):
+
+        memory.stop_profiling()
+
+    def test_start_report_and_stop(self):
+
+        response = self.client.post(MEMORY_PROFILE_URL, {"action": "start", "interval": 3600})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertLogs("core_app.memory", level="INFO"):
+            response = self.client.post(MEMORY_PROFILE_URL, {"action": "report"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("top", response.data)
+
+        self.client.post(MEMORY_PROFILE_URL, {"action": "stop"})
+        response = self.client.post(MEMORY_PROFILE_URL, {"action": "report"})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
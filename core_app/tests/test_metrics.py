@@ -0,0 +1,117 @@
+"""
+Tests for the prometheus metrics.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from prometheus_client.multiprocess import mark_process_dead
+from prometheus_client.parser import text_string_to_metric_families
+from rest_framework.test import APIClient
+from core_app.models import Recipe
+
+
+METRICS_URL = reverse("metrics")
+RECIPES_URL = reverse("recipe_app:recipe-list")
+
+# a worker process handling a request, in multiprocess mode
+WORKER = """
+import os, django
+django.setup()
+from core_app import metrics
+metrics.REQUESTS.labels(view="recipe-list", method="GET", status="200").inc()
+metrics.DB_CONNECTIONS_OPEN.labels(alias="default").set(1)
+print(os.getpid())
+"""
+
+
+def run_worker(directory):
+    """
+    Run a worker process that writes its metrics to directory, returns its pid.
+    """
+
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": directory}
+    worker = subprocess.run([sys.executable, "-c", WORKER], env=env, cwd=settings.BASE_DIR, capture_output=True, check=True)
+
+    return int(worker.stdout)
+
+
+def parse_samples(content):
+    """
+    Return the samples of a /metrics response, by name and labels.
+    """
+
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(content.decode())
+        for sample in family.samples
+    }
+
+
+@override_settings(METRICS_ALLOWED_IPS=["127.0.0.1"])
+class MultiprocessMetricsTests(TestCase):
+    """
+    Tests for the metrics of several worker processes.
+    """
+
+    def test_values_of_the_workers_are_merged_and_exited_workers_drop_their_gauges(self):
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_MULTIPROC_DIR=directory):
+            exited, live = run_worker(directory), run_worker(directory)
+            mark_process_dead(exited, path=directory) # gunicorn's child_exit hook
+
+            samples = parse_samples(self.client.get(METRICS_URL).content)
+            files = os.listdir(directory)
+
+        requests = ("http_requests_total", (("method", "GET"), ("status", "200"), ("view", "recipe-list")))
+        self.assertEqual(samples[requests], 2) # counters of exited workers are kept
+        self.assertEqual(samples[("db_connections_open", (("alias", "default"), ))], 1)
+        self.assertNotIn(f"gauge_livesum_{exited}.db", files)
+        self.assertIn(f"gauge_livesum_{live}.db", files)
+
+
+@override_settings(METRICS_ALLOWED_IPS=["127.0.0.1"]) # the address of the test client
+class MetricsEndpointTests(TestCase):
+    """
+    Tests for the /metrics endpoint.
+    """
+
+    def test_requests_are_counted_by_view(self):
+
+        user = get_user_model().objects.create_user(email="test@example.com", password="testpass123")
+        Recipe.objects.create(user=user, title="Curry", time_minutes=30, price=Decimal("5.00"))
+        client = APIClient()
+        client.force_authenticate(user)
+        client.get(RECIPES_URL)
+
+        response = client.get(METRICS_URL)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        content = response.content.decode()
+        self.assertIn('http_requests_total{method="GET",status="200",view="recipe-list"}', content)
+        self.assertIn('http_request_duration_seconds_count{method="GET",view="recipe-list"}', content)
+        self.assertIn('db_queries_total{view="recipe-list"}', content)
+        self.assertIn('db_connections_open{alias="default"} 1.0', content)
+
+    def test_clients_outside_the_allowed_networks_are_rejected(self):
+
+        with override_settings(METRICS_ALLOWED_IPS=["10.0.0.0/8"]):
+            rejected = self.client.get(METRICS_URL)
+            allowed = self.client.get(METRICS_URL, REMOTE_ADDR="10.1.2.3")
+
+        self.assertEqual(rejected.status_code, 403)
+        self.assertEqual(allowed.status_code, 200)
+
+    @override_settings(METRICS_ALLOWED_IPS=[])
+    def test_metrics_are_private_by_default(self):
+
+        response = self.client.get(METRICS_URL)
+
+        self.assertEqual(response.status_code, 403)
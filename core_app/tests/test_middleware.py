@@ -0,0 +1,93 @@
+"""
+Tests for the project middleware.
+"""
+
+import json
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from core_app.models import Recipe
+
+
+RECIPES_URL = reverse("recipe_app:recipe-list")
+
+
+class RequestTimingMiddlewareTests(TestCase):
+    """
+    Tests for the per-request timing instrumentation.
+    """
+
+    def setUp(self):
+
+        self.user = get_user_model().objects.create_user(email="test@example.com", password="testpass123")
+        Recipe.objects.create(user=self.user, title="Curry", time_minutes=30, price=Decimal("5.00"))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @override_settings(SERVER_TIMING_HEADER=True)
+    def test_server_timing_header_is_added_when_enabled(self):
+
+        response = self.client.get(RECIPES_URL)
+
+        header = response["Server-Timing"]
+        for metric in ["total;dur=", "db;dur=", "serialize;dur=", "render;dur="]:
+            self.assertIn(metric, header)
+        self.assertIn('desc="3 queries"', header)
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_server_timing_header_is_not_added_when_disabled(self):
+
+        response = self.client.get(RECIPES_URL)
+
+        self.assertNotIn("Server-Timing", response)
+
+    @override_settings(REQUEST_TIMING_LOG=True)
+    def test_timings_are_logged_as_json(self):
+
+        with self.assertLogs("core_app.timing", level="INFO") as logs:
+            self.client.get(RECIPES_URL)
+
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry["view"], "recipe_app:recipe-list")
+        self.assertEqual(entry["status"], 200)
+        self.assertEqual(entry["db_queries"], 3)
+        self.assertIn("serialize_ms", entry)
+
+
+class RoutedMiddlewareTests(TestCase):
+    """
+    Tests for the lean API middleware stack.
+    """
+
+    def setUp(self):
+
+        self.user = get_user_model().objects.create_user(email="test@example.com", password="testpass123")
+
+    def test_api_requests_skip_session_middleware(self):
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.get(RECIPES_URL)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(hasattr(response.wsgi_request, "session"))
+
+    def test_admin_and_docs_keep_full_stack(self):
+
+        for url in [reverse("admin:login"), reverse("api-doc")]:
+            response = Client().get(url)
+
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(hasattr(response.wsgi_request, "session"))
+            self.assertTrue(hasattr(response.wsgi_request, "user"))
+
+    def test_csrf_view_hook_runs_in_full_stack(self):
+
+        client = Client(enforce_csrf_checks=True)
+
+        response = client.post(reverse("admin:login"), {"username": "test@example.com", "password": "testpass123"})
+
+        self.assertEqual(response.status_code, 403)
@@ -2,7 +2,9 @@
 Tests for models.
 """
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from decimal import Decimal
 from core_app.models import Recipe, Tag, Ingredient, recipe_image_file_path
@@ -101,7 +103,7 @@ class RecipeModelTests(TestCase):
         mock_uuid4.return_value = uuid
         file_path = recipe_image_file_path(None, "example.jpg")
 
-        self.assertEqual(file_path, f"uploads/recipe/{uuid}.jpg")
+        self.assertEqual(file_path, f"uploads/recipe/te/st/{uuid}.jpg")
 
 
 class TagModelTests(TestCase):
@@ -119,6 +121,22 @@ class TagModelTests(TestCase):
 
         self.assertEqual(str(tag), tag.name)
 
+    def test_get_or_create_many(self):
+
+        user = create_user()
+        existing = Tag.objects.create(user=user, name="Dinner")
+        Tag.objects.create(user=create_user(email="other@example.com"), name="Vegan")
+
+        with self.assertNumQueries(3):
+            tags = Tag.objects.get_or_create_many(user, ["Vegan", "Dinner", "Vegan"])
+
+        self.assertEqual([tag.name for tag in tags], ["Vegan", "Dinner"])
+        self.assertEqual(tags[1], existing)
+        self.assertEqual(tags[0].user, user)
+
+        with self.assertNumQueries(1): # nothing to create
+            self.assertEqual(Tag.objects.get_or_create_many(user, ["Dinner", "Vegan"]), tags[::-1])
+
 
 class IngredientModelTests(TestCase):
     """
@@ -132,3 +150,99 @@ class IngredientModelTests(TestCase):
 
         self.assertEqual(str(ingredient), ingredient.name)
 
+
+class RecipeCountTests(TestCase):
+    """
+    Tests for the recipe counters of tags and ingredients.
+    """
+
+    def setUp(self):
+
+        self.user = create_user()
+        self.recipe = Recipe.objects.create(user=self.user, title="Curry", time_minutes=30, price=Decimal("5.00"))
+        self.tag = Tag.objects.create(user=self.user, name="Dinner")
+        self.ingredient = Ingredient.objects.create(user=self.user, name="Rice")
+
+    def test_adding_and_removing_tags_updates_counter(self):
+
+        self.recipe.tags.add(self.tag)
+        self.recipe.tags.add(self.tag) # adding an existing tag doesn't count twice
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 1)
+
+        self.recipe.tags.remove(self.tag)
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 0)
+
+    def test_concurrent_add_of_the_same_tag_counts_once(self):
+
+        self.recipe.tags.add(self.tag)
+        # a concurrent add saw the tag missing too, its insert is skipped by the unique constraint
+        with patch.object(type(self.recipe.tags), "_get_missing_target_ids", return_value={self.tag.pk}):
+            self.recipe.tags.add(self.tag)
+
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 1)
+
+    def test_clearing_ingredients_updates_counter(self):
+
+        self.recipe.ingredients.add(self.ingredient)
+        self.recipe.ingredients.clear()
+
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.ingredient.recipe_count, 0)
+
+    def test_reverse_relation_updates_counter(self):
+
+        other_recipe = Recipe.objects.create(user=self.user, title="Pilaf", time_minutes=40, price=Decimal("4.00"))
+        self.tag.recipe_set.add(self.recipe, other_recipe)
+
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 2)
+
+    def test_deleting_recipe_updates_counter(self):
+
+        self.recipe.tags.add(self.tag)
+        self.recipe.ingredients.add(self.ingredient)
+        self.recipe.delete()
+
+        self.tag.refresh_from_db()
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 0)
+        self.assertEqual(self.ingredient.recipe_count, 0)
+
+    def test_deleting_many_recipes_recounts_once(self):
+
+        self.recipe.tags.add(self.tag) # kept
+
+        def delete_recipes(count):
+            recipes = [
+                Recipe.objects.create(user=self.user, title=f"Recipe {i}", time_minutes=5, price=Decimal("2.00"))
+                for i in range(count)
+            ]
+            for recipe in recipes:
+                recipe.tags.add(self.tag)
+                recipe.ingredients.add(self.ingredient)
+
+            with CaptureQueriesContext(connection) as queries:
+                Recipe.objects.filter(pk__in=[recipe.pk for recipe in recipes]).delete()
+
+            return len(queries)
+
+        # the counters are recounted once per delete, not updated once per recipe
+        self.assertEqual(delete_recipes(1), delete_recipes(5))
+        self.tag.refresh_from_db()
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 1)
+        self.assertEqual(self.ingredient.recipe_count, 0)
+
+    def test_recount_repairs_drifted_counters(self):
+
+        self.recipe.tags.add(self.tag)
+        Tag.objects.update(recipe_count=7) # simulate drift
+
+        repaired = Tag.objects.recount()
+
+        self.tag.refresh_from_db()
+        self.assertEqual(repaired, 1)
+        self.assertEqual(self.tag.recipe_count, 1)
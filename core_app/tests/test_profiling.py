@@ -0,0 +1,118 @@
+"""
+Tests for the sampling profiler.
+"""
+
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core_app import profiling
+from core_app.profiling import SamplingProfiler
+
+
+PROFILE_URL = reverse("profile")
+
+
+def busy_request(path, stop):
+    """
+    Keep the CPU busy as if serving a request to path until stop is set.
+    """
+
+    profiling.request_started(path)
+    try:
+        while not stop.is_set():
+            sum(range(1000))
+    finally:
+        profiling.request_finished()
+
+
+class SamplingProfilerTests(SimpleTestCase):
+    """
+    Tests for SamplingProfiler.
+    """
+
+    def profile(self, path_pattern):
+        """
+        Profile a busy request to the recipe list and return the output.
+        """
+
+        stop = threading.Event()
+        thread = threading.Thread(target=busy_request, args=["/api/recipe/recipes/", stop])
+        thread.start()
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            profiler = SamplingProfiler(0.2, interval_ms=1, path_pattern=path_pattern, output_dir=output_dir)
+            try:
+                with self.assertLogs("core_app.profiling", level="INFO"):
+                    profiler.run()
+            finally:
+                stop.set()
+                thread.join()
+
+            with open(profiler.output_path) as output:
+                return output.read()
+
+    def test_requests_matching_the_path_are_sampled(self):
+
+        output = self.profile("^/api/recipe/")
+
+        stack, count = output.splitlines()[0].rsplit(" ", 1)
+        self.assertIn("core_app.tests.test_profiling:busy_request", stack)
+        self.assertTrue(stack.startswith("threading:")) # outermost call first
+        self.assertGreater(int(count), 0)
+
+    def test_requests_not_matching_the_path_are_ignored(self):
+
+        output = self.profile("^/api/user/")
+
+        self.assertEqual(output, "")
+
+
+class ProfilerAPITests(TestCase):
+    """
+    Tests for the profiler endpoint.
+    """
+
+    def setUp(self):
+
+        self.client = APIClient()
+
+    def test_profiler_requires_staff_user(self):
+
+        user = get_user_model().objects.create_user(email="user@example.com", password="testpass123")
+        self.client.force_authenticate(user)
+
+        response = self.client.post(PROFILE_URL, {"seconds": 1})
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_staff_user_starts_profiler(self):
+
+        admin = get_user_model().objects.create_superuser(email="admin@example.com", password="testpass123")
+        self.client.force_authenticate(admin)
+
+        with tempfile.TemporaryDirectory() as output_dir, self.settings(PROFILER_OUTPUT_DIR=output_dir):
+            response = self.client.post(PROFILE_URL, {"seconds": 1, "interval_ms": 5, "path": "^/api/recipe/"})
+            busy = self.client.post(PROFILE_URL, {"seconds": 1})
+            with self.assertLogs("core_app.profiling", level="INFO"):
+                time.sleep(1.5) # let it finish writing
+
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            self.assertTrue(response.data["output"].startswith(output_dir))
+            self.assertEqual(busy.status_code, status.HTTP_409_CONFLICT) # one profiler at a time
+
+    @patch("core_app.views.start_profiler")
+    def test_invalid_path_pattern_is_rejected(self, mock_start_profiler):
+
+        admin = get_user_model().objects.create_superuser(email="admin@example.com", password="testpass123")
+        self.client.force_authenticate(admin)
+
+        response = self.client.post(PROFILE_URL, {"path": "("})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        mock_start_profiler.assert_not_called()
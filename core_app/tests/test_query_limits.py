@@ -0,0 +1,92 @@
+"""
+Tests for the statement timeouts and query budgets of API views.
+"""
+
+from unittest import skipUnless
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core_app.query_limits import QUERY_CANCELED, QueryBudgetExceeded
+from recipe_app.views import RecipeViewSet
+
+
+RECIPES_URL = reverse("recipe_app:recipe-list")
+
+
+class QueryCanceled(Exception):
+    """
+    Stands for the psycopg error of a statement cancelled by statement_timeout.
+    """
+
+    pgcode = QUERY_CANCELED
+
+
+class QueryLimitsTests(TestCase):
+    """
+    Tests for QueryLimitsMixin.
+    """
+
+    def setUp(self):
+
+        self.user = get_user_model().objects.create_user(email="test@example.com", password="testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_statement_timeout_of_the_action(self):
+
+        view = RecipeViewSet()
+
+        view.action = "list"
+        self.assertEqual(view.get_statement_timeout(), 2000)
+        view.action = "retrieve"
+        with override_settings(STATEMENT_TIMEOUT_MS=1234):
+            self.assertEqual(view.get_statement_timeout(), 1234)
+
+    @skipUnless(connection.vendor == "postgresql", "statement_timeout is a postgres setting")
+    def test_statement_timeout_is_set_during_the_view_only(self):
+
+        def show_timeout(queryset, fields=None):
+            with connection.cursor() as cursor:
+                cursor.execute("SHOW statement_timeout")
+                return [{"timeout": cursor.fetchone()[0]}]
+
+        with patch("recipe_app.views.recipe_list_representation", side_effect=show_timeout):
+            with self.assertNumQueries(1): # the SET and RESET are not queries of the view
+                response = self.client.get(RECIPES_URL)
+
+        self.assertEqual(response.data, [{"timeout": "2s"}])
+        with connection.cursor() as cursor:
+            cursor.execute("SHOW statement_timeout")
+            self.assertEqual(cursor.fetchone()[0], "0")
+
+    def test_cancelled_statement_is_a_503(self):
+
+        error = OperationalError("canceling statement due to statement timeout")
+        error.__cause__ = QueryCanceled()
+
+        with patch("recipe_app.views.recipe_list_representation", side_effect=error):
+            with self.assertLogs("core_app.query_limits", level="WARNING"):
+                response = self.client.get(RECIPES_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    @override_settings(QUERY_BUDGET_MODE="log")
+    @patch.object(RecipeViewSet, "query_budgets", {"list": 0})
+    def test_queries_over_the_budget_are_logged(self):
+
+        with self.assertLogs("core_app.query_limits", level="WARNING") as logs:
+            response = self.client.get(RECIPES_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("RecipeViewSet.list issued 1 queries, its budget is 0", logs.output[0])
+
+    @override_settings(QUERY_BUDGET_MODE="raise")
+    @patch.object(RecipeViewSet, "query_budgets", {"list": 0})
+    def test_queries_over_the_budget_raise_when_configured(self):
+
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(RECIPES_URL)
@@ -0,0 +1,78 @@
+"""
+Tests for the cached OpenAPI schema.
+"""
+
+import gzip
+from io import StringIO
+import json
+import os
+import tempfile
+from unittest.mock import patch
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core_app.schema import clear_schema_cache, generate_schema
+
+
+SCHEMA_URL = reverse("api-schema")
+
+
+class CachedSchemaTests(TestCase):
+    """
+    Tests for the schema view served from memory.
+    """
+
+    def setUp(self):
+
+        clear_schema_cache()
+        self.client = APIClient()
+
+    def tearDown(self):
+
+        clear_schema_cache()
+
+    def test_schema_is_generated_only_once(self):
+
+        with patch("core_app.schema.generate_schema", side_effect=generate_schema) as patched_generate:
+            first = self.client.get(SCHEMA_URL)
+            second = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(patched_generate.call_count, 1)
+
+    def test_schema_not_modified_when_etag_matches(self):
+
+        response = self.client.get(SCHEMA_URL)
+        etag = response["ETag"]
+
+        response = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_schema_is_gzipped_when_accepted(self):
+
+        plain = self.client.get(SCHEMA_URL)
+        gzipped = self.client.get(SCHEMA_URL, HTTP_ACCEPT_ENCODING="gzip, deflate")
+
+        self.assertEqual(gzipped["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(gzipped.content), plain.content)
+
+    def test_schema_is_loaded_from_precomputed_file(self):
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            schema_file = os.path.join(tmp_dir, "schema.json")
+
+            with override_settings(SCHEMA_CODE_VERSION="1.0", SCHEMA_CACHE_FILE=schema_file):
+                call_command("precompute_schema", stdout=StringIO())
+
+                with open(schema_file) as stored:
+                    self.assertEqual(json.load(stored)["version"], "1.0")
+
+                with patch("core_app.schema.generate_schema") as patched_generate:
+                    response = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        patched_generate.assert_not_called()
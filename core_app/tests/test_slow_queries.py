@@ -0,0 +1,136 @@
+"""
+Tests for the slow query log.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from core_app.models import Recipe, SlowQuery
+from core_app.slow_queries import SlowQueryEvent, normalize_sql, save_slow_query
+
+
+RECIPES_URL = reverse("recipe_app:recipe-list")
+
+
+def create_event(sql='SELECT "id" FROM "core_app_recipe" WHERE "id" IN (%s, %s)', duration_ms=150.0):
+    """
+    Create and return a slow query event.
+    """
+
+    return SlowQueryEvent(
+        alias="default", sql=sql, params=[1, 2], many=False, duration_ms=duration_ms,
+        view="recipe_app:recipe-list",
+    )
+
+
+class NormalizeSQLTests(SimpleTestCase):
+    """
+    Tests for SQL normalization.
+    """
+
+    def test_literals_and_placeholders_are_replaced(self):
+
+        fingerprint, normalized = normalize_sql("SELECT  *\n FROM t WHERE a = 'x' AND b = %s LIMIT 21")
+
+        self.assertEqual(normalized, "SELECT * FROM t WHERE a = ? AND b = ? LIMIT ?")
+        self.assertEqual(len(fingerprint), 40)
+
+    def test_in_lists_of_any_length_have_the_same_fingerprint(self):
+
+        short = normalize_sql('SELECT * FROM "T3" WHERE id IN (%s, %s)')
+        long = normalize_sql('SELECT * FROM "T3" WHERE id IN (%s, %s, %s, %s)')
+
+        self.assertEqual(short, long)
+        self.assertEqual(short[1], 'SELECT * FROM "T3" WHERE id IN (...)')
+
+
+class SaveSlowQueryTests(TestCase):
+    """
+    Tests for the aggregation of slow queries.
+    """
+
+    def test_slow_queries_are_aggregated_with_their_plan(self):
+
+        save_slow_query(create_event(duration_ms=150.0))
+        save_slow_query(create_event(sql='SELECT "id" FROM "core_app_recipe" WHERE "id" IN (%s)', duration_ms=250.0))
+
+        query = SlowQuery.objects.get()
+        self.assertEqual(query.calls, 2)
+        self.assertEqual(query.total_duration_ms, 400.0)
+        self.assertEqual(query.max_duration_ms, 250.0)
+        self.assertTrue(query.plan) # captured once, on the first call
+
+    def test_repeated_query_bumps_last_seen(self):
+
+        save_slow_query(create_event())
+        first = SlowQuery.objects.get()
+
+        later = first.last_seen + timedelta(minutes=5)
+        with patch("core_app.slow_queries.timezone.now", return_value=later):
+            save_slow_query(create_event())
+
+        query = SlowQuery.objects.get()
+        self.assertEqual(query.last_seen, later)
+        self.assertEqual(query.first_seen, first.first_seen)
+
+    def test_writes_are_not_explained(self):
+
+        save_slow_query(create_event(sql='UPDATE "core_app_tag" SET "recipe_count" = %s'))
+
+        self.assertEqual(SlowQuery.objects.get().plan, "")
+
+
+class SlowQueryLogMiddlewareTests(TestCase):
+    """
+    Tests for the capture of slow queries during requests.
+    """
+
+    def setUp(self):
+
+        self.user = get_user_model().objects.create_user(email="test@example.com", password="testpass123")
+        Recipe.objects.create(user=self.user, title="Curry", time_minutes=30, price=Decimal("5.00"))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @override_settings(SLOW_QUERY_LOG=True, SLOW_QUERY_THRESHOLD_MS=0)
+    @patch("core_app.slow_queries.submit")
+    def test_slow_queries_are_submitted_with_their_view(self, mock_submit):
+
+        with self.assertLogs("core_app.slow_queries", level="WARNING"):
+            self.client.get(RECIPES_URL)
+
+        events = [call.args[0] for call in mock_submit.call_args_list]
+        self.assertEqual(len(events), 3)
+        self.assertTrue(all(event.view == "recipe_app:recipe-list" for event in events))
+
+    @override_settings(SLOW_QUERY_LOG=True, SLOW_QUERY_THRESHOLD_MS=60000)
+    @patch("core_app.slow_queries.submit")
+    def test_fast_queries_are_ignored(self, mock_submit):
+
+        self.client.get(RECIPES_URL)
+
+        mock_submit.assert_not_called()
+
+
+class SlowQueriesCommandTests(TestCase):
+    """
+    Tests for the slow_queries command.
+    """
+
+    def test_list_and_clear_slow_queries(self):
+
+        save_slow_query(create_event())
+
+        out = StringIO()
+        call_command("slow_queries", "--plans", stdout=out)
+        self.assertIn("recipe_app:recipe-list: 1 calls", out.getvalue())
+        self.assertIn('IN (...)', out.getvalue())
+
+        call_command("slow_queries", "--clear", stdout=StringIO())
+        self.assertFalse(SlowQuery.objects.exists())
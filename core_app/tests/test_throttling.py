@@ -0,0 +1,161 @@
+"""
+Tests for the token bucket throttling.
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core_app.throttling import LocalBucketStore, get_store, parse_rate, take_token
+
+
+RECIPES_URL = reverse("recipe_app:recipe-list")
+TAGS_URL = reverse("recipe_app:tag-list")
+TOKEN_URL = reverse("user_app:token")
+
+
+def throttle_rates(**rates):
+    """
+    Return REST_FRAMEWORK settings with the given throttle rates.
+    """
+
+    return {**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": {"user": "1000/min", "anon": "1000/min", **rates}}
+
+
+class TokenBucketTests(SimpleTestCase):
+    """
+    Tests for the token bucket algorithm.
+    """
+
+    def test_parse_rate(self):
+
+        self.assertEqual(parse_rate("120/min"), (120, 2.0))
+        self.assertEqual(parse_rate("10/hour"), (10, 10 / 3600))
+
+    def test_bucket_allows_burst_then_refills(self):
+
+        tokens = 2
+        tokens, first = take_token(tokens, 0, capacity=2, refill_rate=1, now=0)
+        tokens, second = take_token(tokens, 0, capacity=2, refill_rate=1, now=0)
+        tokens, third = take_token(tokens, 0, capacity=2, refill_rate=1, now=0)
+
+        self.assertEqual([first.allowed, second.allowed, third.allowed], [True, True, False])
+        self.assertEqual(third.retry_after, 1.0)
+        self.assertEqual(third.reset_after, 2.0)
+
+        tokens, later = take_token(tokens, 0, capacity=2, refill_rate=1, now=1.5)
+        self.assertTrue(later.allowed)
+        self.assertEqual(later.remaining, 0)
+
+    def test_local_store_keeps_buckets_per_key(self):
+
+        store = LocalBucketStore()
+
+        self.assertTrue(store.consume("a", 1, 0.001).allowed)
+        self.assertFalse(store.consume("a", 1, 0.001).allowed)
+        self.assertTrue(store.consume("b", 1, 0.001).allowed)
+
+
+class ThrottlingAPITests(TestCase):
+    """
+    Tests for throttled API requests.
+    """
+
+    def setUp(self):
+
+        cache.clear()
+        self.user = get_user_model().objects.create_user(email="test@example.com", password="testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+
+        cache.clear() # don't leave buckets behind for other tests
+
+    def test_action_bucket_throttles_with_retry_after(self):
+
+        with self.settings(REST_FRAMEWORK=throttle_rates(**{"recipe.list": "2/min"})):
+            responses = [self.client.get(RECIPES_URL) for _ in range(3)]
+            tags = self.client.get(TAGS_URL) # other views use the user bucket
+
+        self.assertEqual([response.status_code for response in responses], [200, 200, 429])
+        self.assertEqual(responses[0]["RateLimit-Limit"], "2")
+        self.assertEqual(responses[0]["RateLimit-Remaining"], "1")
+        self.assertEqual(responses[2]["Retry-After"], "30") # one token every 30 seconds
+        self.assertEqual(responses[2]["RateLimit-Remaining"], "0")
+        self.assertEqual(tags.status_code, status.HTTP_200_OK)
+
+    def test_buckets_are_per_user(self):
+
+        other_user = get_user_model().objects.create_user(email="other@example.com", password="testpass123")
+        other_client = APIClient()
+        other_client.force_authenticate(other_user)
+
+        with self.settings(REST_FRAMEWORK=throttle_rates(**{"recipe.list": "1/min"})):
+            self.client.get(RECIPES_URL)
+            throttled = self.client.get(RECIPES_URL)
+            other = other_client.get(RECIPES_URL)
+
+        self.assertEqual(throttled.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(other.status_code, status.HTTP_200_OK)
+
+    def test_login_has_its_own_bucket(self):
+
+        client = APIClient()
+        payload = {"email": "test@example.com", "password": "wrongpass"}
+
+        with self.settings(REST_FRAMEWORK=throttle_rates(login="2/min")):
+            responses = [client.post(TOKEN_URL, payload) for _ in range(3)]
+
+        self.assertEqual(
+            [response.status_code for response in responses],
+            [status.HTTP_400_BAD_REQUEST, status.HTTP_400_BAD_REQUEST, status.HTTP_429_TOO_MANY_REQUESTS]
+        )
+
+    def test_spoofed_forwarded_for_does_not_reset_the_login_bucket(self):
+
+        client = APIClient()
+        payload = {"email": "test@example.com", "password": "wrongpass"}
+
+        with self.settings(REST_FRAMEWORK=throttle_rates(login="2/min")):
+            responses = [
+                client.post(TOKEN_URL, payload, HTTP_X_FORWARDED_FOR=f"203.0.113.{i}") for i in range(3)
+            ]
+
+        self.assertEqual(responses[2].status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_client_address_is_taken_past_the_trusted_proxies(self):
+
+        client = APIClient()
+        payload = {"email": "test@example.com", "password": "wrongpass"}
+
+        with self.settings(REST_FRAMEWORK={**throttle_rates(login="1/min"), "NUM_PROXIES": 1}):
+            # the proxy appends the address it saw, whatever the client sent before it
+            client.post(TOKEN_URL, payload, HTTP_X_FORWARDED_FOR="1.1.1.1, 198.51.100.7")
+            spoofed = client.post(TOKEN_URL, payload, HTTP_X_FORWARDED_FOR="2.2.2.2, 198.51.100.7")
+            other = client.post(TOKEN_URL, payload, HTTP_X_FORWARDED_FOR="198.51.100.8")
+
+        self.assertEqual(spoofed.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(other.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(THROTTLE_STORE="local")
+    def test_local_store(self):
+
+        get_store().clear()
+
+        with self.settings(REST_FRAMEWORK=throttle_rates(**{"recipe.list": "1/min"})):
+            self.client.get(RECIPES_URL)
+            throttled = self.client.get(RECIPES_URL)
+
+        self.assertEqual(throttled.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(THROTTLING=False)
+    def test_throttling_can_be_disabled(self):
+
+        with self.settings(REST_FRAMEWORK=throttle_rates(**{"recipe.list": "1/min"})):
+            responses = [self.client.get(RECIPES_URL) for _ in range(3)]
+
+        self.assertTrue(all(response.status_code == status.HTTP_200_OK for response in responses))
@@ -0,0 +1,204 @@
+"""
+Token bucket throttling.
+
+Every client (the user when authenticated, the IP address otherwise) gets a
+bucket per scope that holds up to N tokens and refills at N per period, as
+set in REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"] (e.g. "recipe.list":
+"120/min"). Each request takes a token, so clients can burst up to N
+requests and then continue at the sustained rate.
+
+The scope of a request is "<view throttle_scope>.<action>" when that has a
+rate, else the view throttle_scope, else "user" or "anon". Buckets live in
+the Django cache (THROTTLE_STORE = "cache", shared by workers when the cache
+is) or in process memory ("local").
+"""
+
+from dataclasses import dataclass
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+
+def parse_rate(rate):
+    """
+    Parse "N/period" (period s, sec, min, hour, day, ...) into (capacity, tokens per second).
+    """
+
+    count, period = rate.split("/")
+    capacity = int(count)
+
+    return capacity, capacity / PERIODS[period[0]]
+
+
+@dataclass
+class BucketState:
+    """
+    The result of taking a token from a bucket.
+    """
+
+    allowed: bool
+    limit: int
+    remaining: int # whole tokens left
+    retry_after: float # seconds until a token is available (0 when allowed)
+    reset_after: float # seconds until the bucket is full again
+
+
+def take_token(tokens, updated, capacity, refill_rate, now):
+    """
+    Refill a bucket with tokens left at updated, take a token if possible.
+
+    Returns (tokens, BucketState).
+    """
+
+    tokens = min(capacity, tokens + (now - updated) * refill_rate)
+    allowed = tokens >= 1
+    if allowed:
+        tokens -= 1
+
+    state = BucketState(
+        allowed=allowed,
+        limit=capacity,
+        remaining=int(tokens),
+        retry_after=0.0 if allowed else (1 - tokens) / refill_rate,
+        reset_after=(capacity - tokens) / refill_rate,
+    )
+
+    return tokens, state
+
+
+class LocalBucketStore:
+    """
+    Buckets in process memory, limits apply per worker.
+    """
+
+    def __init__(self):
+
+        self._buckets = {} # key -> (tokens, updated)
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate):
+
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens, state = take_token(tokens, updated, capacity, refill_rate, now)
+            self._buckets[key] = (tokens, now)
+
+        return state
+
+    def clear(self):
+
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBucketStore:
+    """
+    Buckets in the Django cache, limits apply to every worker that shares the cache.
+
+    The read-modify-write of a bucket is guarded by a short lived lock key
+    (cache.add is atomic in every backend).
+    """
+
+    lock_timeout = 1 # seconds, in case a worker dies holding the lock
+    lock_attempts = 20
+
+    def __init__(self, alias="default"):
+
+        self.alias = alias
+
+    @property
+    def cache(self):
+
+        return caches[self.alias]
+
+    def consume(self, key, capacity, refill_rate):
+
+        cache = self.cache
+        lock_key = f"{key}:lock"
+        locked = False
+
+        for _ in range(self.lock_attempts):
+            if cache.add(lock_key, 1, self.lock_timeout):
+                locked = True
+                break
+            time.sleep(0.001)
+        # without the lock (very contended bucket) go on unguarded rather than fail the request
+
+        try:
+            now = time.time()
+            tokens, updated = cache.get(key, (capacity, now))
+            tokens, state = take_token(tokens, updated, capacity, refill_rate, now)
+            # a full bucket is the same as no bucket, let it expire then
+            cache.set(key, (tokens, now), timeout=int(state.reset_after) + 1)
+        finally:
+            if locked:
+                cache.delete(lock_key)
+
+        return state
+
+
+_stores = {"local": LocalBucketStore(), "cache": CacheBucketStore()}
+
+
+def get_store():
+
+    return _stores[settings.THROTTLE_STORE]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    DRF throttle backed by token buckets, per scope and per user (or IP address).
+
+    The state of the most restrictive bucket is left in request.ratelimit for
+    RateLimitHeadersMiddleware.
+    """
+
+    def get_scope(self, request, view):
+
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        view_scope = getattr(view, "throttle_scope", None)
+        action = getattr(view, "action", None)
+
+        if view_scope and action and f"{view_scope}.{action}" in rates:
+            return f"{view_scope}.{action}"
+        if view_scope and view_scope in rates:
+            return view_scope
+
+        return "user" if request.user and request.user.is_authenticated else "anon"
+
+    def get_ident_key(self, request):
+
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+
+        return f"ip:{self.get_ident(request)}"
+
+    def allow_request(self, request, view):
+
+        if not settings.THROTTLING:
+            return True
+
+        scope = self.get_scope(request, view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return True
+
+        capacity, refill_rate = parse_rate(rate)
+        self.state = get_store().consume(f"throttle:{scope}:{self.get_ident_key(request)}", capacity, refill_rate)
+
+        current = getattr(request._request, "ratelimit", None)
+        if current is None or (self.state.remaining, -self.state.reset_after) < (current.remaining, -current.reset_after):
+            request._request.ratelimit = self.state
+
+        return self.state.allowed
+
+    def wait(self):
+
+        return self.state.retry_after
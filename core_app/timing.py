@@ -0,0 +1,146 @@
+"""
+Per-request performance instrumentation.
+
+RequestTimingMiddleware creates a RequestTimings for every API request and
+makes it the current one (through a context variable), so that code deep in
+the stack can add to it without having access to the request: SQL queries
+are recorded by a database execute wrapper, and serialization by span().
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import time
+from rest_framework import serializers
+
+
+_current_timings = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """
+    Timings collected while handling one request, in seconds.
+    """
+
+    def __init__(self):
+
+        self.start = time.perf_counter()
+        self.total = None
+        self.db_time = 0.0
+        self.db_queries = 0
+        self.spans = {} # e.g. {"serialize": 0.012, "render": 0.003}
+
+    def add(self, name, duration):
+        """
+        Add duration to the span called name.
+        """
+
+        self.spans[name] = self.spans.get(name, 0.0) + duration
+
+    def record_query(self, execute, sql, params, many, context):
+        """
+        Database execute wrapper that times every SQL query.
+        """
+
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.db_queries += 1
+
+    def finish(self):
+        """
+        Stop the total request timer.
+        """
+
+        self.total = time.perf_counter() - self.start
+
+    def as_dict(self):
+        """
+        Return the timings in milliseconds.
+        """
+
+        return {
+            "total_ms": round(self.total * 1000, 3),
+            "db_ms": round(self.db_time * 1000, 3),
+            "db_queries": self.db_queries,
+            **{f"{name}_ms": round(duration * 1000, 3) for name, duration in self.spans.items()},
+        }
+
+    def server_timing_header(self):
+        """
+        Return the timings formatted as a Server-Timing header value.
+        """
+
+        metrics = [
+            f"total;dur={self.total * 1000:.3f}",
+            f'db;dur={self.db_time * 1000:.3f};desc="{self.db_queries} queries"',
+        ]
+        metrics += [f"{name};dur={duration * 1000:.3f}" for name, duration in self.spans.items()]
+
+        return ", ".join(metrics)
+
+
+def activate(timings):
+    """
+    Make timings the current RequestTimings, returns a token for deactivate().
+    """
+
+    return _current_timings.set(timings)
+
+
+def deactivate(token):
+
+    _current_timings.reset(token)
+
+
+def current_timings():
+    """
+    Return the RequestTimings of the request being handled, or None.
+    """
+
+    return _current_timings.get()
+
+
+@contextmanager
+def span(name):
+    """
+    Time the block and add it to the current request timings (does nothing outside a request).
+    """
+
+    timings = _current_timings.get()
+    if timings is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+class TimedListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer that records building its data as the "serialize" span.
+    """
+
+    @property
+    def data(self):
+
+        with span("serialize"):
+            return super().data
+
+
+class TimedSerializerMixin:
+    """
+    Serializer mixin that records building its data as the "serialize" span.
+
+    Set Meta.list_serializer_class = TimedListSerializer to also time many=True.
+    """
+
+    @property
+    def data(self):
+
+        with span("serialize"):
+            return super().data
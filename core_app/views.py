@@ -0,0 +1,135 @@
+"""
+Views for the core APIs.
+"""
+
+import mimetypes
+import os
+import re
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+from rest_framework import status
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from drf_spectacular.utils import extend_schema
+from core_app import compression, memory
+from core_app.profiling import start_profiler
+from core_app.serializers import ProfileRequestSerializer, MemoryProfileRequestSerializer
+
+
+# names written by ManifestStaticFilesStorage, e.g. admin/css/base.1a2b3c4d5e6f.css
+HASHED_NAME = re.compile(r"\.[0-9a-f]{12}\.[^/.]+$")
+
+
+def serve_static(request, path):
+    """
+    Serve a file collected in STATIC_ROOT, precompressed when possible.
+
+    Hash-named files never change, so they can be cached for a year.
+    """
+
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+    except ValueError:
+        raise Http404("Invalid path")
+
+    if not os.path.isfile(full_path):
+        raise Http404(f"{path} not found")
+
+    stat = os.stat(full_path)
+    if not was_modified_since(request.headers.get("If-Modified-Since"), stat.st_mtime):
+        return HttpResponseNotModified()
+
+    content_type, _ = mimetypes.guess_type(full_path)
+    extensions = {"br": ".br", "gzip": ".gz"}
+    encoding = compression.choose_encoding(
+        request.headers.get("Accept-Encoding", ""),
+        [name for name in ["br", "gzip"] if os.path.isfile(full_path + extensions[name])] # written by collectstatic
+    )
+
+    response = FileResponse(
+        open(full_path + extensions[encoding] if encoding else full_path, "rb"),
+        content_type=content_type or "application/octet-stream",
+        filename=os.path.basename(full_path),
+    )
+    if encoding:
+        response["Content-Encoding"] = encoding
+
+    if HASHED_NAME.search(path):
+        response["Cache-Control"] = "public, max-age=31536000, immutable" # a year
+    else:
+        response["Cache-Control"] = f"public, max-age={settings.STATIC_MAX_AGE}"
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    patch_vary_headers(response, ["Accept-Encoding", ])
+
+    return response
+
+
+class ProfilerView(APIView):
+    """
+    Profile the worker process that handles this request (staff only).
+    """
+
+    authentication_classes = [TokenAuthentication, ]
+    permission_classes = [IsAdminUser, ]
+
+    @extend_schema(request=ProfileRequestSerializer, responses={202: ProfileRequestSerializer})
+    def post(self, request):
+        """
+        Start the sampling profiler, its output is written to PROFILER_OUTPUT_DIR when it finishes.
+        """
+
+        serializer = ProfileRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        profiler = start_profiler(
+            serializer.validated_data["seconds"],
+            serializer.validated_data["interval_ms"],
+            serializer.validated_data.get("path") or None,
+        )
+        if profiler is None:
+            return Response({"detail": "A profiler is already running in this worker."}, status=status.HTTP_409_CONFLICT)
+
+        return Response(
+            {**serializer.validated_data, "pid": os.getpid(), "output": profiler.output_path},
+            status=status.HTTP_202_ACCEPTED
+        )
+
+
+class MemoryProfilerView(APIView):
+    """
+    Trace the allocations of the worker process that handles this request (staff only).
+    """
+
+    authentication_classes = [TokenAuthentication, ]
+    permission_classes = [IsAdminUser, ]
+
+    @extend_schema(request=MemoryProfileRequestSerializer, responses={200: None})
+    def post(self, request):
+        """
+        Start or stop tracing, or report the allocation sites that grew since the last report.
+        """
+
+        serializer = MemoryProfileRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        action = serializer.validated_data["action"]
+
+        if action == "start":
+            profiler = memory.start_profiling(interval=serializer.validated_data.get("interval"))
+            return Response({"pid": os.getpid(), "interval": profiler.interval})
+
+        if action == "stop":
+            memory.stop_profiling()
+            return Response({"pid": os.getpid()})
+
+        profiler = memory.get_profiler()
+        report = profiler.report() if profiler is not None else None
+        if report is None:
+            return Response({"detail": "Memory profiling is not running in this worker."}, status=status.HTTP_409_CONFLICT)
+
+        return Response(report)
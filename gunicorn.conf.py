@@ -0,0 +1,13 @@
+"""
+Gunicorn settings, loaded from the working directory.
+"""
+
+from prometheus_client import multiprocess
+
+
+def child_exit(server, worker):
+    """
+    Drop the gauges of an exited (or recycled) worker from the metrics (see core_app.metrics).
+    """
+
+    multiprocess.mark_process_dead(worker.pid)
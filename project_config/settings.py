@@ -24,9 +24,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-*g9%5e1%qx_2m^$w-13noit1f2r0+4q&tvu&eqeepwrgxq(x-2'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get("DEBUG", "1") == "1"
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host.strip() for host in os.environ.get("ALLOWED_HOSTS", "").split(",") if host.strip()]
 
 
 # Application definition
@@ -52,6 +52,17 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    "core_app.middleware.ProfilingMiddleware",
+    "core_app.middleware.MemoryMiddleware",
+    "core_app.middleware.MetricsMiddleware",
+    "core_app.middleware.RequestTimingMiddleware",
+    "core_app.middleware.SlowQueryLogMiddleware",
+    "core_app.middleware.ConcurrencyLimitMiddleware",
+    "core_app.middleware.RoutedMiddleware", # runs API_MIDDLEWARE or FULL_MIDDLEWARE
+]
+
+# middleware for the admin, the docs and anything else outside the API
+FULL_MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -60,6 +71,19 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# the API authenticates with tokens, so it skips sessions, CSRF, auth and messages
+API_MIDDLEWARE = [
+    "core_app.middleware.CompressionMiddleware",
+    'django.middleware.common.CommonMiddleware',
+    "core_app.middleware.RateLimitHeadersMiddleware",
+]
+
+# API paths that are browsed with sessions and keep FULL_MIDDLEWARE
+FULL_MIDDLEWARE_API_PATHS = ["/api/docs/", "/api/schema/", ]
+
+# the admin middleware checks only look at MIDDLEWARE, the admin gets them through FULL_MIDDLEWARE
+SILENCED_SYSTEM_CHECKS = ["admin.E408", "admin.E409", "admin.E410", ]
+
 ROOT_URLCONF = 'project_config.urls'
 
 TEMPLATES = [
@@ -135,6 +159,19 @@ MEDIA_URL = "/static/media/"
 STATIC_ROOT = BASE_DIR / "static_files" # collectstatic puts static files here
 MEDIA_ROOT = BASE_DIR / "media_files" # media files (i.e., files uploaded by users) are put here
 
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": { # collectstatic writes hash-named files plus .gz/.br versions
+        "BACKEND": "core_app.storage.CompressedManifestStaticFilesStorage",
+    },
+}
+
+# serve STATIC_ROOT from the app with long lived cache headers (see core_app.views.serve_static)
+SERVE_STATIC = os.environ.get("SERVE_STATIC", "1") == "1"
+STATIC_MAX_AGE = int(os.environ.get("STATIC_MAX_AGE", "3600")) # seconds, for files without a hash in their name
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -144,8 +181,107 @@ AUTH_USER_MODEL = "core_app.User" # custom user model
 
 REST_FRAMEWORK = {    
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_THROTTLE_CLASSES": ["core_app.throttling.TokenBucketThrottle", ],
+    "DEFAULT_THROTTLE_RATES": { # bucket size / refill period, per user (or IP address when anonymous)
+        "anon": "60/min",
+        "user": "600/min",
+        "recipe.list": "120/min", # "<view throttle_scope>.<action>" overrides the view scope
+        "login": "10/min",
+        "signup": "10/hour",
+    },
+    # reverse proxies in front of the app, the client address of anonymous buckets is taken from
+    # X-Forwarded-For only past them (REMOTE_ADDR when 0), so clients can't spoof it
+    "NUM_PROXIES": int(os.environ.get("NUM_PROXIES", "0")),
+}
+
+# token bucket throttling (see core_app.throttling), buckets are shared by workers through the cache
+THROTTLING = os.environ.get("THROTTLING", "1") == "1"
+THROTTLE_STORE = os.environ.get("THROTTLE_STORE", "cache") # or "local" (per process)
+
+CACHES = { # use a shared backend (e.g. redis or memcached) for limits that hold across workers
+    "default": {
+        "BACKEND": os.environ.get("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get("CACHE_LOCATION", ""),
+    },
 }
 
 SPECTACULAR_SETTINGS = {
     "COMPONENT_SPLIT_REQUEST": True, # allows image uploads using swagger browsable API
+}
+
+# the schema is generated once per code version (see core_app.schema)
+SCHEMA_CODE_VERSION = os.environ.get("APP_VERSION")
+SCHEMA_CACHE_FILE = os.environ.get("SCHEMA_CACHE_FILE", BASE_DIR / "openapi_schema.json")
+
+# per-request performance instrumentation of API requests (see core_app.middleware)
+API_PATH_PREFIX = "/api/"
+SERVER_TIMING_HEADER = os.environ.get("SERVER_TIMING_HEADER", "0") == "1" # expose timings to clients
+REQUEST_TIMING_LOG = os.environ.get("REQUEST_TIMING_LOG", "0") == "1" # log one JSON line per request
+
+# prometheus metrics (see core_app.metrics), with several worker processes point
+# PROMETHEUS_MULTIPROC_DIR (read by prometheus_client too) to a directory shared by them
+# so /metrics covers all of them
+METRICS_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+# addresses or networks (e.g. 10.0.0.0/8) of the scrapers, comma separated, others get a 403 unless DEBUG
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.environ.get("METRICS_ALLOWED_IPS", "").split(",") if ip.strip()]
+
+# queries slower than the threshold are saved with their plan (see core_app.slow_queries)
+SLOW_QUERY_LOG = os.environ.get("SLOW_QUERY_LOG", "1") == "1"
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get("SLOW_QUERY_THRESHOLD_MS", "100"))
+
+# on-demand sampling profiler (see core_app.profiling), PROFILER_SIGNAL=1 starts it on SIGUSR2
+PROFILER_OUTPUT_DIR = os.environ.get("PROFILER_OUTPUT_DIR", BASE_DIR / "profiles")
+PROFILER_SIGNAL = os.environ.get("PROFILER_SIGNAL", "0") == "1"
+PROFILER_SIGNAL_SECONDS = int(os.environ.get("PROFILER_SIGNAL_SECONDS", "30"))
+PROFILER_SIGNAL_PATH = os.environ.get("PROFILER_SIGNAL_PATH") # e.g. ^/api/recipe/recipes/
+
+# allocation tracing of workers and recycling over a memory ceiling (see core_app.memory)
+MEMORY_PROFILING = os.environ.get("MEMORY_PROFILING", "0") == "1"
+MEMORY_SNAPSHOT_INTERVAL = int(os.environ.get("MEMORY_SNAPSHOT_INTERVAL", "300")) # seconds between diffs
+MEMORY_TOP_N = int(os.environ.get("MEMORY_TOP_N", "10")) # allocation sites reported
+MEMORY_TRACEBACK_FRAMES = int(os.environ.get("MEMORY_TRACEBACK_FRAMES", "1"))
+MEMORY_CEILING_MB = int(os.environ.get("MEMORY_CEILING_MB", "0")) or None # resident memory that triggers a recycle
+
+# per worker concurrency limits of API requests, by view name (see core_app.concurrency)
+CONCURRENCY_LIMITING = os.environ.get("CONCURRENCY_LIMITING", "1") == "1"
+CONCURRENCY_LIMITS = {
+    "default": int(os.environ.get("CONCURRENCY_LIMIT", "32")), # of each route not listed
+    "recipe_app:recipe-upload-image": 4,
+    "user_app:token": 4, # password hashing is CPU bound
+    "user_app:create": 4,
+}
+CONCURRENCY_MIN_LIMIT = int(os.environ.get("CONCURRENCY_MIN_LIMIT", "1"))
+CONCURRENCY_QUEUE_SIZE = int(os.environ.get("CONCURRENCY_QUEUE_SIZE", "16")) # waiting requests, per route
+CONCURRENCY_QUEUE_TIMEOUT_MS = float(os.environ.get("CONCURRENCY_QUEUE_TIMEOUT_MS", "200"))
+CONCURRENCY_ADAPTIVE = os.environ.get("CONCURRENCY_ADAPTIVE", "1") == "1"
+CONCURRENCY_LATENCY_TOLERANCE = float(os.environ.get("CONCURRENCY_LATENCY_TOLERANCE", "2.0")) # x baseline latency
+
+# postgres statement_timeout of views with QueryLimitsMixin (see core_app.query_limits), 0 disables it
+STATEMENT_TIMEOUT_MS = int(os.environ.get("STATEMENT_TIMEOUT_MS", "5000"))
+QUERY_BUDGET_MODE = os.environ.get("QUERY_BUDGET_MODE", "log") # "log", "raise" or "off"
+MAX_FILTER_IDS = int(os.environ.get("MAX_FILTER_IDS", "100")) # ids in the tags/ingredients filters
+MAX_BULK_RECIPES = int(os.environ.get("MAX_BULK_RECIPES", "1000")) # recipe ids in a bulk attach/detach
+
+# identical concurrent reads of the recipe, tag and ingredient lists share one
+# evaluation, and optionally a stampede protected cache (see core_app.coalescing)
+READ_COALESCING = os.environ.get("READ_COALESCING", "1") == "1"
+READ_CACHE_ALIAS = "default" # must be shared by the workers when READ_CACHE_TIMEOUT is set
+READ_CACHE_TIMEOUT = int(os.environ.get("READ_CACHE_TIMEOUT", "0")) # seconds fresh, 0 disables the cache
+READ_CACHE_STALE_TIMEOUT = int(os.environ.get("READ_CACHE_STALE_TIMEOUT", "30")) # seconds served stale while refreshed
+READ_CACHE_LOCK_TIMEOUT = float(os.environ.get("READ_CACHE_LOCK_TIMEOUT", "2")) # seconds
+
+# compression of API responses (see core_app.compression), brotli is used if installed
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "1024")) # bytes
+COMPRESSION_GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", "4"))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "core_app": {"handlers": ["console", ], "level": "INFO"},
+    },
 }
\ No newline at end of file
@@ -17,19 +17,30 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import path, include
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from drf_spectacular.views import SpectacularSwaggerView
 from django.conf.urls.static import static
 from django.conf import settings
+from core_app.metrics import metrics_view
+from core_app.schema import CachedSpectacularAPIView
+from core_app.views import ProfilerView, MemoryProfilerView, serve_static
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path("api/schema/", SpectacularAPIView.as_view(), name="api-schema"),
+    path("api/schema/", CachedSpectacularAPIView.as_view(), name="api-schema"),
+    # swagger UI loads the schema from the cached api-schema view
     path("api/docs/", SpectacularSwaggerView.as_view(url_name="api-schema"), name="api-doc"),
     path("api/user/", include("user_app.urls")),
     path("api/recipe/", include("recipe_app.urls")),
+    path("api/profile/", ProfilerView.as_view(), name="profile"),
+    path("api/profile/memory/", MemoryProfilerView.as_view(), name="profile-memory"),
+    path("metrics", metrics_view, name="metrics"), # scraped by prometheus
 ]
 
+# collected static files (in development runserver serves them from the apps)
+if settings.SERVE_STATIC and not settings.DEBUG:
+    urlpatterns += [path(f"{settings.STATIC_URL.lstrip('/')}<path:path>", serve_static, name="static"), ]
+
 # how to serve media files in development
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT) 
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
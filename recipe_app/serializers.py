@@ -2,11 +2,14 @@
 Serializers for recipe APIs
 """
 
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
 from core_app.models import Recipe, Tag, Ingredient
+from core_app.timing import TimedSerializerMixin, TimedListSerializer
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for Tag model.
     """
@@ -16,9 +19,10 @@ class TagSerializer(serializers.ModelSerializer):
         model = Tag
         fields = ["id", "name"]
         read_only_fields = ["id", ]
+        list_serializer_class = TimedListSerializer
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for Ingredient model.
     """
@@ -27,9 +31,98 @@ class IngredientSerializer(serializers.ModelSerializer):
         model = Ingredient
         fields = ["id", "name"]
         read_only_fields = ["id", ]
+        list_serializer_class = TimedListSerializer
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class TagCountSerializer(TagSerializer):
+    """
+    Serializer for Tag model including the number of recipes that use it.
+    """
+
+    class Meta(TagSerializer.Meta):
+
+        fields = TagSerializer.Meta.fields + ["recipe_count", ]
+        read_only_fields = TagSerializer.Meta.read_only_fields + ["recipe_count", ]
+
+
+class IngredientCountSerializer(IngredientSerializer):
+    """
+    Serializer for Ingredient model including the number of recipes that use it.
+    """
+
+    class Meta(IngredientSerializer.Meta):
+
+        fields = IngredientSerializer.Meta.fields + ["recipe_count", ]
+        read_only_fields = IngredientSerializer.Meta.read_only_fields + ["recipe_count", ]
+
+
+class RecipeSelectionSerializer(serializers.Serializer):
+    """
+    Serializer for the recipes a bulk action applies to: ids and/or the tags and ingredients filters.
+    """
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(), required=False, max_length=settings.MAX_BULK_RECIPES
+    )
+    tags = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=settings.MAX_FILTER_IDS)
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(), required=False, max_length=settings.MAX_FILTER_IDS
+    )
+
+    def validate(self, attrs):
+
+        if not attrs:
+            raise serializers.ValidationError("Select recipes by id (recipes) or with the tags/ingredients filters.")
+
+        return attrs
+
+    def get_recipes(self, user):
+        """
+        Return the selected recipes of user.
+        """
+
+        recipes = Recipe.objects.filter(user=user)
+
+        if "recipes" in self.validated_data:
+            recipes = recipes.filter(pk__in=self.validated_data["recipes"])
+        if "tags" in self.validated_data:
+            recipes = recipes.filter(tags__id__in=self.validated_data["tags"])
+        if "ingredients" in self.validated_data:
+            recipes = recipes.filter(ingredients__id__in=self.validated_data["ingredients"])
+
+        return recipes
+
+
+class BulkResultSerializer(serializers.Serializer):
+    """
+    Serializer for the result of attach/detach.
+    """
+
+    changed = serializers.IntegerField(help_text="Number of recipes linked or unlinked.")
+    recipe_count = serializers.IntegerField(help_text="Number of recipes that use the item now.")
+
+
+class MergeSerializer(serializers.Serializer):
+    """
+    Serializer for the items merged into another one.
+    """
+
+    sources = serializers.ListField(
+        child=serializers.IntegerField(), min_length=1, max_length=settings.MAX_FILTER_IDS,
+        help_text="Ids of the items to merge, they are deleted."
+    )
+
+
+class MergeResultSerializer(serializers.Serializer):
+    """
+    Serializer for the result of merge.
+    """
+
+    merged = serializers.IntegerField(help_text="Number of items merged.")
+    recipe_count = serializers.IntegerField(help_text="Number of recipes that use the item now.")
+
+
+class RecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for Recipe model.
     """
@@ -42,28 +135,46 @@ class RecipeSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = ["id", "title", "time_minutes", "price", "link", "tags", "ingredients"]
         read_only_fields = ["id", ]
+        list_serializer_class = TimedListSerializer
+
+    def __init__(self, *args, **kwargs):
+
+        super().__init__(*args, **kwargs)
 
-    def _get_or_create_tags(self, tags, recipe):
+        # keep only the fields requested by the client (sparse fieldsets)
+        requested_fields = self.context.get("fields")
+        if requested_fields is not None:
+            for field_name in set(self.fields) - set(requested_fields):
+                self.fields.pop(field_name)
+
+    def _get_or_create_tags(self, tags, recipe, replace=False):
         """
-        Gets or creates tags as needed.
+        Gets or creates tags as needed, and adds them to the recipe (or replaces its tags).
         """
 
-        for tag in tags: # create or retrieve the tags from the database
-            tag_obj, created = Tag.objects.get_or_create(user=self.context["request"].user, **tag)
-            recipe.tags.add(tag_obj) # add the tags to the recipe
+        tag_objs = Tag.objects.get_or_create_many(self.context["request"].user, [tag["name"] for tag in tags])
+
+        if replace: # only the links that change are written
+            recipe.tags.set(tag_objs)
+        else:
+            recipe.tags.add(*tag_objs)
 
-    def _get_or_create_ingredients(self, ingredients, recipe):
+    def _get_or_create_ingredients(self, ingredients, recipe, replace=False):
         """
-        Gets or creates ingredients as needed.
+        Gets or creates ingredients as needed, and adds them to the recipe (or replaces its ingredients).
         """
 
-        for ingredient in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(
-                user=self.context["request"].user, 
-                **ingredient
-            )
-            recipe.ingredients.add(ingredient_obj)            
+        ingredient_objs = Ingredient.objects.get_or_create_many(
+            self.context["request"].user,
+            [ingredient["name"] for ingredient in ingredients]
+        )
 
+        if replace:
+            recipe.ingredients.set(ingredient_objs)
+        else:
+            recipe.ingredients.add(*ingredient_objs)
+
+    @transaction.atomic # one commit, and no partial recipe if anything fails
     def create(self, validated_data):
         """
         Create a recipe.
@@ -79,6 +190,7 @@ class RecipeSerializer(serializers.ModelSerializer):
         
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """
         Update a recipe.
@@ -88,13 +200,11 @@ class RecipeSerializer(serializers.ModelSerializer):
         tags = validated_data.pop("tags", None) 
         ingredients = validated_data.pop("ingredients", None) 
 
-        if tags is not None: # add the new tags to the recipe
-            instance.tags.clear() # clear existing recipe tags
-            self._get_or_create_tags(tags=tags, recipe=instance)
+        if tags is not None: # replace the recipe tags
+            self._get_or_create_tags(tags=tags, recipe=instance, replace=True)
 
-        if ingredients is not None: # add the new ingredients to the recipe
-            instance.ingredients.clear() # clear existing recipe ingredients
-            self._get_or_create_ingredients(ingredients=ingredients, recipe=instance)
+        if ingredients is not None: # replace the recipe ingredients
+            self._get_or_create_ingredients(ingredients=ingredients, recipe=instance, replace=True)
 
         # update remaining fields of the recipe
         for attr, value in validated_data.items():
@@ -114,7 +224,7 @@ class RecipeDetailSerializer(RecipeSerializer):
         fields = RecipeSerializer.Meta.fields + ["description", "image", ]
 
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+class RecipeImageSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for uploading images to recipes.
     """
@@ -124,4 +234,63 @@ class RecipeImageSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = ["id", "image", ]
         read_only_fields = ["id", ]
-        extra_kwargs = {"image": {"required": "True"}}
\ No newline at end of file
+        extra_kwargs = {"image": {"required": "True"}}
+
+
+def _related_attributes(through_field, recipe_ids):
+    """
+    Load the tags or ingredients of several recipes with a single query.
+
+    Returns a dict that maps each recipe id to its list of {"id", "name"} dicts.
+    """
+
+    through = getattr(Recipe, through_field).through
+    target = through_field[:-1] # "tags" -> "tag", "ingredients" -> "ingredient"
+
+    # order by the related id, the order in which the (recipe, tag) unique index returns them
+    rows = through.objects.filter(recipe_id__in=recipe_ids).order_by(f"{target}_id").values_list(
+        "recipe_id", f"{target}_id", f"{target}__name"
+    )
+
+    related = {}
+    for recipe_id, attribute_id, name in rows:
+        related.setdefault(recipe_id, []).append({"id": attribute_id, "name": name})
+
+    return related
+
+
+def recipe_list_representation(queryset, fields=None):
+    """
+    Read-only fast path that returns the same data as RecipeSerializer(queryset, many=True).
+
+    Only the columns used by RecipeSerializer (or by the requested fields) are fetched,
+    and tags and ingredients are loaded with one query each instead of going through
+    the nested serializers.
+    """
+
+    # keep the same key order as RecipeSerializer.Meta.fields
+    fields = [name for name in RecipeSerializer.Meta.fields if fields is None or name in fields]
+    columns = [name for name in fields if name not in ("id", "tags", "ingredients")]
+
+    # reuse the serializer price field so decimals are formatted exactly the same way
+    price_field = RecipeSerializer().fields["price"]
+
+    recipes = list(queryset.values("id", *columns))
+    recipe_ids = [recipe["id"] for recipe in recipes]
+
+    related = {
+        name: _related_attributes(name, recipe_ids) if recipe_ids else {}
+        for name in ("tags", "ingredients") if name in fields
+    }
+
+    data = []
+    for recipe in recipes:
+        if "price" in recipe:
+            recipe["price"] = price_field.to_representation(recipe["price"])
+
+        item = {}
+        for name in fields:
+            item[name] = related[name].get(recipe["id"], []) if name in related else recipe[name]
+        data.append(item)
+
+    return data
@@ -171,3 +171,17 @@ class PrivateIngredientsAPITests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 1)
         self.assertEqual(response.data[0], IngredientSerializer(ingredient1).data)    
+
+    def test_retrieve_ingredients_with_recipe_counts(self):
+
+        # create an ingredient used by a recipe
+        ingredient = Ingredient.objects.create(user=self.user, name="Eggs")
+        recipe = Recipe.objects.create(title="Omelette", time_minutes=10, price=Decimal("3.00"), user=self.user)
+        recipe.ingredients.add(ingredient)
+
+        # request ingredients assigned to recipes with their counts
+        response = self.client.get(INGREDIENTS_URL, data={"assigned_only": 1, "with_counts": 1})
+
+        # check the count is included
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [{"id": ingredient.id, "name": "Eggs", "recipe_count": 1}])
@@ -5,15 +5,17 @@ Tests for recipe APIs.
 from decimal import Decimal
 import tempfile
 import os
+from unittest.mock import patch
 from PIL import Image
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework.renderers import JSONRenderer
 from core_app.models import Recipe, Tag, Ingredient
 from recipe_app.serializers import RecipeSerializer, RecipeDetailSerializer, \
-     TagSerializer, IngredientSerializer
+     TagSerializer, IngredientSerializer, recipe_list_representation
 
 
 RECIPES_URL = reverse("recipe_app:recipe-list")
@@ -284,6 +286,24 @@ class PrivateRecipeAPITests(TestCase):
         self.assertIn(tag_1, recipe.tags.all())
         self.assertEqual(response.data["tags"], TagSerializer(recipe.tags, many=True).data)
 
+    def test_failed_create_leaves_no_partial_recipe(self):
+
+        payload = {
+            "title": "Pongal",
+            "time_minutes": 60,
+            "price": Decimal("4.50"),
+            "tags": [{"name": "Breakfast"}],
+            "ingredients": [{"name": "Rice"}],
+        }
+
+        # fail after the recipe and its tags were written
+        with patch.object(RecipeSerializer, "_get_or_create_ingredients", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.post(RECIPES_URL, data=payload, format="json")
+
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(Tag.objects.exists())
+
     def test_can_add_a_tag_when_updating_a_recipe(self):
         # create a recipe
         recipe = create_recipe(user=self.user)
@@ -479,6 +499,97 @@ class PrivateRecipeAPITests(TestCase):
         self.assertIn(RecipeSerializer(recipe2).data, response.data)
         self.assertNotIn(RecipeSerializer(recipe3).data, response.data)
 
+    def test_filter_with_too_many_ids_is_rejected(self):
+
+        params = {"tags": ",".join(str(tag_id) for tag_id in range(1, 1002))}
+        response = self.client.get(RECIPES_URL, data=params)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("tags", response.data)
+
+    def test_filter_with_invalid_ids_is_rejected(self):
+
+        response = self.client.get(RECIPES_URL, data={"ingredients": "1,two"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("ingredients", response.data)
+
+    def test_recipe_list_representation_matches_recipe_serializer(self):
+
+        # create recipes with tags and ingredients
+        tag1 = Tag.objects.create(user=self.user, name="Vegan")
+        tag2 = Tag.objects.create(user=self.user, name="Dinner")
+        ingredient = Ingredient.objects.create(user=self.user, name="Tofu")
+        recipe1 = create_recipe(user=self.user, price=Decimal("5"))
+        recipe1.tags.add(tag1, tag2)
+        recipe1.ingredients.add(ingredient)
+        create_recipe(user=self.user, title="Plain recipe")
+
+        # render both representations
+        recipes = Recipe.objects.filter(user=self.user).order_by("-id")
+        renderer = JSONRenderer()
+        expected = renderer.render(RecipeSerializer(recipes, many=True).data)
+        lean = renderer.render(recipe_list_representation(recipes))
+
+        # check they are byte-for-byte identical
+        self.assertEqual(lean, expected)
+
+    def test_recipe_list_query_count_does_not_grow_with_recipes(self):
+
+        # create several recipes with tags and ingredients
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        ingredient = Ingredient.objects.create(user=self.user, name="Tofu")
+        for _ in range(5):
+            recipe = create_recipe(user=self.user)
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+
+        # recipes, tags and ingredients are loaded with one query each
+        with self.assertNumQueries(3):
+            response = self.client.get(RECIPES_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 5)
+
+    def test_list_recipes_with_sparse_fieldset(self):
+
+        # create a recipe with a tag
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name="Vegan"))
+
+        # only ask for the id and title, without tags and ingredients queries
+        with self.assertNumQueries(1):
+            response = self.client.get(RECIPES_URL, data={"fields": "id,title"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [{"id": recipe.id, "title": recipe.title}])
+
+    def test_list_recipes_omitting_fields(self):
+
+        create_recipe(user=self.user)
+
+        response = self.client.get(RECIPES_URL, data={"omit": "tags,ingredients,link"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response.data[0].keys()), ["id", "title", "time_minutes", "price"])
+
+    def test_get_recipe_detail_with_sparse_fieldset(self):
+
+        recipe = create_recipe(user=self.user)
+
+        url = detail_url(recipe_id=recipe.id)
+        response = self.client.get(url, data={"fields": "title,description"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"title": recipe.title, "description": recipe.description})
+
+    def test_unknown_sparse_fieldset_field_returns_error(self):
+
+        response = self.client.get(RECIPES_URL, data={"fields": "id,description"})
+
+        # description is only available on the detail endpoint
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class ImageUploadTests(TestCase):
     """
@@ -74,6 +74,16 @@ class PrivateTagsAPITests(TestCase):
         tag = Tag.objects.first()
         self.assertEqual(response.data, TagSerializer(tag).data)
 
+    def test_create_tag_with_an_existing_name_is_rejected(self):
+
+        Tag.objects.create(user=self.user, name="Dessert")
+
+        response = self.client.post(TAGS_URL, data={"name": "Dessert"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("name", response.data)
+        self.assertEqual(Tag.objects.count(), 1)
+
     def test_retrieve_tags(self):
            
         # create two tags
@@ -186,3 +196,117 @@ class PrivateTagsAPITests(TestCase):
         self.assertEqual(len(response.data), 1)
         self.assertEqual(response.data[0], TagSerializer(tag1).data)
 
+    def test_retrieve_tags_with_recipe_counts(self):
+
+        # create a tag used by two recipes and an unused tag
+        tag1 = Tag.objects.create(user=self.user, name="Breakfast")
+        tag2 = Tag.objects.create(user=self.user, name="Dinner")
+        for title in ["Pancakes", "Porridge"]:
+            recipe = Recipe.objects.create(title=title, time_minutes=5, price=Decimal("2.00"), user=self.user)
+            recipe.tags.add(tag1)
+
+        # request tags with their recipe counts
+        response = self.client.get(TAGS_URL, data={"with_counts": 1})
+
+        # check the counts are included
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [
+            {"id": tag2.id, "name": "Dinner", "recipe_count": 0},
+            {"id": tag1.id, "name": "Breakfast", "recipe_count": 2},
+        ])
+
+    def test_order_tags_by_popularity(self):
+
+        # create a tag used by a recipe and an unused tag
+        tag1 = Tag.objects.create(user=self.user, name="Breakfast")
+        tag2 = Tag.objects.create(user=self.user, name="Dinner")
+        recipe = Recipe.objects.create(title="Pancakes", time_minutes=5, price=Decimal("2.00"), user=self.user)
+        recipe.tags.add(tag1)
+
+        # request tags ordered by popularity
+        response = self.client.get(TAGS_URL, data={"ordering": "popularity"})
+
+        # check the most used tag comes first
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, TagSerializer([tag1, tag2], many=True).data)
+
+    def test_invalid_list_params_are_rejected(self):
+
+        for params in [{"assigned_only": "x"}, {"with_counts": "abc"}, {"with_counts": "2"}, {"ordering": "id"}]:
+            with self.subTest(params=params):
+                response = self.client.get(TAGS_URL, data=params)
+
+                # check a bad value is a client error, not a server error
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn(next(iter(params)), response.data)
+
+    def test_attach_tag_to_many_recipes(self):
+
+        tag = Tag.objects.create(user=self.user, name="Quick")
+        recipes = [
+            Recipe.objects.create(title=f"Recipe {i}", time_minutes=5, price=Decimal("2.00"), user=self.user)
+            for i in range(3)
+        ]
+        recipes[0].tags.add(tag) # already tagged
+        other_recipe = Recipe.objects.create(
+            title="Not mine", time_minutes=5, price=Decimal("2.00"), user=create_user(email="other@example.com")
+        )
+
+        url = reverse("recipe_app:tag-attach", args=[tag.id])
+        payload = {"recipes": [recipe.id for recipe in recipes] + [other_recipe.id]}
+        response = self.client.post(url, payload, format="json")
+
+        # only the recipes of the user that didn't have the tag are linked
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"changed": 2, "recipe_count": 3})
+        for recipe in recipes:
+            self.assertIn(tag, recipe.tags.all())
+        self.assertFalse(other_recipe.tags.exists())
+
+    def test_detach_tag_from_recipes_selected_by_filter(self):
+
+        tag = Tag.objects.create(user=self.user, name="Quick")
+        vegan = Tag.objects.create(user=self.user, name="Vegan")
+        recipe1 = Recipe.objects.create(title="Salad", time_minutes=5, price=Decimal("2.00"), user=self.user)
+        recipe2 = Recipe.objects.create(title="Steak", time_minutes=5, price=Decimal("2.00"), user=self.user)
+        recipe1.tags.add(tag, vegan)
+        recipe2.tags.add(tag)
+
+        url = reverse("recipe_app:tag-detach", args=[tag.id])
+        response = self.client.post(url, {"tags": [vegan.id]}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"changed": 1, "recipe_count": 1})
+        self.assertNotIn(tag, recipe1.tags.all())
+        self.assertIn(tag, recipe2.tags.all())
+
+    def test_bulk_action_requires_a_selection(self):
+
+        tag = Tag.objects.create(user=self.user, name="Quick")
+
+        response = self.client.post(reverse("recipe_app:tag-attach", args=[tag.id]), {}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_merge_tags(self):
+
+        target = Tag.objects.create(user=self.user, name="Vegan")
+        duplicate1 = Tag.objects.create(user=self.user, name="vegan ")
+        duplicate2 = Tag.objects.create(user=self.user, name="VEGAN")
+        other_users_tag = Tag.objects.create(user=create_user(email="other@example.com"), name="vegan")
+        recipe1 = Recipe.objects.create(title="Salad", time_minutes=5, price=Decimal("2.00"), user=self.user)
+        recipe2 = Recipe.objects.create(title="Curry", time_minutes=5, price=Decimal("2.00"), user=self.user)
+        recipe1.tags.add(target, duplicate1) # collides with target
+        recipe2.tags.add(duplicate1, duplicate2) # collides between the sources
+
+        url = reverse("recipe_app:tag-merge", args=[target.id])
+        payload = {"sources": [duplicate1.id, duplicate2.id, other_users_tag.id]}
+        response = self.client.post(url, payload, format="json")
+
+        # the sources of the user are gone and their recipes have the target once
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"merged": 2, "recipe_count": 2})
+        self.assertEqual(list(recipe1.tags.all()), [target])
+        self.assertEqual(list(recipe2.tags.all()), [target])
+        self.assertFalse(Tag.objects.filter(pk__in=[duplicate1.id, duplicate2.id]).exists())
+        self.assertTrue(Tag.objects.filter(pk=other_users_tag.id).exists())
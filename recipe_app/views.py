@@ -2,19 +2,42 @@
 Views for recipe APIs.
 """
 
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from rest_framework import viewsets, mixins, status
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from drf_spectacular.utils import extend_schema_view, extend_schema, \
      OpenApiParameter, OpenApiTypes
+from core_app.coalescing import coalesced_read
 from core_app.models import Recipe, Tag, Ingredient
+from core_app.query_limits import QueryLimitsMixin
+from core_app.timing import span
 from recipe_app.serializers import RecipeSerializer, RecipeDetailSerializer, \
-     TagSerializer, IngredientSerializer, RecipeImageSerializer
-
-
-# decorate RecipeViewSet class to document tags and ingredients params in swagger browsable API
+     TagSerializer, IngredientSerializer, RecipeImageSerializer, TagCountSerializer, \
+     IngredientCountSerializer, RecipeSelectionSerializer, BulkResultSerializer, \
+     MergeSerializer, MergeResultSerializer, recipe_list_representation
+
+
+# sparse fieldset params shared by the recipe list and detail endpoints
+SPARSE_FIELDSET_PARAMETERS = [
+    OpenApiParameter(
+        name="fields",
+        type=OpenApiTypes.STR,
+        description="Comma separated list of fields to return (e.g. id,title)"
+    ),
+    OpenApiParameter(
+        name="omit",
+        type=OpenApiTypes.STR,
+        description="Comma separated list of fields to leave out of the response"
+    ),
+]
+
+
+# decorate RecipeViewSet class to document tags, ingredients and sparse fieldset params in swagger browsable API
 @extend_schema_view(
     list=extend_schema( # this only applies to the recipe-list endpoint
         parameters=[
@@ -27,12 +50,13 @@ from recipe_app.serializers import RecipeSerializer, RecipeDetailSerializer, \
                 name="ingredients",
                 type=OpenApiTypes.STR,
                 description="Comma separated list of ingredient ids to filter"
-            )
-
+            ),
+            *SPARSE_FIELDSET_PARAMETERS,
         ]
-    )
+    ),
+    retrieve=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(QueryLimitsMixin, viewsets.ModelViewSet):
     """
     view for manage recipe APIs.
     """
@@ -42,13 +66,45 @@ class RecipeViewSet(viewsets.ModelViewSet):
     
     authentication_classes = [TokenAuthentication, ]
     permission_classes = [IsAuthenticated, ]
+    throttle_scope = "recipe"
+    statement_timeouts = {"list": 2000, "upload_image": 10000} # ms
+    query_budgets = {"list": 4, "retrieve": 5, "create": 18, "update": 27, "partial_update": 27, "destroy": 8}
+
+    def _params_to_ints(self, params, name):
+        """
+        Convert params (a comma separated string) to a list of ints, at most MAX_FILTER_IDS of them.
+        """
+
+        str_ids = params.split(",")
+        if len(str_ids) > settings.MAX_FILTER_IDS:
+            raise ValidationError({name: f"Filter by at most {settings.MAX_FILTER_IDS} ids."})
 
-    def _params_to_ints(self, params):
+        try:
+            return [int(str_id) for str_id in str_ids]
+        except ValueError:
+            raise ValidationError({name: "Expected a comma separated list of ids."})
+
+    def _requested_fields(self):
         """
-        Convert params (a list of strings) to a list of ints.
+        Return the fields requested with the fields/omit params, or None for all fields.
         """
 
-        return [int(str_id) for str_id in params.split(",")]
+        fields_param = self.request.query_params.get("fields")
+        omit_param = self.request.query_params.get("omit")
+
+        # sparse fieldsets only apply to read actions
+        if self.action not in ("list", "retrieve") or not (fields_param or omit_param):
+            return None
+
+        available = self.get_serializer_class().Meta.fields
+        fields = [name.strip() for name in fields_param.split(",")] if fields_param else list(available)
+        omit = [name.strip() for name in omit_param.split(",")] if omit_param else []
+
+        unknown = set(fields + omit) - set(available)
+        if unknown:
+            raise ValidationError({"fields": f"Unknown fields: {', '.join(sorted(unknown))}."})
+
+        return [name for name in available if name in fields and name not in omit]
 
     def get_queryset(self):
         """
@@ -59,14 +115,22 @@ class RecipeViewSet(viewsets.ModelViewSet):
         ingredients = self.request.query_params.get("ingredients")
 
         if tags:
-            tag_ids = self._params_to_ints(tags)
+            tag_ids = self._params_to_ints(tags, "tags")
             self.queryset = self.queryset.filter(tags__id__in=tag_ids)
         
         if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
+            ingredient_ids = self._params_to_ints(ingredients, "ingredients")
             self.queryset = self.queryset.filter(ingredients__id__in=ingredient_ids)
 
-        return self.queryset.filter(user=self.request.user).order_by("-id").distinct()
+        queryset = self.queryset.filter(user=self.request.user).order_by("-id").distinct()
+
+        if self.action == "retrieve": # only select the columns and relations that will be serialized
+            fields = self._requested_fields() or self.get_serializer_class().Meta.fields
+            relations = [name for name in fields if name in ("tags", "ingredients")]
+            columns = [name for name in fields if name not in relations]
+            queryset = queryset.only("id", *columns).prefetch_related(*relations)
+
+        return queryset
 
     def get_serializer_class(self):
         """
@@ -80,6 +144,30 @@ class RecipeViewSet(viewsets.ModelViewSet):
         
         return self.serializer_class
 
+    def get_serializer_context(self):
+        """
+        Add the requested sparse fieldset to the serializer context.
+        """
+
+        context = super().get_serializer_context()
+        context["fields"] = self._requested_fields()
+
+        return context
+
+    def list(self, request, *args, **kwargs):
+        """
+        List recipes using the lean read-only representation.
+
+        Identical concurrent requests share the result (see core_app.coalescing).
+        """
+
+        def evaluate():
+            queryset = self.filter_queryset(self.get_queryset())
+            with span("serialize"):
+                return recipe_list_representation(queryset, fields=self._requested_fields())
+
+        return Response(coalesced_read(request, request.user.pk, evaluate, label="recipe_list"))
+
     def perform_create(self, serializer):
         """
         Create a new recipe.
@@ -103,7 +191,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-# decorate BaseRecipeAttributesViewSet class to document assigned_only parameter in swagger browsable API
+# decorate BaseRecipeAttributesViewSet class to document assigned_only, with_counts and ordering params in swagger browsable API
 @extend_schema_view(
         list=extend_schema(
             parameters=[
@@ -111,11 +199,21 @@ class RecipeViewSet(viewsets.ModelViewSet):
                     name="assigned_only",
                     type=OpenApiTypes.INT, enum=[0, 1],
                     description="Filter by items assigned to recipes"
-                )
+                ),
+                OpenApiParameter(
+                    name="with_counts",
+                    type=OpenApiTypes.INT, enum=[0, 1],
+                    description="Include the number of recipes that use each item"
+                ),
+                OpenApiParameter(
+                    name="ordering",
+                    type=OpenApiTypes.STR, enum=["name", "popularity"],
+                    description="Order by name (default) or by number of recipes, most used first"
+                ),
             ]
         )
 )
-class BaseRecipeAttributesViewSet(viewsets.ModelViewSet):
+class BaseRecipeAttributesViewSet(QueryLimitsMixin, viewsets.ModelViewSet):
     """
     Base class for Recipe attributes (i.e., tags, ingredients).
     """
@@ -123,33 +221,147 @@ class BaseRecipeAttributesViewSet(viewsets.ModelViewSet):
     authentication_classes = [TokenAuthentication, ]
     permission_classes = [IsAuthenticated, ]
 
-    def _param_to_bool(self):
+    count_serializer_class = None # serializer used when with_counts is requested
+    statement_timeouts = {"list": 2000} # ms
+    query_budgets = {
+        "list": 2, "retrieve": 2, "create": 4, "update": 5, "partial_update": 5, "destroy": 4, "attach": 10, "detach": 8, "merge": 16,
+    }
+
+    def _param_to_bool(self, name):
         """
-        converts assigned_only param in url to boolean.
+        converts a 0/1 param in url (e.g., assigned_only) to boolean.
         """
 
-        # get state of assigned_only param in the request url
-        return bool(int(self.request.query_params.get("assigned_only", 0)))
+        # get state of the param in the request url
+        value = self.request.query_params.get(name, "0")
+        if value not in ("0", "1"):
+            raise ValidationError({name: "Expected 0 or 1."})
+
+        return value == "1"
+
+    def _with_counts(self):
+        """
+        Whether the response includes recipe counts.
+        """
+
+        return self.action == "list" and self._param_to_bool("with_counts")
 
     def get_queryset(self):
         """
         Filter queryset to the authenticated user.
         """
 
-        assigned_only = self._param_to_bool()
+        queryset = self.queryset.filter(user=self.request.user)
 
-        # only return tags or ingredients assigned to recipes
-        if assigned_only:
-            self.queryset = self.queryset.filter(recipe__isnull=False)
+        # only return tags or ingredients assigned to recipes (uses the maintained counter)
+        if self._param_to_bool("assigned_only"):
+            queryset = queryset.filter(recipe_count__gt=0)
 
-        return self.queryset.filter(user=self.request.user).order_by("-name").distinct()
+        ordering = self.request.query_params.get("ordering", "name")
+        if ordering not in ("name", "popularity"):
+            raise ValidationError({"ordering": "Expected name or popularity."})
+
+        if ordering == "popularity":
+            return queryset.order_by("-recipe_count", "-name")
+
+        return queryset.order_by("-name")
+
+    def list(self, request, *args, **kwargs):
+        """
+        List the items, identical concurrent requests share the result (see core_app.coalescing).
+        """
+
+        def evaluate():
+            queryset = self.filter_queryset(self.get_queryset())
+            return self.get_serializer(queryset, many=True).data
+
+        return Response(coalesced_read(request, request.user.pk, evaluate, label=f"{self.basename}_list"))
+
+    def get_serializer_class(self):
+        """
+        Return the serializer class for requests.
+        """
+
+        if self.action in ("attach", "detach"):
+            return RecipeSelectionSerializer
+
+        if self.action == "merge":
+            return MergeSerializer
+
+        if self._with_counts():
+            return self.count_serializer_class
+
+        return self.serializer_class
+
+    def _save(self, serializer, **kwargs):
+        """
+        Save the item, a name the user already has (even if just created by a concurrent request) is a 400.
+        """
+
+        try:
+            with transaction.atomic(): # savepoint, the request transaction stays usable after a conflict
+                serializer.save(**kwargs)
+        except IntegrityError:
+            raise ValidationError({"name": f"You already have a {self.basename} with this name."})
 
     def perform_create(self, serializer):
         """
         Create a new tag.
         """
 
-        serializer.save(user=self.request.user)
+        self._save(serializer, user=self.request.user)
+
+    def perform_update(self, serializer):
+
+        self._save(serializer)
+
+    def _bulk_change(self, request, change):
+        """
+        Apply attach or detach to the selected recipes of the user.
+        """
+
+        item = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        changed = change(self.queryset.filter(pk=item.pk), serializer.get_recipes(request.user))
+        item.refresh_from_db(fields=["recipe_count"])
+
+        return Response({"changed": changed, "recipe_count": item.recipe_count})
+
+    @extend_schema(responses=BulkResultSerializer)
+    @action(methods=["POST", ], detail=True)
+    def attach(self, request, pk=None):
+        """
+        Add the item to many recipes at once.
+        """
+
+        return self._bulk_change(request, lambda items, recipes: items.attach(recipes))
+
+    @extend_schema(responses=BulkResultSerializer)
+    @action(methods=["POST", ], detail=True)
+    def detach(self, request, pk=None):
+        """
+        Remove the item from many recipes at once.
+        """
+
+        return self._bulk_change(request, lambda items, recipes: items.detach(recipes))
+
+    @extend_schema(responses=MergeResultSerializer)
+    @action(methods=["POST", ], detail=True)
+    def merge(self, request, pk=None):
+        """
+        Merge other items (e.g., near-duplicate tags) into this one, their recipes get this item instead.
+        """
+
+        item = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        merged = self.get_queryset().filter(pk__in=serializer.validated_data["sources"]).merge_into(item)
+        item.refresh_from_db(fields=["recipe_count"])
+
+        return Response({"merged": merged, "recipe_count": item.recipe_count})
 
 
 class TagViewSet(BaseRecipeAttributesViewSet):
@@ -158,7 +370,9 @@ class TagViewSet(BaseRecipeAttributesViewSet):
     """
 
     serializer_class = TagSerializer
-    queryset = Tag.objects.all()   
+    count_serializer_class = TagCountSerializer
+    queryset = Tag.objects.all()
+    throttle_scope = "tag"   
     
 
 class IngredientViewSet(BaseRecipeAttributesViewSet):
@@ -167,5 +381,7 @@ class IngredientViewSet(BaseRecipeAttributesViewSet):
     """
 
     serializer_class = IngredientSerializer
+    count_serializer_class = IngredientCountSerializer
     queryset = Ingredient.objects.all()
+    throttle_scope = "ingredient"
     
\ No newline at end of file
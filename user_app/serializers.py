@@ -5,12 +5,13 @@ Serializers for the user API view.
 from django.contrib.auth import get_user_model, authenticate
 from django.utils.translation import gettext as gt
 from rest_framework import serializers
+from core_app.timing import TimedSerializerMixin
 
 
 User = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for the user object.
     """
@@ -14,6 +14,7 @@ class CreateUserView(generics.CreateAPIView):
     """
 
     serializer_class = UserSerializer
+    throttle_scope = "signup"
 
 
 class CreateTokenView(ObtainAuthToken):
@@ -23,6 +24,8 @@ class CreateTokenView(ObtainAuthToken):
 
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES # enable browsable api for this view
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES # ObtainAuthToken disables throttling
+    throttle_scope = "login"
 
 
 class ManageUserView(generics.RetrieveUpdateAPIView):